@@ -0,0 +1,48 @@
+"""
+Multi-worker serving: gunicorn main:app -c gunicorn.conf.py
+
+The app is imported once in the master (preload_app), which warms up the
+recommender in when_ready, and uvicorn workers are forked from it. The catalog, content matrix,
+FAISS index and features are memory-mapped files, and everything else the master
+built is shared copy-on-write, so memory grows with the catalog rather than with
+catalog x workers. Worker-local state (threads, locks, DB and Google connections)
+is re-created in post_fork.
+"""
+import gc
+import os
+
+# Read by utils/recommender_loader.py at import: leave background threads to the workers
+os.environ.setdefault("RECOMMENDER_PRELOAD", "1")
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8001')}"
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+
+
+def when_ready(server):
+    from utils.recommender_loader import recommender
+    from utils.typeahead import typeahead
+
+    # Load before the first fork so workers inherit the snapshot and the typeahead
+    # index instead of each loading them
+    recommender.warm_up()
+    typeahead.load(truncate_journal=True)
+
+
+def pre_fork(server, worker):
+    # Objects loaded so far are never freed; keeping them out of the collector stops
+    # gc passes in each worker from writing to (and un-sharing) their pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    from models.base import engine
+    from utils.recommender_loader import recommender
+    from utils.typeahead import typeahead
+
+    # Connections the master may have opened must not be shared with the worker
+    engine.dispose(close=False)
+    recommender.after_fork()
+    typeahead.after_fork()
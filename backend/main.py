@@ -1,5 +1,8 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from models.base import engine, Base
 from models.song import Song
 from models.user import User
@@ -9,12 +12,39 @@ from models.album_artists import AlbumArtist
 from models.playlist import Playlist
 from models.playlist_user import PlaylistUser
 from models.playlist_tracks import PlaylistTracks
+from models.related_track import RelatedTrack
+from models.liked_track import LikedTrack
 from routes.auth_routes import router as auth_router
 from routes.music_routes import router as music_router
 from routes.user_routes import router as user_router
 from routes.table_routes import router as database_router
+from utils.recommender_loader import recommender
+from utils.typeahead import typeahead
 
-app = FastAPI()
+# Readiness of the pieces loaded after import, reported by /ready
+startup = {"database": False, "database_error": None}
+
+
+def init_database():
+    try:
+        Base.metadata.create_all(bind=engine)
+        startup.update(database=True, database_error=None)
+    except Exception as e:
+        startup["database_error"] = str(e)
+        print(f"Warning: Could not create database tables: {e}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy happens at import: the schema check runs here and the
+    # recommender loads in the background while requests are already served
+    await run_in_threadpool(init_database)
+    recommender.start_warm_up()
+    typeahead.start_load()
+    yield
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -27,10 +57,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination metadata of list endpoints
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Estimated"],
 )
 
-Base.metadata.create_all(bind=engine)
-
 app.include_router(auth_router, prefix="/api/auth")
 app.include_router(music_router, prefix="/api/music")
 app.include_router(user_router, prefix="/api/user")
@@ -39,3 +69,10 @@ app.include_router(database_router, prefix="/api/database")
 @app.get("/")
 def root():
     return {"message": "Testing OK"}
+
+@app.get("/ready")
+def ready():
+    """Readiness probe: 503 until the database schema is checked and the recommender warm-up finished."""
+    is_ready = startup["database"] and recommender.ready
+    body = {"ready": is_ready, **startup, "recommender": recommender.status()["warmup"], "typeahead": typeahead.status()}
+    return JSONResponse(body, status_code=200 if is_ready else 503)
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, String, DateTime, BigInteger, Boolean, Index, Sequence, func
+from models.base import Base
+
+# One sequence for all users: a like or unlike takes the next value, so a client
+# that remembers the highest version it has seen can ask for everything after it
+liked_tracks_version_seq = Sequence("liked_tracks_version_seq")
+
+class LikedTrack(Base):
+    """
+    A user's liked track. Unliking keeps the row as a tombstone (removed=True) with
+    a new version so /user/liked_track_ids/delta can report the removal.
+    """
+    __tablename__ = "liked_tracks"
+
+    user_id = Column(String, primary_key=True)
+    track_id = Column(String, primary_key=True)
+    date_added = Column(DateTime, nullable=False, default=func.now())
+    version = Column(BigInteger, liked_tracks_version_seq, nullable=False, server_default=liked_tracks_version_seq.next_value())
+    removed = Column(Boolean, nullable=False, default=False, server_default="false")
+
+    __table_args__ = (
+        Index("ix_liked_tracks_user_version", "user_id", "version"),
+        Index("ix_liked_tracks_user_date_added", "user_id", "date_added"),
+    )
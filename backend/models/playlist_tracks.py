@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, func
+from sqlalchemy import Column, String, DateTime, Numeric, Index, func
 from models.base import Base
 
 class PlaylistTracks(Base):
@@ -7,6 +7,17 @@ class PlaylistTracks(Base):
     playlist_id = Column(String, primary_key=True)
     track_id = Column(String, primary_key=True)
     date_added = Column(DateTime, default=func.now())
+    # Sort key within the playlist. Unbounded NUMERIC, so a value strictly between
+    # any two neighbours always exists and a move rewrites only the moved row.
+    position = Column(Numeric, nullable=False)
+
+    __table_args__ = (
+        # Ordered reads of a playlist are index-only scans
+        Index(
+            "ix_playlist_tracks_playlist_position", "playlist_id", "position",
+            unique=True, postgresql_include=["track_id", "date_added"],
+        ),
+    )
 
 
 # 33959de9-c9fe-4a3c-965e-304b7a4bc68b
@@ -0,0 +1,12 @@
+from sqlalchemy import Column, String, Float, DateTime, func
+from sqlalchemy.dialects.postgresql import ARRAY
+from models.base import Base
+
+class RelatedTrack(Base):
+    """Precomputed nearest neighbours of a track, written by scripts/build_related_tracks.py"""
+    __tablename__ = "related_tracks"
+
+    track_id = Column(String, primary_key=True)
+    related_ids = Column(ARRAY(String), nullable=False)  # closest first
+    distances = Column(ARRAY(Float), nullable=False)  # aligned with related_ids
+    updated_at = Column(DateTime, default=func.now(), onupdate=func.now())
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, Float, Boolean
+from sqlalchemy import Column, String, Integer, Float, Boolean, Index
 from models.base import Base
 
 class Song(Base):
@@ -24,4 +24,10 @@ class Song(Base):
     track_genre = Column(String)
     artist_id = Column(String, primary_key=True)
     album_id = Column(String)
-    track_image_url = Column(String)
\ No newline at end of file
+    track_image_url = Column(String)
+
+    __table_args__ = (
+        # Keyset pages of an album's or artist's tracks
+        Index("ix_songs_album_track", "album_id", "track_id"),
+        Index("ix_songs_artist_track", "artist_id", "track_id"),
+    )
@@ -1,8 +1,17 @@
 print("Pre-loading models during Docker build...")
 try:
     from utils.recommender_loader import recommender
-    recommender.load()
+    from utils.artifact_cache import artifact_cache
+    # Warming up seeds the on-disk artifact and catalog caches baked into the
+    # image, so workers start by mapping files instead of downloading.
+    recommender.warm_up()
+    for name in ("music_index.index", "full_features.pkl"):
+        entry = artifact_cache.entry(name)
+        if entry:
+            print(f"Cached {name} (generation {entry['generation']}) at {entry['path']}")
+        else:
+            print(f"Warning: {name} is not cached, workers will download it on start")
     print("Models pre-loaded successfully during build!")
 except Exception as e:
     print(f"Failed to pre-load models: {e}")
-    # Don't fail the build, just warn
\ No newline at end of file
+    # Don't fail the build, just warn
@@ -1,5 +1,5 @@
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Body
-from typing import List, Union
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Query, Body, Request, Response
+from typing import List, Optional, Union
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from models.base import SessionLocal
@@ -8,36 +8,59 @@ from models.playlist_user import PlaylistUser
 from schemas.album import AlbumResponse
 from schemas.track import TrackResponse
 from schemas.user import UserResponse
-from schemas.playlist import PlaylistResponse
+from schemas.playlist import PlaylistResponse, PlaylistTrackPlacement, PlaylistTracksRequest, PlaylistTracksResult
 from schemas.artist import ArtistResponse
-from utils.format_ms import format_duration
+from schemas.liked_track import LikedTrackDelta
+from schemas.suggestion import SuggestionResponse
 from collections import defaultdict
 from utils.s3_mp3_url import generate_presigned_url
 from fastapi.responses import JSONResponse
+from starlette.concurrency import run_in_threadpool
 from datetime import datetime, timezone
 from zoneinfo import ZoneInfo
-import cloudinary
-import cloudinary.uploader
 import os
 from uuid import uuid4
 from dotenv import load_dotenv
 from utils.recommender_loader import recommender
+from utils.track_hydration import hydrate_tracks, build_track_responses, fetch_random_tracks
+from utils.library_cache import library_cache
+from utils.pagination import MAX_PAGE_SIZE, Page, count_total, decode_cursor, encode_cursor, page_size, set_page_headers, track_page
+from utils.playlist_tracks import MAX_BULK_TRACKS, add_tracks, insert_track, move_track, remove_tracks, song_exists
+from utils.liked_tracks import fetch_liked_tracks, like_track, liked_delta, liked_track_ids, stream_liked_tracks, unlike_track
+from utils.streaming import ndjson_response, stream_tracks, wants_ndjson
+from utils.search import SEARCH_DEFAULT_LIMIT, normalize_keyword, search_count_sql, search_params, search_query, search_total
+from utils.typeahead import KINDS, typeahead
 import random
 from models.user import User
-from .auth_routes import get_current_user
-import requests
+from .auth_routes import get_current_user, get_current_admin_user
+from functools import lru_cache
 
 ASIA_TIMEZONE = ZoneInfo("Asia/Bangkok")
+# Most recent liked tracks used to seed the local fallback recommender
+RECOMMENDATION_SEED_LIMIT = 50
 
 load_dotenv()
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_NAME"),
-    api_key=os.getenv("CLOUDINARY_KEY"),
-    api_secret=os.getenv("CLOUDINARY_SECRET"),
-    secure=True
-)
+# Cloudinary and Gemini SDKs are imported on first use to keep startup fast
+@lru_cache(maxsize=None)
+def cloudinary_uploader():
+    import cloudinary
+    import cloudinary.uploader
+
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_NAME"),
+        api_key=os.getenv("CLOUDINARY_KEY"),
+        api_secret=os.getenv("CLOUDINARY_SECRET"),
+        secure=True
+    )
+    return cloudinary.uploader
+
+@lru_cache(maxsize=None)
+def gemini():
+    import google.generativeai as genai
+
+    genai.configure(api_key=API_KEY)
+    return genai
 
 router = APIRouter()
 
@@ -49,111 +72,125 @@ def get_db():
         db.close()
 
 ### Playlist API
-@router.get("/user_playlist", response_model=List[PlaylistResponse])
-def get_user_playlists(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_id = current_user.id
-    query = text("""
-        SELECT playlist_user.playlist_id AS id, playlists.name, users.username AS owner_name, playlist_user.type, playlists.cover_image_url, playlists.description, playlist_user.created_at, playlist_user.last_played as last_played
-        FROM playlists
-        RIGHT JOIN playlist_user ON playlists.id = playlist_user.playlist_id
-        INNER JOIN users ON users.id = playlist_user.user_id
-        WHERE users.id = :user_id
-    """)
-    result = db.execute(query, {"user_id": user_id})
-    rows = result.fetchall()
-
-    # Convert to list of PlaylistResponse
+# The whole library in one round trip: artist and album entries take their name and
+# cover from the joined artist/album row instead of one lookup per entry
+LIBRARY_QUERY = text("""
+    SELECT pu.playlist_id AS id, p.name, u.username AS owner_name, pu.type,
+           p.cover_image_url, p.description, pu.created_at, pu.last_played,
+           ar.id AS artist_id, ar.name AS artist_name, ar.image_url AS artist_image_url,
+           al.id AS album_id, al.name AS album_name, al.image_url AS album_image_url
+    FROM playlist_user pu
+    INNER JOIN users u ON u.id = pu.user_id
+    LEFT JOIN playlists p ON p.id = pu.playlist_id
+    LEFT JOIN artists ar ON pu.type = 'artist' AND ar.id = pu.playlist_id
+    LEFT JOIN albums al ON pu.type IN ('single', 'composite') AND al.id = pu.playlist_id
+    WHERE pu.user_id = :user_id
+""")
+
+def fetch_library(db: Session, user_id: str) -> List[PlaylistResponse]:
     playlists = []
-    for row in rows:
-        playlist_id, name, owner_name, type_, cover, desc, created_at, last_played = row
-
-        if type_ == "artist":
-            artist_row = db.execute(text("""
-                SELECT name, image_url FROM artists WHERE id = :id
-            """), {"id": playlist_id}).fetchone()
-            if artist_row:
-                name, cover = artist_row
-                desc = f"Playlist của nghệ sĩ {name}"
-        
-        elif type_ == "single" or type_ == "composite":
-            song_row = db.execute(text("""
-                SELECT name, image_url FROM albums WHERE id = :id
-            """), {"id": playlist_id}).fetchone()
-            if song_row:
-                name, cover = song_row
-                desc = f"Single: {name}"
+    for row in db.execute(LIBRARY_QUERY, {"user_id": user_id}).fetchall():
+        name, cover, desc = row.name, row.cover_image_url, row.description
+
+        if row.type == "artist" and row.artist_id is not None:
+            name, cover = row.artist_name, row.artist_image_url
+            desc = f"Playlist của nghệ sĩ {name}"
+        elif row.type in ("single", "composite") and row.album_id is not None:
+            name, cover = row.album_name, row.album_image_url
+            desc = f"Single: {name}"
 
         playlists.append(PlaylistResponse(
-            id=playlist_id,
+            id=row.id,
             name=name,
-            owner_name=owner_name,
-            type=type_,
+            owner_name=row.owner_name,
+            type=row.type,
             cover_image_url=cover,
             description=desc,
-            created_at=created_at,
-            last_played=last_played
+            created_at=row.created_at,
+            last_played=row.last_played
         ))
-
     return playlists
 
+@router.get("/user_playlist", response_model=List[PlaylistResponse])
+def get_user_playlists(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+    user_id = current_user.id
+    return library_cache.get(user_id, lambda: fetch_library(db, user_id))
+
+def playlist_library_users(db: Session, playlist_id: str) -> List[str]:
+    """Users with `playlist_id` in their library: the owner and everyone who added it."""
+    rows = db.execute(text("""
+        SELECT user_id FROM playlist_user WHERE playlist_id = :playlist_id
+    """), {"playlist_id": playlist_id}).fetchall()
+    return [row[0] for row in rows]
+
+def page_cursor(cursor: Optional[str], scope: str):
+    try:
+        return decode_cursor(cursor, scope)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# Liked songs live in liked_tracks; their playlist row is only the library entry
+LIKED_PLAYLIST_OWNER_QUERY = text("""
+    SELECT pu.user_id
+    FROM playlists p
+    INNER JOIN playlist_user pu ON pu.playlist_id = p.id
+    WHERE p.id = :playlist_id AND p.name = 'Liked Songs'
+    LIMIT 1
+""")
+
 @router.get("/playlist/{playlist_id}/songs", response_model=List[TrackResponse])
-def get_playlist_songs(playlist_id: str, db: Session = Depends(get_db)):
+def get_playlist_songs(
+    playlist_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit both limit and cursor for the whole list"),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    limit = page_size(limit, cursor)
+    liked_owner = db.execute(LIKED_PLAYLIST_OWNER_QUERY, {"playlist_id": playlist_id}).scalar()
+    if liked_owner is not None:
+        try:
+            if wants_ndjson(request):
+                return ndjson_response(stream_liked_tracks(liked_owner, cursor))
+            page = fetch_liked_tracks(db, liked_owner, limit, cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        if not page.items and cursor is None:
+            raise HTTPException(status_code=404, detail="No songs found in this playlist")
+        set_page_headers(response, page)
+        return page.items
+
+    after_key, after_id = page_cursor(cursor, "playlist")
     query = text("""
+        WITH page AS (
+            SELECT ps.track_id, ps.date_added, ps.position
+            FROM playlist_tracks ps
+            WHERE ps.playlist_id = :playlist_id
+              AND (:after_id IS NULL OR (ps.position, ps.track_id) > (CAST(:after_key AS numeric), :after_id))
+            ORDER BY ps.position, ps.track_id
+            LIMIT :limit
+        )
         SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name, ab.id AS album_id, ab.name AS album_name,
-               s.duration_ms, s.track_image_url, ps.date_added
-        FROM songs s
-        INNER JOIN playlist_tracks ps ON s.track_id = ps.track_id
-        INNER JOIN playlist_user pu ON pu.playlist_id = ps.playlist_id
+               s.duration_ms, s.track_image_url, page.date_added, page.position
+        FROM page
+        INNER JOIN songs s ON s.track_id = page.track_id
         INNER JOIN artists at ON at.id = s.artist_id
         INNER JOIN albums ab ON ab.id = s.album_id
-        WHERE ps.playlist_id = :playlist_id
+        ORDER BY page.position, page.track_id, at.name
     """)
-    result = db.execute(query, {"playlist_id": playlist_id})
-    rows = result.fetchall()
+    params = {"playlist_id": playlist_id, "after_key": after_key, "after_id": after_id, "limit": limit}
+    if wants_ndjson(request):
+        return stream_tracks(query, params)
+    rows = db.execute(query, params).fetchall()
 
-    if not rows:
+    if not rows and cursor is None:
         raise HTTPException(status_code=404, detail="No songs found in this playlist")
 
-    # Aggregate artists by track
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        track_id = row[0]
-        track = track_map[track_id]
-        track["id"] = track_id
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
-        track["date_added"] = row[8]
-
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=track["date_added"].isoformat() if track["date_added"] else None
-        )
-        for track in track_map.values()
-    ]
+    total = count_total(db, "SELECT 1 FROM playlist_tracks WHERE playlist_id = :playlist_id", params) if cursor is None and limit is not None else (None, False)
+    page = track_page(rows, limit, "playlist", key_index=9, total=total)
+    set_page_headers(response, page)
+    return page.items
 
 @router.get("/playlist/{playlist_id}", response_model=PlaylistResponse)
 def get_playlist_info(playlist_id: str, db: Session = Depends(get_db)):
@@ -217,7 +254,7 @@ async def update_playlist(
         playlist.description = description
     if cover_image:
         try:
-            upload_result = cloudinary.uploader.upload(
+            upload_result = cloudinary_uploader().upload(
                 cover_image.file,
                 folder=f"playlist_covers/{playlist_id}",
                 public_id="cover",
@@ -227,7 +264,10 @@ async def update_playlist(
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+    library_users = playlist_library_users(db, playlist_id)
     db.commit()
+    for library_user_id in library_users:
+        library_cache.invalidate(library_user_id)
     db.refresh(playlist)
     return {"message": "Playlist updated", "cover_image_url": playlist.cover_image_url}
 
@@ -244,6 +284,9 @@ def delete_playlist(playlist_id: str, db: Session = Depends(get_db),current_user
     if not ownership:
         raise HTTPException(status_code=404, detail="Playlist not found or not owned by user")
     
+    # Read before the rows go away: every library holding the playlist is invalidated
+    library_users = playlist_library_users(db, playlist_id)
+
     # First delete all songs from the playlist
     db.execute(text("""
         DELETE FROM playlist_tracks
@@ -263,6 +306,8 @@ def delete_playlist(playlist_id: str, db: Session = Depends(get_db),current_user
     """), {"playlist_id": playlist_id})
 
     db.commit()
+    for library_user_id in library_users:
+        library_cache.invalidate(library_user_id)
 
     return {"message": "Playlist deleted successfully"}
 
@@ -281,7 +326,7 @@ async def create_playlist(
 
     if cover_image:
         try:
-            upload_result = cloudinary.uploader.upload(
+            upload_result = cloudinary_uploader().upload(
                 cover_image.file,
                 folder=f"user_{user_id}/playlist_covers/{playlist_id}",
                 public_id="cover",
@@ -303,6 +348,7 @@ async def create_playlist(
     db.add(playlist)
     db.add(PlaylistUser(user_id=user_id, playlist_id=playlist_id, type="playlist"))
     db.commit()
+    library_cache.invalidate(user_id)
 
     return {
         "id": playlist_id,
@@ -318,31 +364,75 @@ def remove_track_from_playlist(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    # Verify ownership
-    ownership = db.execute(text("""
-        SELECT 1 FROM playlist_user
-        WHERE playlist_id = :playlist_id AND user_id = :user_id AND type = 'playlist'
-    """), {"playlist_id": playlist_id, "user_id": current_user.id}).fetchone()
-    
-    if not ownership:
+    result = remove_tracks(db, playlist_id, current_user.id, [track_id])
+    if not result.owned:
         raise HTTPException(status_code=403, detail="You don't have permission to modify this playlist")
-    
-    delete_query = text("""
-        DELETE FROM playlist_tracks
-        WHERE playlist_id = :playlist_id AND track_id = :track_id
-    """)
-    result = db.execute(delete_query, {
-        "playlist_id": playlist_id,
-        "track_id": track_id
-    })
-    
-    if result.rowcount == 0:
+    if result.changed == 0:
         raise HTTPException(status_code=404, detail="Track not found in playlist")
-    
-    db.commit()
 
     return {"message": "Track removed from playlist"}
 
+@router.post("/playlist/{playlist_id}/remove_tracks", response_model=PlaylistTracksResult)
+def remove_tracks_from_playlist(
+    playlist_id: str,
+    request: PlaylistTracksRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if len(request.track_ids) > MAX_BULK_TRACKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TRACKS} tracks per request")
+
+    result = remove_tracks(db, playlist_id, current_user.id, request.track_ids)
+    if not result.owned:
+        raise HTTPException(status_code=403, detail="You don't have permission to modify this playlist")
+    return PlaylistTracksResult(removed=result.changed, skipped=result.requested - result.changed)
+
+@router.put("/playlist/{playlist_id}/move_track")
+def move_track_in_playlist(
+    playlist_id: str,
+    placement: PlaylistTrackPlacement,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if placement.track_id == placement.after_track_id:
+        raise HTTPException(status_code=400, detail="A track cannot be moved after itself")
+
+    result = move_track(db, playlist_id, current_user.id, placement.track_id, placement.after_track_id)
+    if not result.owned:
+        raise HTTPException(status_code=403, detail="You don't have permission to modify this playlist")
+    if not result.anchor_found:
+        raise HTTPException(status_code=404, detail="after_track_id is not in this playlist")
+    if not result.changed:
+        raise HTTPException(status_code=404, detail="Track not found in playlist")
+
+    return {"message": "Track moved"}
+
+@router.post("/playlist/{playlist_id}/insert_track")
+def insert_track_into_playlist(
+    playlist_id: str,
+    placement: PlaylistTrackPlacement,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    result = insert_track(
+        db,
+        playlist_id,
+        current_user.id,
+        placement.track_id,
+        placement.after_track_id,
+        datetime.now(ASIA_TIMEZONE).replace(tzinfo=None),
+    )
+    if not result.owned:
+        raise HTTPException(status_code=403, detail="You don't have permission to modify this playlist")
+    if not result.anchor_found:
+        raise HTTPException(status_code=404, detail="after_track_id is not in this playlist")
+    if not result.changed:
+        if not song_exists(db, placement.track_id):
+            raise HTTPException(status_code=404, detail="Track not found")
+        raise HTTPException(status_code=409, detail="Track already exists in playlist")
+
+    return {"message": "Track successfully added to playlist"}
+
 ### Album API
 
 @router.get("/album/{album_id}", response_model=AlbumResponse)
@@ -386,63 +476,45 @@ def get_album_by_id(album_id: str, db: Session = Depends(get_db)):
     )
 
 @router.get("/album/{album_id}/songs", response_model=List[TrackResponse])
-def get_album_songs(album_id: str, db: Session = Depends(get_db)):
+def get_album_songs(
+    album_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit both limit and cursor for the whole list"),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    limit = page_size(limit, cursor)
+    _, after_id = page_cursor(cursor, "album")
     query = text("""
+        WITH page AS (
+            SELECT DISTINCT track_id
+            FROM songs
+            WHERE album_id = :album_id AND (:after_id IS NULL OR track_id > :after_id)
+            ORDER BY track_id
+            LIMIT :limit
+        )
         SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name, 
                ab.id AS album_id, ab.name AS album_name,
                s.duration_ms, s.track_image_url
-        FROM songs s
+        FROM page
+        INNER JOIN songs s ON s.track_id = page.track_id
         INNER JOIN albums ab ON ab.id = s.album_id
         INNER JOIN artists at ON at.id = s.artist_id
-        WHERE ab.id = :album_id
         ORDER BY s.track_id, at.name
     """)
-    result = db.execute(query, {"album_id": album_id})
-    rows = result.fetchall()
+    params = {"album_id": album_id, "after_id": after_id, "limit": limit}
+    if wants_ndjson(request):
+        return stream_tracks(query, params)
+    rows = db.execute(query, params).fetchall()
 
-    if not rows:
+    if not rows and cursor is None:
         raise HTTPException(status_code=404, detail="No songs found in this album")
 
-    # Aggregate artists by track (same logic as your playlist endpoint)
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        track_id = row[0]
-        track = track_map[track_id]
-        track["id"] = track_id
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
-        track["date_added"] = None
-
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=track["date_added"].isoformat() if track["date_added"] else None
-        )
-        for track in track_map.values()
-    ]
+    total = count_total(db, "SELECT DISTINCT track_id FROM songs WHERE album_id = :album_id", params) if cursor is None and limit is not None else (None, False)
+    page = track_page(rows, limit, "album", total=total)
+    set_page_headers(response, page)
+    return page.items
 
 @router.post("/user/add_track_to_playlist")
 def add_track_to_playlist(
@@ -451,41 +523,45 @@ def add_track_to_playlist(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    user_id = current_user.id
-    
-    # Verify ownership
-    ownership = db.execute(text("""
-        SELECT 1 FROM playlist_user
-        WHERE playlist_id = :playlist_id AND user_id = :user_id AND type = 'playlist'
-    """), {"playlist_id": playlist_id, "user_id": user_id}).fetchone()
-    
-    if not ownership:
+    result = add_tracks(db, playlist_id, current_user.id, [track_id], datetime.now(ASIA_TIMEZONE).replace(tzinfo=None))
+    if not result.owned:
         raise HTTPException(status_code=403, detail="You don't have permission to modify this playlist")
-    
-    # Step 1: Check if track already exists
-    existing = db.execute(text("""
-        SELECT 1 FROM playlist_tracks
-        WHERE playlist_id = :playlist_id AND track_id = :track_id
-    """), {"playlist_id": playlist_id, "track_id": track_id}).fetchone()
-
-    if existing:
+    if result.changed == 0:
+        if not song_exists(db, track_id):
+            raise HTTPException(status_code=404, detail="Track not found")
         raise HTTPException(status_code=409, detail="Track already exists in playlist")
 
-    # Step 2: Insert the track
-    local_time = datetime.now(ZoneInfo("Asia/Bangkok"))
-    naive_time = local_time.replace(tzinfo=None)
-    db.execute(text("""
-        INSERT INTO playlist_tracks (playlist_id, track_id, date_added)
-        VALUES (:playlist_id, :track_id, :date_added)
-    """), {
-        "playlist_id": playlist_id,
-        "track_id": track_id,
-        "date_added": naive_time
-    })
-
-    db.commit()
     return {"message": "Track successfully added to playlist"}
 
+@router.post("/playlist/{playlist_id}/add_tracks", response_model=PlaylistTracksResult)
+def add_tracks_to_playlist(
+    playlist_id: str,
+    request: PlaylistTracksRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    if len(request.track_ids) > MAX_BULK_TRACKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TRACKS} tracks per request")
+    if not (request.track_ids or request.source_album_id or request.source_playlist_id):
+        raise HTTPException(status_code=400, detail="Give track_ids, source_album_id or source_playlist_id")
+
+    result = add_tracks(
+        db,
+        playlist_id,
+        current_user.id,
+        request.track_ids,
+        datetime.now(ASIA_TIMEZONE).replace(tzinfo=None),
+        source_album_id=request.source_album_id,
+        source_playlist_id=request.source_playlist_id,
+    )
+    if not result.owned:
+        raise HTTPException(status_code=403, detail="You don't have permission to modify this playlist")
+    if not result.source_found:
+        raise HTTPException(status_code=404, detail="Source playlist not found in your library")
+    if result.requested > MAX_BULK_TRACKS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_TRACKS} tracks per request")
+    return PlaylistTracksResult(added=result.changed, skipped=result.requested - result.changed)
+
 @router.post("/add_to_library/{item_id}")
 def add_to_library(
     item_id: str,
@@ -517,6 +593,7 @@ def add_to_library(
 
     db.add(new_entry)
     db.commit()
+    library_cache.invalidate(user_id)
     return {"message": "Item added to library successfully"}
 
 @router.delete("/remove_from_library/{item_id}")
@@ -539,6 +616,7 @@ def remove_from_library(
         raise HTTPException(status_code=404, detail="Playlist not found in library")
     
     db.commit()
+    library_cache.invalidate(user_id)
 
     return {"message": "Playlist removed from library"}
 
@@ -558,147 +636,83 @@ def get_artist_by_id(artist_id: str, db: Session = Depends(get_db)):
     )
 
 @router.get("/artist/{artist_id}/songs", response_model=List[TrackResponse])
-def get_artist_songs(artist_id: str, db: Session = Depends(get_db)):
+def get_artist_songs(
+    artist_id: str,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit both limit and cursor for the whole list"),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    limit = page_size(limit, cursor)
+    _, after_id = page_cursor(cursor, "artist")
     query = text("""
+        WITH page AS (
+            SELECT track_id
+            FROM songs
+            WHERE artist_id = :artist_id AND (:after_id IS NULL OR track_id > :after_id)
+            ORDER BY track_id
+            LIMIT :limit
+        )
         SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name, 
                ab.id AS album_id, ab.name AS album_name,
                s.duration_ms, s.track_image_url
-        FROM songs s
+        FROM page
+        INNER JOIN songs s ON s.track_id = page.track_id
         INNER JOIN artists at ON at.id = s.artist_id
         INNER JOIN albums ab ON ab.id = s.album_id
-        WHERE s.track_id IN (
-            SELECT DISTINCT s2.track_id 
-            FROM songs s2 
-            WHERE s2.artist_id = :artist_id
-        )
         ORDER BY s.track_id, at.name
     """)
-    result = db.execute(query, {"artist_id": artist_id})
-    rows = result.fetchall()
+    params = {"artist_id": artist_id, "after_id": after_id, "limit": limit}
+    if wants_ndjson(request):
+        return stream_tracks(query, params)
+    rows = db.execute(query, params).fetchall()
 
-    if not rows:
+    if not rows and cursor is None:
         raise HTTPException(status_code=404, detail="No songs found for this artist")
 
-    # Aggregate artists by track (same logic as album/playlist endpoints)
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        track_id = row[0]
-        track = track_map[track_id]
-        track["id"] = track_id
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
-        track["date_added"] = None
-
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=track["date_added"].isoformat() if track["date_added"] else None
-        )
-        for track in track_map.values()
-    ]
+    total = count_total(db, "SELECT track_id FROM songs WHERE artist_id = :artist_id", params) if cursor is None and limit is not None else (None, False)
+    page = track_page(rows, limit, "artist", total=total)
+    set_page_headers(response, page)
+    return page.items
 
 ### Search API
 @router.get("/search", response_model=Union[List[TrackResponse], List[AlbumResponse], List[ArtistResponse]])
 def search_items(
+    request: Request,
+    response: Response,
     query: str = Query(..., alias="query", description="Search keyword"),  # <-- use alias
     filter_by: str = Query("track", description="Search filter: track, album, or artist"),
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description=f"Page size, {SEARCH_DEFAULT_LIMIT} when omitted"),
+    cursor: Optional[str] = None,
     db: Session = Depends(get_db)
 ):
-    keyword_like = f"%{query.lower()}%"
+    if filter_by not in ("track", "album", "artist"):
+        return []
 
-    if filter_by == "track":
-        query = text("""
-            WITH filtered_songs AS (
-                SELECT * FROM songs 
-                WHERE LOWER(track_name) LIKE :keyword
-                LIMIT 50
-            )
-            SELECT fs.track_id, fs.track_name, a.id AS artist_id, a.name AS artist_name, al.id AS album_id, al.name AS album_name,
-                fs.duration_ms, fs.track_image_url
-            FROM filtered_songs fs
-            JOIN artists a ON fs.artist_id = a.id
-            JOIN albums al ON fs.album_id = al.id
-        """)
-        rows = db.execute(query, {"keyword": keyword_like}).fetchall()
-
-        if not rows:
-            raise HTTPException(status_code=404, detail="No songs found in this playlist")
+    # Results come best first: word similarity to the keyword plus popularity
+    keyword = normalize_keyword(query)
+    after_key, after_id = page_cursor(cursor, f"search:{filter_by}")
+    search = search_query(filter_by, keyword)
 
-        # Aggregate artists by track
-        track_map = defaultdict(lambda: {
-            "id": None,
-            "title": None,
-            "artist_id": set(),
-            "artists": set(),
-            "album_id": None,
-            "album": None,
-            "duration": None,
-            "cover_url": None,
-            "date_added": None,
-        })
+    if filter_by == "track" and wants_ndjson(request):
+        # Streamed, so every match (up to SEARCH_CANDIDATE_LIMIT) when no limit is given
+        return stream_tracks(search, search_params(keyword, page_size(limit, cursor), after_key, after_id))
 
-        for row in rows:
-            track_id = row[0]
-            track = track_map[track_id]
-            track["id"] = track_id
-            track["title"] = row[1]
-            track["artist_id"].add(row[2])
-            track["artists"].add(row[3])
-            track["album_id"] = row[4]
-            track["album"] = row[5]
-            track["duration"] = format_duration(row[6])
-            track["cover_url"] = row[7]
-            track["date_added"] = None
+    limit = page_size(limit, cursor) or SEARCH_DEFAULT_LIMIT
+    params = search_params(keyword, limit, after_key, after_id)
+    rows = db.execute(search, params).fetchall()
+    total = search_total(*count_total(db, search_count_sql(filter_by, keyword), params)) if cursor is None else (None, False)
 
-        return [
-            TrackResponse(
-                id=track["id"],
-                title=track["title"],
-                artist_id=", ".join(sorted(track["artist_id"])),
-                artist=", ".join(sorted(track["artists"])),
-                album_id=track["album_id"],
-                album=track["album"],
-                duration=track["duration"],
-                cover_url=track["cover_url"],
-                date_added=track["date_added"].isoformat() if track["date_added"] else None
-            )
-            for track in track_map.values()
-        ]
+    if filter_by == "track":
+        if not rows and cursor is None:
+            raise HTTPException(status_code=404, detail="No songs found in this playlist")
 
-    elif filter_by == "album":
-        query = text("""
-            SELECT ab.id AS album_id, ab.name, ab.image_url, ab.release_date,
-                   at.id AS artist_id, at.name AS artist_name
-            FROM albums ab
-            JOIN album_artists aa ON ab.id = aa.album_id
-            JOIN artists at ON aa.artist_id = at.id
-            WHERE LOWER(ab.name) LIKE :keyword
-        """)
-        rows = db.execute(query, {"keyword": keyword_like}).fetchall()
+        page = track_page(rows, limit, "search:track", key_index=9, total=total)
+        set_page_headers(response, page)
+        return page.items
 
+    elif filter_by == "album":
         album_map = defaultdict(lambda: {
             "id": None,
             "name": None,
@@ -718,6 +732,9 @@ def search_items(
             album["artist_ids"].add(row[4])
             album["artist_names"].add(row[5])
 
+        next_cursor = encode_cursor("search:album", rows[-1][6], rows[-1][0]) if len(album_map) == limit else None
+        set_page_headers(response, Page(None, next_cursor, *total))
+
         return [
             AlbumResponse(
                 id=album["id"],
@@ -730,24 +747,35 @@ def search_items(
             for album in album_map.values()
         ]
 
-    elif filter_by == "artist":
-        query = text("""
-            SELECT id, name, image_url
-            FROM artists
-            WHERE LOWER(name) LIKE :keyword
-        """)
-        rows = db.execute(query, {"keyword": keyword_like}).fetchall()
+    next_cursor = encode_cursor("search:artist", rows[-1][3], rows[-1][0]) if len(rows) == limit else None
+    set_page_headers(response, Page(None, next_cursor, *total))
 
-        return [
-            ArtistResponse(
-                id=row[0],
-                name=row[1],
-                profile_image_url=row[2],
-            )
-            for row in rows
-        ]
+    return [
+        ArtistResponse(
+            id=row[0],
+            name=row[1],
+            profile_image_url=row[2],
+        )
+        for row in rows
+    ]
 
-    return []
+@router.get("/search/suggest", response_model=List[SuggestionResponse])
+def suggest_items(
+    query: str = Query(..., description="What has been typed so far"),
+    limit: int = Query(10, ge=1, le=50),
+    filter_by: Optional[str] = Query(None, description="track, album or artist; all three when omitted"),
+):
+    # Served from the in-process typeahead index; no database access
+    if filter_by is not None and filter_by not in KINDS:
+        raise HTTPException(status_code=400, detail="filter_by must be track, album or artist")
+    if typeahead.state != "ready":
+        raise HTTPException(status_code=503, detail="Suggestions are not loaded yet")
+
+    kinds = None if filter_by is None else [filter_by]
+    return [
+        SuggestionResponse(type=kind, id=item_id, name=name)
+        for kind, item_id, name in typeahead.suggest(query, limit, kinds)
+    ]
 
 @router.get("/mp3url/{track_name}")
 def get_mp3_url(track_name: str):
@@ -760,75 +788,38 @@ def get_mp3_url(track_name: str):
         return JSONResponse(status_code=500, content={"detail": str(e)})
 
 @router.get("/user/liked_track", response_model=List[TrackResponse])
-def get_liked_tracks(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_id = current_user.id
-    query = text("""
-        SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name, ab.id AS album_id, ab.name AS album_name,
-               s.duration_ms, s.track_image_url, pt.date_added
-        FROM songs s
-        INNER JOIN playlist_tracks pt ON s.track_id = pt.track_id
-        INNER JOIN playlist_user pu ON pu.playlist_id = pt.playlist_id
-        INNER JOIN playlists p ON p.id = pt.playlist_id
-        INNER JOIN artists at ON at.id = s.artist_id
-        INNER JOIN albums ab ON ab.id = s.album_id
-        WHERE pu.user_id = :user_id AND p.name = 'Liked Songs'
-    """)
-    result = db.execute(query, {"user_id": user_id})
-    rows = result.fetchall()
-
-    # Aggregate artists by track
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        track_id = row[0]
-        track = track_map[track_id]
-        track["id"] = track_id
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
-        track["date_added"] = row[8]
+def get_liked_tracks(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit both limit and cursor for the whole list"),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    limit = page_size(limit, cursor)
+    try:
+        if wants_ndjson(request):
+            return ndjson_response(stream_liked_tracks(current_user.id, cursor))
+        page = fetch_liked_tracks(db, current_user.id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_page_headers(response, page)
+    return page.items
 
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=track["date_added"].isoformat() if track["date_added"] else None
-        )
-        for track in track_map.values()
-    ]
+def fetch_liked_track_ids(db: Session, user_id: str, limit: int = None):
+    return liked_track_ids(db, user_id, limit)
 
 @router.get("/user/liked_track_ids", response_model=List[str])
 def get_liked_track_ids(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    user_id = current_user.id
-    query = text("""
-        SELECT pt.track_id
-        FROM playlist_tracks pt
-        INNER JOIN playlist_user pu ON pu.playlist_id = pt.playlist_id
-        INNER JOIN playlists p ON p.id = pt.playlist_id
-        WHERE pu.user_id = :user_id AND p.name = 'Liked Songs'
-    """)
-    result = db.execute(query, {"user_id": user_id}).fetchall()
-    return [row[0] for row in result]
+    return fetch_liked_track_ids(db, current_user.id)
+
+@router.get("/user/liked_track_ids/delta", response_model=LikedTrackDelta)
+def get_liked_track_ids_delta(
+    since: int = Query(0, ge=0),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    return liked_delta(db, current_user.id, since)
 
 
 @router.post("/user/liked_track")
@@ -837,65 +828,9 @@ def add_to_liked_playlist(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    user_id = current_user.id
-    local_time = datetime.now(ZoneInfo("Asia/Bangkok"))
-    naive_time = local_time.replace(tzinfo=None)
-    # Get Liked Songs playlist ID (p.name = 'Liked Songs' is error)
-    playlist_query = text("""
-        SELECT p.id FROM playlists p
-        INNER JOIN playlist_user pu ON pu.playlist_id = p.id
-        WHERE pu.user_id = :user_id AND p.name = 'Liked Songs' 
-        LIMIT 1
-    """)
-    result = db.execute(playlist_query, {"user_id": user_id}).first()
-    
-    # Auto-create Liked Songs playlist if it doesn't exist
-    if not result:
-        # Create the playlist using ORM (not raw SQL to avoid schema issues)
-        liked_playlist = Playlist(
-            name="Liked Songs",
-            description="Your personal liked songs collection",
-            cover_image_url="https://misc.scdn.co/liked-songs/liked-songs-640.png",
-        )
-        db.add(liked_playlist)
-        db.commit()
-        db.refresh(liked_playlist)
-        
-        playlist_id = liked_playlist.id
-        
-        # Link playlist to user
-        playlist_user = PlaylistUser(
-            playlist_id=playlist_id,
-            user_id=user_id,
-            type="playlist",
-        )
-        db.add(playlist_user)
-        db.commit()
-    else:
-        playlist_id = result[0]
-
-    # Check if track is already added
-    exists_query = text("""
-        SELECT 1 FROM playlist_tracks
-        WHERE playlist_id = :playlist_id AND track_id = :track_id
-        LIMIT 1
-    """)
-    exists = db.execute(exists_query, {"playlist_id": playlist_id, "track_id": track_id}).first()
-    if exists:
-        raise HTTPException(status_code=409, detail="Track already in Liked Songs")
-
-    # Insert the track
-    insert_query = text("""
-        INSERT INTO playlist_tracks (playlist_id, track_id, date_added)
-        VALUES (:playlist_id, :track_id, :date_added)
-    """)
-    db.execute(insert_query, {
-        "playlist_id": playlist_id,
-        "track_id": track_id,
-        "date_added": naive_time
-    })
-    db.commit()
-
+    # Idempotent: liking an already liked track is a no-op
+    if not like_track(db, current_user.id, track_id, ASIA_TIMEZONE):
+        return {"message": "Track already in Liked Songs"}
     return {"message": "Track added to Liked Songs"}
 
 @router.delete("/user/liked_track")
@@ -904,35 +839,9 @@ def remove_from_liked_playlist(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    user_id = current_user.id
-    try:
-        # Find Liked Songs playlist ID
-        playlist_query = text("""
-            SELECT pu.playlist_id
-            FROM playlist_user pu
-            JOIN playlists p ON pu.playlist_id = p.id
-            WHERE pu.user_id = :user_id AND p.name = 'Liked Songs'
-        """)
-        result = db.execute(playlist_query, {"user_id": user_id}).fetchone()
-
-        if not result:
-            raise HTTPException(status_code=404, detail="Liked Songs playlist not found.")
-
-        playlist_id = result[0]
-
-        # Remove the track from the playlist
-        delete_query = text("""
-            DELETE FROM playlist_tracks
-            WHERE playlist_id = :playlist_id AND track_id = :track_id
-        """)
-        db.execute(delete_query, {"playlist_id": playlist_id, "track_id": track_id})
-        db.commit()
-
-        return {"message": "Track removed from liked songs."}
-    
-    except Exception as e:
-        db.rollback()
-        raise HTTPException(status_code=500, detail=str(e))
+    if not unlike_track(db, current_user.id, track_id):
+        return {"message": "Track was not in liked songs."}
+    return {"message": "Track removed from liked songs."}
 
 # @router.get("/related")  
 # def get_recommendations(track_id: str = Query(...)):
@@ -943,233 +852,100 @@ def remove_from_liked_playlist(
 #     similar = recommender.data_df.iloc[indices[0][1:]]
 #     return similar[['track_id', 'track_name', 'artists', 'track_genre', 'popularity']].to_dict(orient="records")
 
+# Internal versions, error text and memory figures: admins only
+@router.get("/recommender/metrics")
+def get_recommender_metrics(current_user: User = Depends(get_current_admin_user)):
+    return recommender.metrics()
+
+@router.get("/recommender/status")
+def get_recommender_status(current_user: User = Depends(get_current_admin_user)):
+    return recommender.status()
+
+@router.post("/recommender/reload", status_code=202)
+def reload_recommender(current_user: User = Depends(get_current_admin_user)):
+    active_version = recommender.snapshot.version
+    if not recommender.request_reload():
+        raise HTTPException(status_code=409, detail="A recommender reload is already in progress")
+    return {"message": "Recommender reload started", "active_version": active_version}
+
+def fetch_precomputed_related(db: Session, track_id: str, limit: int = 3):
+    # Precomputed neighbours (scripts/build_related_tracks.py): one indexed lookup
+    query = text("""
+        WITH related AS (
+            SELECT related_id
+            FROM related_tracks rt, unnest(rt.related_ids) AS related_id
+            WHERE rt.track_id = :track_id
+            ORDER BY RANDOM()
+            LIMIT :limit
+        )
+        SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
+               ab.id AS album_id, ab.name AS album_name,
+               s.duration_ms, s.track_image_url
+        FROM related r
+        JOIN songs s ON s.track_id = r.related_id
+        JOIN artists at ON at.id = s.artist_id
+        JOIN albums ab ON ab.id = s.album_id
+    """)
+    return build_track_responses(db.execute(query, {"track_id": track_id, "limit": limit}).fetchall())
+
+# The recommendation routes are async so remote store lookups wait on the event loop
+# (see Recommender.astore_lookup); blocking DB calls go through run_in_threadpool.
 @router.get("/related/{track_id}", response_model=List[TrackResponse])
-def get_related_songs(track_id: str, db: Session = Depends(get_db)):
-    rows = []
-    
+async def get_related_songs(track_id: str, db: Session = Depends(get_db)):
+    tracks = await run_in_threadpool(fetch_precomputed_related, db, track_id)
+    if tracks:
+        return tracks
+
     # Try to get related tracks from recommender
     try:
-        similar_ids = recommender.get_related_tracks(track_id)
+        similar_ids = await recommender.aget_related_tracks(track_id)
         if similar_ids:
             track_ids = random.sample(similar_ids, min(3, len(similar_ids)))
-            for tid in track_ids:
-                query = text("""
-                    SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
-                           ab.id AS album_id, ab.name AS album_name,
-                           s.duration_ms, s.track_image_url
-                    FROM songs s
-                    JOIN artists at ON at.id = s.artist_id
-                    JOIN albums ab ON ab.id = s.album_id
-                    WHERE s.track_id = :track_id
-                """)
-                row = db.execute(query, {"track_id": tid}).fetchone()
-                if row:
-                    rows.append(row)
+            tracks = await run_in_threadpool(hydrate_tracks, db, track_ids)
     except Exception as e:
         print(f"Related tracks error: {e}")
 
     # Fallback: If no related tracks found, get random tracks from the database
-    if not rows:
-        query = text("""
-            SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
-                   ab.id AS album_id, ab.name AS album_name,
-                   s.duration_ms, s.track_image_url
-            FROM songs s
-            JOIN artists at ON at.id = s.artist_id
-            JOIN albums ab ON ab.id = s.album_id
-            WHERE s.track_id != :current_track_id
-            ORDER BY RANDOM()
-            LIMIT 3
-        """)
-        rows = db.execute(query, {"current_track_id": track_id}).fetchall()
+    if not tracks:
+        tracks = await run_in_threadpool(fetch_random_tracks, db, 3, track_id)
 
-    if not rows:
-        return []
-
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        tid = row[0]
-        track = track_map[tid]
-        track["id"] = tid
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
-
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=None 
-        )
-        for track in track_map.values()
-    ]
+    return tracks
 
 
 @router.get("/recommendations", response_model=List[TrackResponse])
-def get_recommendations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
+async def get_recommendations(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
     user_id = current_user.id
-    rows = []
+    tracks = []
     
-    # Try to get recommendations from BigQuery first
+    # Try to get recommendations from the recommendation store first
     try:
-        recommended_track_ids = recommender.get_recommendations(user_id)
+        recommended_track_ids = await recommender.aget_recommendations(
+            user_id, seed_loader=lambda: fetch_liked_track_ids(db, user_id, RECOMMENDATION_SEED_LIMIT)
+        )
         if recommended_track_ids:
-            for tid in recommended_track_ids:
-                query = text("""
-                    SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
-                           ab.id AS album_id, ab.name AS album_name,
-                           s.duration_ms, s.track_image_url
-                    FROM songs s
-                    JOIN artists at ON at.id = s.artist_id
-                    JOIN albums ab ON ab.id = s.album_id
-                    WHERE s.track_id = :track_id
-                """)
-                row = db.execute(query, {"track_id": tid}).fetchone()
-                if row:
-                    rows.append(row)
+            tracks = await run_in_threadpool(hydrate_tracks, db, recommended_track_ids)
     except Exception as e:
         print(f"Recommendation error: {e}")
     
     # Fallback: If no recommendations found, get random tracks from the database
-    if not rows:
-        query = text("""
-            SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
-                   ab.id AS album_id, ab.name AS album_name,
-                   s.duration_ms, s.track_image_url
-            FROM songs s
-            JOIN artists at ON at.id = s.artist_id
-            JOIN albums ab ON ab.id = s.album_id
-            ORDER BY RANDOM()
-            LIMIT 15
-        """)
-        rows = db.execute(query).fetchall()
-
-    if not rows:
-        return []
-
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        track_id = row[0]
-        track = track_map[track_id]
-        track["id"] = track_id
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
+    if not tracks:
+        tracks = await run_in_threadpool(fetch_random_tracks, db, 15)
 
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=None 
-        )
-        for track in track_map.values()
-    ]
+    return tracks
 
 @router.get("/recommendations/emotion/{emo}", response_model=List[TrackResponse])
-def get_emo_recommendations(
+async def get_emo_recommendations(
     emo: str,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    recommended_track_ids = recommender.get_emo_recommendations(current_user.id, emo)
+    recommended_track_ids = await recommender.aget_emo_recommendations(
+        current_user.id, emo, seed_loader=lambda: fetch_liked_track_ids(db, current_user.id, RECOMMENDATION_SEED_LIMIT)
+    )
     if not recommended_track_ids:
         return []
 
-    rows = []
-    for tid in recommended_track_ids:
-        query = text("""
-            SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
-                   ab.id AS album_id, ab.name AS album_name,
-                   s.duration_ms, s.track_image_url
-            FROM songs s
-            JOIN artists at ON at.id = s.artist_id
-            JOIN albums ab ON ab.id = s.album_id
-            WHERE s.track_id = :track_id
-        """)
-        row = db.execute(query, {"track_id": tid}).fetchone()
-        if row:
-            rows.append(row)
-
-    track_map = defaultdict(lambda: {
-        "id": None,
-        "title": None,
-        "artist_id": set(),
-        "artists": set(),
-        "album_id": None,
-        "album": None,
-        "duration": None,
-        "cover_url": None,
-        "date_added": None,
-    })
-
-    for row in rows:
-        track_id = row[0]
-        track = track_map[track_id]
-        track["id"] = track_id
-        track["title"] = row[1]
-        track["artist_id"].add(row[2])
-        track["artists"].add(row[3])
-        track["album_id"] = row[4]
-        track["album"] = row[5]
-        track["duration"] = format_duration(row[6])
-        track["cover_url"] = row[7]
-
-    return [
-        TrackResponse(
-            id=track["id"],
-            title=track["title"],
-            artist_id=", ".join(sorted(track["artist_id"])),
-            artist=", ".join(sorted(track["artists"])),
-            album_id=track["album_id"],
-            album=track["album"],
-            duration=track["duration"],
-            cover_url=track["cover_url"],
-            date_added=None 
-        )
-        for track in track_map.values()
-    ]
+    return await run_in_threadpool(hydrate_tracks, db, recommended_track_ids)
 
 ### Library API
 @router.put("/library/{item_id}/last_played")
@@ -1190,14 +966,12 @@ def update_last_played(
     entry.last_played = asia_time.replace(tzinfo=None)
     
     db.commit()
+    library_cache.invalidate(current_user.id)
     return {"message": f"Updated last_played for item {item_id}"}
 
 
 # Corrected Gemini configuration
 API_KEY = os.getenv("GEMINI_API_KEY")
-import google.generativeai as genai
-
-genai.configure(api_key=API_KEY)
 
 @router.post("/ask")
 async def ask_gemini(prompt: str = Form(...)):
@@ -1233,7 +1007,7 @@ User input:
 """
 
     try:
-        model = genai.GenerativeModel('gemini-2.0-flash-exp')
+        model = gemini().GenerativeModel('gemini-2.0-flash-exp')
         response = model.generate_content(final_prompt)
 
         # Extract the response text
@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from typing import Dict, Any
 import psycopg2
 import os
+from uuid import uuid4
 from dotenv import load_dotenv
+from utils.liked_tracks import cache_key, liked_cache
+from utils.playlist_tracks import position_between
+from utils.streaming import STREAM_BATCH_SIZE, ndjson_response, wants_ndjson
+from utils.typeahead import TABLE_ID_COLUMNS, typeahead
 from .auth_routes import get_current_admin_user
 
 load_dotenv("backend/.env")
@@ -55,8 +60,55 @@ def get_table_schema(table_name: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def typeahead_albums_before(cur, table_name: str, entity_id):
+    # Read before a song is updated or deleted: the album it leaves is re-scored too
+    if table_name != "songs" or entity_id is None:
+        return []
+    return typeahead.song_album_ids(cur, [entity_id])
+
+def record_typeahead_change(cur, table_name: str, entity_id, album_ids=()):
+    # Keeps /search/suggest in step with admin edits. The edit is already committed,
+    # so a failure here is only logged; the index catches up on the next restart.
+    if table_name not in TABLE_ID_COLUMNS or entity_id is None:
+        return
+    try:
+        typeahead.record_rows(cur, table_name, [entity_id], album_ids)
+    except Exception as e:
+        print(f"Warning: Could not update the typeahead index: {e}")
+
+def table_exists(table_name: str) -> bool:
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass(%s) IS NOT NULL", (f'public."{table_name}"',))
+        return cur.fetchone()[0]
+    finally:
+        conn.close()
+
+def stream_table(table_name: str):
+    """Every row of `table_name` as a dict, read through a named (server-side) cursor."""
+    conn = get_conn()
+    try:
+        cur = conn.cursor(name=f"export_{uuid4().hex}")
+        cur.itersize = STREAM_BATCH_SIZE
+        cur.execute(f'SELECT * FROM "{table_name}"')
+        columns = None
+        for row in cur:
+            # A named cursor only knows its columns once the first batch is fetched
+            if columns is None:
+                columns = [desc[0] for desc in cur.description]
+            yield dict(zip(columns, row))
+        cur.close()
+    finally:
+        conn.close()
+
 @router.get("/tables/{table_name}")
-def read_table(table_name: str):
+def read_table(table_name: str, request: Request):
+    if wants_ndjson(request):
+        # Checked up front: once streaming starts the status code is already sent
+        if not table_exists(table_name):
+            raise HTTPException(status_code=404, detail="Table not found")
+        return ndjson_response(stream_table(table_name))
     try:
         conn = get_conn()
         cur = conn.cursor()
@@ -75,11 +127,20 @@ def create_row(table_name: str, row: Dict[str, Any]):
     try:
         conn = get_conn()
         cur = conn.cursor()
+
+        # playlist_tracks.position has no default: append after the playlist's last
+        # track, holding the playlist row as the user routes do while they place one
+        if table_name == "playlist_tracks" and row.get("position") is None and row.get("playlist_id") is not None:
+            cur.execute('SELECT 1 FROM playlists WHERE id = %s FOR NO KEY UPDATE', (row["playlist_id"],))
+            cur.execute('SELECT MAX(position) FROM playlist_tracks WHERE playlist_id = %s', (row["playlist_id"],))
+            row = {**row, "position": position_between(cur.fetchone()[0], None)}
+
         keys = ', '.join([f'"{k}"' for k in row.keys()])
         placeholders = ', '.join([f'%({k})s' for k in row.keys()])
         query = f'INSERT INTO "{table_name}" ({keys}) VALUES ({placeholders})'
         cur.execute(query, row)
         conn.commit()
+        record_typeahead_change(cur, table_name, row.get(TABLE_ID_COLUMNS.get(table_name)))
         cur.close()
         conn.close()
         return {"status": "created"}
@@ -112,8 +173,11 @@ def update_row(table_name: str, pk: str, row: Dict[str, Any]):
         query = f'UPDATE "{table_name}" SET {assignments} WHERE "{pk_name}" = %(pk)s'
 
         values['pk'] = pk  # only for WHERE clause
+        id_column = TABLE_ID_COLUMNS.get(table_name)
+        entity_id = pk if pk_name == id_column else row.get(id_column)
         conn = get_conn()
         cur = conn.cursor()
+        previous_albums = typeahead_albums_before(cur, table_name, entity_id)
         cur.execute(query, values)
         
         if cur.rowcount == 0:
@@ -123,6 +187,7 @@ def update_row(table_name: str, pk: str, row: Dict[str, Any]):
             raise HTTPException(status_code=404, detail=f"Record with id {pk} not found in {table_name}")
         
         conn.commit()
+        record_typeahead_change(cur, table_name, entity_id, previous_albums)
         cur.close()
         conn.close()
         return {"status": "updated"}
@@ -154,9 +219,29 @@ def delete_row(table_name: str, pk: str):
             cur.execute('DELETE FROM playlist_user WHERE playlist_id = %s', (pk,))
         
         # For songs table, first delete related records
+        unliked_users = []
         if table_name == "songs":
             cur.execute('DELETE FROM playlist_tracks WHERE track_id = %s', (pk,))
+            # Likes become tombstones with a new version, so the users' delta sync
+            # drops the track. Their rows are locked first, in id order, as in
+            # like_track/unlike_track, to keep each user's versions committing in order.
+            cur.execute("""
+                SELECT 1 FROM users
+                WHERE id IN (SELECT user_id FROM liked_tracks WHERE track_id = %s AND NOT removed)
+                ORDER BY id
+                FOR NO KEY UPDATE
+            """, (pk,))
+            cur.execute("""
+                UPDATE liked_tracks
+                SET removed = true, version = nextval('liked_tracks_version_seq')
+                WHERE track_id = %s AND NOT removed
+                RETURNING user_id
+            """, (pk,))
+            unliked_users = [row[0] for row in cur.fetchall()]
         
+        entity_id = pk if pk_name == TABLE_ID_COLUMNS.get(table_name) else None
+        previous_albums = typeahead_albums_before(cur, table_name, entity_id)
+
         # Now delete the main record
         cur.execute(f'DELETE FROM "{table_name}" WHERE "{pk_name}" = %s', (pk,))
         
@@ -167,6 +252,9 @@ def delete_row(table_name: str, pk: str):
             raise HTTPException(status_code=404, detail=f"Record with id {pk} not found in {table_name}")
         
         conn.commit()
+        for user_id in unliked_users:
+            liked_cache.invalidate(cache_key(user_id))
+        record_typeahead_change(cur, table_name, entity_id, previous_albums)
         cur.close()
         conn.close()
         return {"status": "deleted"}
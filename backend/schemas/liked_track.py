@@ -0,0 +1,8 @@
+from pydantic import BaseModel
+from typing import List
+
+class LikedTrackDelta(BaseModel):
+    version: int  # pass back as `since` on the next sync
+    full: bool  # True when `added` is the complete list and local state should be replaced
+    added: List[str]
+    removed: List[str]
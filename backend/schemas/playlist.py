@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 
@@ -14,4 +14,22 @@ class PlaylistResponse(BaseModel):
     last_played: Optional[datetime]
 
     class Config:
-        orm_mode = True
\ No newline at end of file
+        orm_mode = True
+
+class PlaylistTracksRequest(BaseModel):
+    """Tracks to add or remove: explicit ids, plus (for adds) every track of a source album or playlist."""
+    track_ids: List[str] = []
+    source_album_id: Optional[str] = None
+    source_playlist_id: Optional[str] = None
+
+
+class PlaylistTracksResult(BaseModel):
+    added: int = 0
+    removed: int = 0
+    skipped: int  # already present / not in the playlist, or unknown ids
+
+
+class PlaylistTrackPlacement(BaseModel):
+    """Where to put a track: right after `after_track_id`, or first in the playlist when it is None."""
+    track_id: str
+    after_track_id: Optional[str] = None
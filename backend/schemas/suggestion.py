@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+
+
+class SuggestionResponse(BaseModel):
+    type: str  # "track", "album" or "artist"
+    id: str
+    name: str
@@ -0,0 +1,87 @@
+"""
+Report the recommender catalog's memory per million tracks.
+
+Compares the old representation (the full dataset.csv as a pandas DataFrame plus
+the track_id -> row dict) with TrackCatalog (dictionary-encoded ids, float
+numeric columns, text columns left on disk).
+
+Usage:
+    cd backend
+    python scripts/bench_catalog_memory.py [--rows 1000000] [--feature-dtype float16]
+    python scripts/bench_catalog_memory.py --csv data/dataset.csv
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.catalog import NUMERIC_COLUMNS, TEXT_COLUMNS, TrackCatalog
+
+ALPHABET = np.array(list("0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"))
+
+
+def synthetic_csv(path, rows):
+    """A dataset.csv-shaped file with Spotify-like ids and ~20 character text fields."""
+    rng = np.random.default_rng(42)
+    ids = ["".join(chars) for chars in ALPHABET[rng.integers(0, len(ALPHABET), (rows, 22))].tolist()]
+    df = pd.DataFrame({"track_id": ids})
+    for column in TEXT_COLUMNS:
+        df[column] = [f"{column} {i % 50_000:05d} lorem" for i in range(rows)]
+    for column in NUMERIC_COLUMNS:
+        df[column] = rng.random(rows, dtype=np.float32)
+    df.to_csv(path, index=False)
+
+
+def dict_bytes(mapping):
+    # Dict table plus its key strings; small ints are shared and not counted
+    return sys.getsizeof(mapping) + sum(sys.getsizeof(key) for key in mapping)
+
+
+def per_million(total, rows):
+    return total / rows * 1_000_000 / 2**20
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic catalog size")
+    parser.add_argument("--csv", help="measure an existing dataset.csv instead")
+    parser.add_argument("--feature-dtype", choices=["float32", "float16"], default="float32")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.csv
+        if path is None:
+            path = os.path.join(tmp, "dataset.csv")
+            synthetic_csv(path, args.rows)
+
+        start = time.perf_counter()
+        df = pd.read_csv(path)
+        track_ids = df["track_id"].to_numpy()
+        track_id_to_row = dict(zip(track_ids[::-1].tolist(), range(len(track_ids) - 1, -1, -1)))
+        old_seconds = time.perf_counter() - start
+        old_bytes = df.memory_usage(deep=True).sum() + dict_bytes(track_id_to_row)
+        rows = len(df)
+        del df, track_ids, track_id_to_row
+
+        start = time.perf_counter()
+        catalog = TrackCatalog.from_csv(path, feature_dtype=args.feature_dtype)
+        new_seconds = time.perf_counter() - start
+        usage = catalog.memory_usage()
+
+    print(f"{rows:,} tracks, numeric columns as {args.feature_dtype}\n")
+    print(f"{'representation':<28}{'load (s)':>10}{'MiB':>10}{'MiB / 1M tracks':>18}")
+    print(f"{'DataFrame + id dict':<28}{old_seconds:>10.2f}{old_bytes / 2**20:>10.1f}{per_million(old_bytes, rows):>18.1f}")
+    print(f"{'TrackCatalog':<28}{new_seconds:>10.2f}{usage['total'] / 2**20:>10.1f}{per_million(usage['total'], rows):>18.1f}")
+    print()
+    for part in ("ids", "codes", "first_rows", "numeric_columns"):
+        print(f"  {part:<26}{usage[part] / 2**20:>20.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
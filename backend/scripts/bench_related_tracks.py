@@ -0,0 +1,101 @@
+"""
+Benchmark Recommender.local_related_tracks (the local FAISS path) on a synthetic catalog.
+
+Compares the old lookup (boolean mask over a pandas DataFrame + per-neighbor iloc)
+with the TrackCatalog id -> row lookup used by local_related_tracks.
+
+Usage:
+    cd backend
+    python scripts/bench_related_tracks.py [--rows 1000000] [--dim 16] [--queries 200]
+"""
+import argparse
+import os
+import sys
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.catalog import TrackCatalog
+from utils.faiss_batcher import search_batcher
+from utils.recommender_loader import Recommender, RecommenderSnapshot
+
+
+def old_related_tracks(rec, data_df, track_id):
+    """The pre-index implementation, kept here only for comparison."""
+    idx_list = data_df[data_df["track_id"] == track_id].index.tolist()
+    if not idx_list:
+        return []
+    idx = idx_list[0]
+    query_vector = rec.track_features[idx].reshape(1, -1).astype(np.float32)
+    distances, indices = rec.faiss_index.search(query_vector, 10)
+    return [
+        data_df.iloc[i]["track_id"]
+        for i in indices[0]
+        if data_df.iloc[i]["track_id"] != track_id
+    ]
+
+
+def build_catalog(rows, dim):
+    rng = np.random.default_rng(42)
+    features = rng.random((rows, dim), dtype=np.float32)
+    data_df = pd.DataFrame({"track_id": [f"track{i:09d}" for i in range(rows)]})
+
+    faiss_index = faiss.IndexFlatL2(dim)
+    faiss_index.add(features)
+
+    rec = Recommender()
+    rec.store = None
+    start = time.perf_counter()
+    rec.snapshot = RecommenderSnapshot(TrackCatalog.from_frame(data_df), faiss_index, features)
+    print(f"track index build: {(time.perf_counter() - start) * 1000:.1f} ms for {rows:,} rows")
+    return rec, data_df
+
+
+def timed(fn, rec, track_ids):
+    latencies = []
+    for tid in track_ids:
+        start = time.perf_counter()
+        fn(rec, tid)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies = np.array(latencies)
+    return np.percentile(latencies, 50), np.percentile(latencies, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--dim", type=int, default=16)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    # Sequential queries would only measure the batch wait window
+    search_batcher.max_wait = 0
+
+    rec, data_df = build_catalog(args.rows, args.dim)
+    rng = np.random.default_rng(7)
+    track_ids = rec.catalog.track_ids_at(rng.integers(0, args.rows, args.queries))
+
+    # Both paths must agree before their timings mean anything
+    for tid in track_ids[:10]:
+        assert old_related_tracks(rec, data_df, tid) == rec.local_related_tracks(tid)
+
+    # Exact search cost alone, shared by both implementations
+    search_only = lambda r, tid: r.faiss_index.search(r.track_features[r.catalog.row_of(tid)].reshape(1, -1), 10)
+    before = lambda r, tid: old_related_tracks(r, data_df, tid)
+
+    print(f"\n{'path':<12}{'p50 (ms)':>12}{'p99 (ms)':>12}")
+    for name, fn in [
+        ("search only", search_only),
+        ("before", before),
+        ("after", Recommender.local_related_tracks),
+    ]:
+        p50, p99 = timed(fn, rec, track_ids)
+        print(f"{name:<12}{p50:>12.3f}{p99:>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark /search queries against catalog size on synthetic data.
+
+For each size, loads songs/artists/albums with random multi-word names into a
+scratch schema, then times the old `LOWER(name) LIKE '%kw%'` queries (no usable
+index) and the ranked trigram queries from utils/search.py with the indexes of
+scripts/migrate_search_indexes.py. Keywords cover common words, rare words, a
+typo, a keyword with no match (the old queries' worst case: a full scan) and a
+two-letter prefix. The scratch schema is dropped at the end.
+
+Needs a database where pg_trgm can be created (POSTGRES_* as for the API).
+
+Usage:
+    cd backend
+    python scripts/bench_search.py [--sizes 10000,100000,1000000] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import engine
+from scripts.migrate_search_indexes import EXTENSION_STATEMENT, index_statements
+from utils.search import normalize_keyword, search_params, search_query
+
+SCHEMA = "bench_search"
+
+WORDS = [
+    "love", "night", "summer", "heart", "dream", "fire", "dance", "rain", "city", "light",
+    "shadow", "ocean", "river", "golden", "midnight", "electric", "forever", "broken", "wild", "silver",
+    "thunder", "paradise", "echo", "velvet", "neon", "stardust", "highway", "whisper", "crystal", "horizon",
+    "gravity", "symphony", "lullaby", "wonder", "mirror", "eclipse", "tide", "ember", "wander", "bloom",
+    "ghost", "honey", "satellite", "cherry", "desert", "fever", "harbor", "island", "jungle", "karma",
+    "lantern", "meadow", "nova", "orbit", "pulse", "quartz", "rebel", "saffron", "tornado", "utopia",
+]
+
+KEYWORDS = {
+    "common word": "love",
+    "rare word": "quartz",
+    "two words": "midnight fever",
+    "typo": "symphny",
+    "no match": "zzqxv",
+    "2-letter prefix": "lo",
+}
+
+TABLES = """
+    CREATE TABLE songs (
+        track_id text, track_name text, popularity int, duration_ms int, track_image_url text,
+        artist_id text, album_id text, PRIMARY KEY (track_id, artist_id)
+    );
+    CREATE TABLE artists (id text PRIMARY KEY, name text, followers int, image_url text);
+    CREATE TABLE albums (id text PRIMARY KEY, name text, image_url text, release_date text);
+    CREATE TABLE album_artists (album_id text, artist_id text, PRIMARY KEY (album_id, artist_id));
+"""
+
+RANDOM_WORD = "w[1 + floor(random() * array_length(w, 1))::int]"
+
+LOAD = [
+    f"""
+    INSERT INTO artists (id, name, followers)
+    SELECT 'ar' || i, initcap({RANDOM_WORD} || ' ' || {RANDOM_WORD}), floor(random() * 10000000)::int
+    FROM generate_series(0, :artists - 1) AS i, (SELECT CAST(:words AS text[]) AS w) v
+    """,
+    f"""
+    INSERT INTO albums (id, name)
+    SELECT 'al' || i, initcap({RANDOM_WORD} || ' ' || {RANDOM_WORD})
+    FROM generate_series(0, :albums - 1) AS i, (SELECT CAST(:words AS text[]) AS w) v
+    """,
+    """
+    INSERT INTO album_artists (album_id, artist_id)
+    SELECT 'al' || i, 'ar' || (i % :artists) FROM generate_series(0, :albums - 1) AS i
+    """,
+    f"""
+    INSERT INTO songs (track_id, track_name, popularity, duration_ms, artist_id, album_id)
+    SELECT 't' || i, initcap({RANDOM_WORD} || ' ' || {RANDOM_WORD} || ' ' || {RANDOM_WORD}),
+           floor(random() * 101)::int, 180000, 'ar' || (i % :artists), 'al' || (i % :albums)
+    FROM generate_series(0, :rows - 1) AS i, (SELECT CAST(:words AS text[]) AS w) v
+    """,
+]
+
+# The pre-trigram queries, kept here only for comparison
+LEGACY_QUERIES = {
+    "track": text("""
+        WITH filtered_songs AS (
+            SELECT * FROM songs
+            WHERE LOWER(track_name) LIKE :keyword
+            LIMIT 50
+        )
+        SELECT fs.track_id, fs.track_name, a.id AS artist_id, a.name AS artist_name, al.id AS album_id, al.name AS album_name,
+            fs.duration_ms, fs.track_image_url
+        FROM filtered_songs fs
+        JOIN artists a ON fs.artist_id = a.id
+        JOIN albums al ON fs.album_id = al.id
+    """),
+    "artist": text("SELECT id, name, image_url FROM artists WHERE LOWER(name) LIKE :keyword"),
+}
+
+
+def timed(conn, query, params, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        conn.execute(query, params).fetchall()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def load(conn, rows):
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+    conn.execute(text(f"SET search_path TO {SCHEMA}, public"))
+    for statement in TABLES.split(";"):
+        if statement.strip():
+            conn.execute(text(statement))
+    params = {"rows": rows, "artists": max(rows // 10, 1), "albums": max(rows // 5, 1), "words": WORDS}
+    for statement in LOAD:
+        conn.execute(text(statement), params)
+    conn.execute(text("ANALYZE"))
+
+
+def bench_size(conn, rows, repeat, limit):
+    start = time.perf_counter()
+    load(conn, rows)
+    print(f"\n{rows:,} tracks (loaded in {time.perf_counter() - start:.1f} s)")
+
+    legacy = {}
+    for label, keyword in KEYWORDS.items():
+        legacy[label] = {
+            entity: timed(conn, query, {"keyword": f"%{keyword}%"}, repeat)
+            for entity, query in LEGACY_QUERIES.items()
+        }
+
+    start = time.perf_counter()
+    for statement in index_statements():
+        conn.execute(text(statement.replace(" CONCURRENTLY", "")))
+    conn.execute(text("ANALYZE"))
+    print(f"indexes built in {time.perf_counter() - start:.1f} s")
+
+    print(f"{'keyword':<18}{'old track':>12}{'new track':>12}{'old artist':>12}{'new artist':>12}{'new album':>12}   (median ms)")
+    for label, keyword in KEYWORDS.items():
+        keyword = normalize_keyword(keyword)
+        params = search_params(keyword, limit)
+        new = {entity: timed(conn, search_query(entity, keyword), params, repeat) for entity in ("track", "artist", "album")}
+        print(
+            f"{label:<18}{legacy[label]['track']:>12.2f}{new['track']:>12.2f}"
+            f"{legacy[label]['artist']:>12.2f}{new['artist']:>12.2f}{new['album']:>12.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,1000000", help="comma-separated track counts")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per query, median reported")
+    parser.add_argument("--limit", type=int, default=20, help="page size of the ranked queries")
+    args = parser.parse_args()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(EXTENSION_STATEMENT))
+        try:
+            for rows in (int(size) for size in args.sizes.split(",")):
+                bench_size(conn, rows, args.repeat, args.limit)
+        finally:
+            conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Build the recommender's FAISS index from the songs table.
+
+Exports one row per track from Postgres, standardizes the audio features and
+builds a flat, IVF-PQ or HNSW index. Everything is written to --out with rows
+aligned to each other:
+
+    dataset.csv         catalog in index row order (same columns as sync_dataset.py)
+    track_ids.npy       FAISS row -> track_id map
+    full_features.pkl   standardized float32 feature matrix
+    music_index.index   the FAISS index
+    scaler.json         feature columns, mean and std used for standardizing
+
+Deploy by copying dataset.csv to data/ and uploading the index and features to
+the artifact bucket (--upload does the latter). With --benchmark every index type
+is built and compared against exact search: recall@10, QPS, build time, memory.
+
+Usage:
+    cd backend
+    python scripts/build_faiss_index.py --index-type hnsw --benchmark
+    python scripts/build_faiss_index.py --index-type ivfpq --upload
+"""
+import argparse
+import json
+import os
+import pickle
+import sys
+import time
+
+import faiss
+import numpy as np
+from dotenv import load_dotenv
+from sqlalchemy import create_engine
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.faiss_builder import INDEX_TYPES, build_index, export_catalog, standardize
+
+load_dotenv()
+
+pg_user = os.getenv("POSTGRES_USER")
+pg_password = os.getenv("POSTGRES_PASSWORD")
+pg_host = os.getenv("POSTGRES_HOST")
+pg_port = os.getenv("POSTGRES_PORT")
+pg_database = os.getenv("POSTGRES_DATABASE")
+
+
+def benchmark(features, args, k=10, num_queries=1000):
+    rng = np.random.default_rng(0)
+    queries = features[rng.choice(len(features), size=min(num_queries, len(features)), replace=False)]
+
+    exact = faiss.IndexFlatL2(features.shape[1])
+    exact.add(features)
+    _, truth = exact.search(queries, k)
+
+    print(f"\n{'index':<8}{'recall@10':>11}{'QPS':>11}{'p50 1q (ms)':>13}{'build (s)':>11}{'size (MB)':>11}")
+    for index_type in INDEX_TYPES:
+        start = time.perf_counter()
+        index = build_index(index_type, features, args.nlist, args.nprobe, args.hnsw_m, args.ef_search)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        qps = len(queries) / (time.perf_counter() - start)
+
+        single = []
+        for q in queries[:200]:
+            start = time.perf_counter()
+            index.search(q.reshape(1, -1), k)
+            single.append((time.perf_counter() - start) * 1000)
+
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found.tolist(), truth.tolist())])
+        size_mb = faiss.serialize_index(index).nbytes / 1e6
+        print(f"{index_type:<8}{recall:>11.3f}{qps:>11.0f}{np.median(single):>13.3f}{build_seconds:>11.2f}{size_mb:>11.1f}")
+
+
+def upload(out_dir):
+    from google.cloud import storage
+
+    client = storage.Client.from_service_account_json(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+    bucket = client.bucket(os.getenv("BUCKET_NAME"))
+    for name in ("music_index.index", "full_features.pkl"):
+        bucket.blob(name).upload_from_filename(os.path.join(out_dir, name))
+        print(f"Uploaded {name} to gs://{bucket.name}/{name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="hnsw")
+    parser.add_argument("--out", default=os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "index_build"))
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default 4*sqrt(N))")
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--benchmark", action="store_true", help="compare all index types against exact search")
+    parser.add_argument("--upload", action="store_true", help="upload index and features to BUCKET_NAME")
+    args = parser.parse_args()
+
+    engine = create_engine(f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_database}")
+    df = export_catalog(engine)
+    features, scaler = standardize(df)
+
+    if args.benchmark:
+        benchmark(features, args)
+
+    start = time.perf_counter()
+    index = build_index(args.index_type, features, args.nlist, args.nprobe, args.hnsw_m, args.ef_search)
+    print(f"\nBuilt {args.index_type} index over {index.ntotal:,} tracks in {time.perf_counter() - start:.2f}s")
+
+    os.makedirs(args.out, exist_ok=True)
+    df.to_csv(os.path.join(args.out, "dataset.csv"), index=False)
+    np.save(os.path.join(args.out, "track_ids.npy"), df["track_id"].to_numpy(dtype=str))
+    with open(os.path.join(args.out, "full_features.pkl"), "wb") as f:
+        pickle.dump(features, f, protocol=pickle.HIGHEST_PROTOCOL)
+    faiss.write_index(index, os.path.join(args.out, "music_index.index"))
+    with open(os.path.join(args.out, "scaler.json"), "w") as f:
+        json.dump({**scaler, "index_type": args.index_type}, f, indent=2)
+    print(f"✅ Wrote index artifacts to {args.out}")
+
+    if args.upload:
+        upload(args.out)
+
+
+if __name__ == "__main__":
+    main()
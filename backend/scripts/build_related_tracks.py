@@ -0,0 +1,186 @@
+"""
+Precompute related tracks into the related_tracks table.
+
+A full run does one kNN pass over every track in songs. An incremental run (the
+default once the table has rows) only searches tracks without a row yet, then
+merges each new track into its neighbours' lists when it is closer than their
+current k-th neighbour. Rows of tracks that left the catalog are dropped, and
+the lists that contained them are searched again.
+
+Features are standardized with the scaler of the last full run (saved to
+--scaler), so distances of new tracks compare with the stored ones. Without a
+saved scaler the run is a full one.
+
+/api/music/related/{track_id} then costs a single primary-key lookup.
+
+Usage:
+    cd backend
+    python scripts/build_related_tracks.py                      # incremental
+    python scripts/build_related_tracks.py --full --index-type hnsw
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.faiss_builder import INDEX_TYPES, build_index, export_catalog, standardize
+
+load_dotenv()
+
+pg_user = os.getenv("POSTGRES_USER")
+pg_password = os.getenv("POSTGRES_PASSWORD")
+pg_host = os.getenv("POSTGRES_HOST")
+pg_port = os.getenv("POSTGRES_PORT")
+pg_database = os.getenv("POSTGRES_DATABASE")
+
+DEFAULT_SCALER_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "related_tracks_scaler.json")
+
+UPSERT_QUERY = text("""
+    INSERT INTO related_tracks (track_id, related_ids, distances, updated_at)
+    VALUES (:track_id, :related_ids, :distances, NOW())
+    ON CONFLICT (track_id) DO UPDATE
+    SET related_ids = EXCLUDED.related_ids, distances = EXCLUDED.distances, updated_at = NOW()
+""")
+
+
+def knn(index, features, track_ids, rows, k, batch_size=4096):
+    """Yield (track_id, [(neighbour_id, distance), ...]) for `rows`, excluding the track itself."""
+    for start in range(0, len(rows), batch_size):
+        batch = rows[start:start + batch_size]
+        distances, indices = index.search(features[batch], k + 1)
+        for row, dist_row, idx_row in zip(batch, distances.tolist(), indices.tolist()):
+            tid = track_ids[row]
+            neighbours = [
+                (track_ids[i], float(d)) for i, d in zip(idx_row, dist_row)
+                if i >= 0 and track_ids[i] != tid
+            ]
+            yield tid, neighbours[:k]
+
+
+def write(conn, lists, chunk_size=1000):
+    records = [
+        {"track_id": tid, "related_ids": [n for n, _ in neighbours], "distances": [d for _, d in neighbours]}
+        for tid, neighbours in lists.items()
+    ]
+    for start in range(0, len(records), chunk_size):
+        conn.execute(UPSERT_QUERY, records[start:start + chunk_size])
+    return len(records)
+
+
+def merge_reverse_neighbours(conn, new_lists, k):
+    """Add new tracks to the lists of existing tracks they are now among the k closest of."""
+    new_ids = set(new_lists)
+    candidates = {}
+    for new_tid, neighbours in new_lists.items():
+        for tid, distance in neighbours:
+            if tid not in new_ids:
+                candidates.setdefault(tid, []).append((new_tid, distance))
+    if not candidates:
+        return 0
+
+    current = conn.execute(text("""
+        SELECT track_id, related_ids, distances FROM related_tracks WHERE track_id = ANY(:ids)
+    """), {"ids": list(candidates)}).fetchall()
+
+    updated = {}
+    for tid, related_ids, distances in current:
+        existing = list(zip(related_ids, distances))
+        merged = sorted(existing + candidates[tid], key=lambda pair: pair[1])
+        seen, top = set(), []
+        for neighbour, distance in merged:
+            if neighbour not in seen:
+                seen.add(neighbour)
+                top.append((neighbour, distance))
+        top = top[:k]
+        if top != existing:
+            updated[tid] = top
+    return write(conn, updated)
+
+
+def load_scaler(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def save_scaler(path, scaler):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(scaler, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def lists_containing(conn, track_ids):
+    """Tracks whose stored neighbour list contains any of `track_ids`."""
+    if not track_ids:
+        return set()
+    rows = conn.execute(text("""
+        SELECT track_id FROM related_tracks WHERE related_ids && CAST(:ids AS varchar[])
+    """), {"ids": list(track_ids)})
+    return {row[0] for row in rows}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="recompute every track instead of only new ones")
+    parser.add_argument("-k", type=int, default=10, help="neighbours stored per track")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="flat is exact; use hnsw for full runs over large catalogs")
+    parser.add_argument("--scaler", default=DEFAULT_SCALER_PATH,
+                        help="feature scaler written by full runs and reused by incremental ones")
+    args = parser.parse_args()
+
+    engine = create_engine(f"postgresql+psycopg2://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_database}")
+    df = export_catalog(engine)
+    track_ids = df["track_id"].tolist()
+    row_of = {tid: i for i, tid in enumerate(track_ids)}
+
+    with engine.begin() as conn:
+        existing = {row[0] for row in conn.execute(text("SELECT track_id FROM related_tracks"))}
+        scaler = None if args.full or not existing else load_scaler(args.scaler)
+        full = scaler is None
+        if full and existing and not args.full:
+            print(f"No saved scaler at {args.scaler}; recomputing every track")
+        features, scaler = standardize(df, scaler)
+
+        start = time.perf_counter()
+        index = build_index(args.index_type, features)
+        print(f"Built {args.index_type} index in {time.perf_counter() - start:.2f}s")
+
+        if full:
+            rows = list(range(len(track_ids)))
+        else:
+            # New tracks, plus tracks whose list points at a track that left the catalog
+            gone = existing - row_of.keys()
+            stale_lists = lists_containing(conn, gone) - gone
+            rows = sorted({row_of[tid] for tid in stale_lists} | {i for i, tid in enumerate(track_ids) if tid not in existing})
+        print(f"{'Full' if full else 'Incremental'} run: searching {len(rows):,} of {len(track_ids):,} tracks")
+
+        start = time.perf_counter()
+        new_lists = dict(knn(index, features, track_ids, rows, args.k))
+        print(f"kNN pass took {time.perf_counter() - start:.2f}s")
+
+        written = write(conn, new_lists)
+        reverse = 0 if full else merge_reverse_neighbours(conn, new_lists, args.k)
+        removed = conn.execute(text("""
+            DELETE FROM related_tracks WHERE NOT (track_id = ANY(:ids))
+        """), {"ids": track_ids}).rowcount
+
+    # Only after the commit, so the saved scaler always matches the stored distances
+    if full:
+        save_scaler(args.scaler, scaler)
+
+    print(f"✅ Wrote {written:,} neighbour lists, updated {reverse:,} reverse neighbours, removed {removed:,} stale rows")
+
+
+if __name__ == "__main__":
+    main()
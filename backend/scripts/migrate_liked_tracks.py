@@ -0,0 +1,57 @@
+"""
+Copy likes from the per-user "Liked Songs" playlists into the liked_tracks table.
+
+Likes used to be stored as playlist_tracks rows of a playlist found by name; the
+API now reads and writes liked_tracks. Safe to re-run: existing (user, track)
+rows are left untouched. Users with more than one "Liked Songs" playlist (created
+by concurrent first likes) get the union of them.
+
+Usage:
+    cd backend
+    python scripts/migrate_liked_tracks.py
+"""
+import os
+import sys
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import Base, engine
+from models.liked_track import LikedTrack
+
+BACKFILL_QUERY = text("""
+    INSERT INTO liked_tracks (user_id, track_id, date_added, version, removed)
+    SELECT pu.user_id, pt.track_id, MIN(COALESCE(pt.date_added, NOW())), nextval('liked_tracks_version_seq'), false
+    FROM playlist_tracks pt
+    INNER JOIN playlist_user pu ON pu.playlist_id = pt.playlist_id
+    INNER JOIN playlists p ON p.id = pt.playlist_id
+    WHERE p.name = 'Liked Songs'
+    GROUP BY pu.user_id, pt.track_id
+    ON CONFLICT (user_id, track_id) DO NOTHING
+""")
+
+DUPLICATES_QUERY = text("""
+    SELECT COUNT(*) FROM (
+        SELECT pu.user_id
+        FROM playlist_user pu
+        INNER JOIN playlists p ON p.id = pu.playlist_id
+        WHERE p.name = 'Liked Songs'
+        GROUP BY pu.user_id
+        HAVING COUNT(*) > 1
+    ) d
+""")
+
+
+def main():
+    Base.metadata.create_all(bind=engine, tables=[LikedTrack.__table__])
+    with engine.begin() as conn:
+        inserted = conn.execute(BACKFILL_QUERY).rowcount
+        duplicates = conn.execute(DUPLICATES_QUERY).scalar()
+    print(f"✅ Copied {inserted:,} likes into liked_tracks")
+    if duplicates:
+        print(f"{duplicates:,} users have more than one 'Liked Songs' playlist; their likes were merged")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+Create the indexes that keyset-paginated listings rely on in an existing database.
+
+New databases get them from create_all. The indexes are built CONCURRENTLY, so
+the API can keep serving while this runs. Safe to re-run.
+
+Usage:
+    cd backend
+    python scripts/migrate_listing_indexes.py
+"""
+import os
+import sys
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import engine
+
+INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_songs_album_track ON songs (album_id, track_id)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_songs_artist_track ON songs (artist_id, track_id)",
+]
+
+
+def main():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in INDEXES:
+            conn.execute(text(statement))
+            print(f"✅ {statement}")
+
+
+if __name__ == "__main__":
+    main()
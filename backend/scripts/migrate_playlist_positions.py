@@ -0,0 +1,62 @@
+"""
+Add the `position` column and its covering index to an existing playlist_tracks table.
+
+New databases get both from create_all. Existing rows are numbered 1, 2, 3, ...
+per playlist in date_added order, which is the order playlists were shown in
+before. Safe to re-run: rows that already have a position keep it, and rows
+without one are appended after them.
+
+Usage:
+    cd backend
+    python scripts/migrate_playlist_positions.py
+"""
+import os
+import sys
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import engine
+
+ADD_COLUMN_QUERY = text("ALTER TABLE playlist_tracks ADD COLUMN IF NOT EXISTS position NUMERIC")
+
+BACKFILL_QUERY = text("""
+    WITH numbered AS (
+        SELECT playlist_id, track_id,
+               row_number() OVER (PARTITION BY playlist_id ORDER BY date_added NULLS FIRST, track_id) AS n
+        FROM playlist_tracks
+        WHERE position IS NULL
+    ),
+    last AS (
+        SELECT playlist_id, FLOOR(MAX(position)) AS position
+        FROM playlist_tracks
+        WHERE position IS NOT NULL
+        GROUP BY playlist_id
+    )
+    UPDATE playlist_tracks pt
+    SET position = COALESCE(last.position, 0) + numbered.n
+    FROM numbered
+    LEFT JOIN last ON last.playlist_id = numbered.playlist_id
+    WHERE pt.playlist_id = numbered.playlist_id AND pt.track_id = numbered.track_id
+""")
+
+SET_NOT_NULL_QUERY = text("ALTER TABLE playlist_tracks ALTER COLUMN position SET NOT NULL")
+
+CREATE_INDEX_QUERY = text("""
+    CREATE UNIQUE INDEX IF NOT EXISTS ix_playlist_tracks_playlist_position
+    ON playlist_tracks (playlist_id, position) INCLUDE (track_id, date_added)
+""")
+
+
+def main():
+    with engine.begin() as conn:
+        conn.execute(ADD_COLUMN_QUERY)
+        numbered = conn.execute(BACKFILL_QUERY).rowcount
+        conn.execute(SET_NOT_NULL_QUERY)
+        conn.execute(CREATE_INDEX_QUERY)
+    print(f"✅ Assigned positions to {numbered:,} playlist tracks")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Create the pg_trgm extension and the indexes behind /search.
+
+For each searched column (songs.track_name, albums.name, artists.name) this adds
+a GiST trigram index on lower(column), which serves substring and fuzzy matches
+and returns candidates closest first, and a text_pattern_ops index for the
+prefix match used for 1-2 character keywords. Without them every search is a
+sequential scan. GIN trigram indexes from earlier runs are dropped, since they
+cannot order by distance. Indexes are built CONCURRENTLY, so the API can keep
+serving while this runs. Safe to re-run.
+
+Usage:
+    cd backend
+    python scripts/migrate_search_indexes.py
+"""
+import os
+import sys
+
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import engine
+
+SEARCHED_COLUMNS = [("songs", "track_name"), ("albums", "name"), ("artists", "name")]
+
+EXTENSION_STATEMENT = "CREATE EXTENSION IF NOT EXISTS pg_trgm"
+
+
+def index_statements(columns=SEARCHED_COLUMNS):
+    statements = []
+    for table, column in columns:
+        statements.append(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column}_trgm_gist "
+            f"ON {table} USING gist (lower({column}) gist_trgm_ops)"
+        )
+        statements.append(f"DROP INDEX CONCURRENTLY IF EXISTS ix_{table}_{column}_trgm")
+        statements.append(
+            f"CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_{column}_prefix "
+            f"ON {table} (lower({column}) text_pattern_ops)"
+        )
+    return statements
+
+
+def main():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for statement in [EXTENSION_STATEMENT] + index_statements():
+            conn.execute(text(statement))
+            print(f"✅ {statement}")
+        for table, _ in SEARCHED_COLUMNS:
+            conn.execute(text(f"ANALYZE {table}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Startup-time profile of the API process.
+
+Imports main.py under `python -X importtime` and reports the slowest modules
+(cumulative import time, i.e. including what they import) and the total per
+top-level package. With --serve it also starts uvicorn and measures the time
+until `/` answers and until `/ready` reports the recommender warm-up as done.
+
+Usage:
+    cd backend
+    python scripts/profile_startup.py [--top 25] [--serve]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_profile():
+    """[(module, self_us, cumulative_us, depth)] for a fresh `import main`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit("import main failed")
+    entries = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def wait_for(url, timeout, accept=lambda status, body: status == 200):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if accept(response.status, response.read()):
+                    return True
+        except urllib.error.HTTPError as e:
+            if accept(e.code, e.read()):
+                return True
+        except (urllib.error.URLError, ConnectionError, TimeoutError):
+            pass
+        time.sleep(0.02)
+    return False
+
+
+def time_to_first_response(port, timeout):
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+    )
+    try:
+        base = f"http://127.0.0.1:{port}"
+        first = time.perf_counter() - start if wait_for(f"{base}/", timeout) else None
+        warmed = lambda status, body: json.loads(body or b"{}").get("recommender", {}).get("state") in ("ready", "failed")
+        ready = time.perf_counter() - start if wait_for(f"{base}/ready", timeout, warmed) else None
+        return first, ready
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--top", type=int, default=25, help="modules to list")
+    parser.add_argument("--serve", action="store_true", help="also time uvicorn until / and /ready answer")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    entries = import_profile()
+    total_us = sum(self_us for _, self_us, _, _ in entries)
+    print(f"import main: {total_us / 1000:.0f} ms across {len(entries)} modules\n")
+
+    print(f"{'cumulative (ms)':>16}{'self (ms)':>12}  module")
+    for module, self_us, cumulative_us, _ in sorted(entries, key=lambda e: -e[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>16.1f}{self_us / 1000:>12.1f}  {module}")
+
+    packages = defaultdict(int)
+    for module, self_us, _, _ in entries:
+        packages[module.split(".")[0]] += self_us
+    print(f"\n{'self total (ms)':>16}  package")
+    for package, self_us in sorted(packages.items(), key=lambda p: -p[1])[:args.top]:
+        print(f"{self_us / 1000:>16.1f}  {package}")
+
+    if args.serve:
+        first, ready = time_to_first_response(args.port, args.timeout)
+        print()
+        print(f"time to first response (/):      {f'{first:.2f} s' if first is not None else 'timed out'}")
+        print(f"time to recommender warm (/ready): {f'{ready:.2f} s' if ready is not None else 'timed out'}")
+
+
+if __name__ == "__main__":
+    main()
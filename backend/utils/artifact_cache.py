@@ -0,0 +1,154 @@
+import base64
+import binascii
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+# Object directories younger than this are never pruned
+PRUNE_MIN_AGE_SECONDS = 3600
+
+
+class ArtifactCache:
+    """
+    Content-addressed on-disk cache for recommender artifacts stored in GCS.
+
+    Files live under `<root>/objects/<md5>/<name>` and `<root>/manifest.json` maps
+    each object name to the generation/etag/md5 it was downloaded from. A fetch only
+    costs one metadata request when the object is unchanged, and falls back to the
+    last cached copy when GCS cannot be reached. Each name keeps its current and
+    previous copy (a live snapshot may still map the previous one); older object
+    directories are removed when a new version is downloaded.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self._lock = threading.Lock()
+
+    def fetch(self, bucket, name):
+        """Return a local path for `name`, downloading it only if GCS has a newer version."""
+        cached = self._cached_entry(name)
+
+        if bucket is None:
+            if cached:
+                return cached["path"]
+            raise FileNotFoundError(f"{name} is not cached and no bucket is configured")
+
+        try:
+            blob = bucket.get_blob(name)
+        except Exception as e:
+            if cached:
+                print(f"Warning: GCS unavailable ({e}), using cached {name} (generation {cached['generation']})")
+                return cached["path"]
+            raise
+        if blob is None:
+            raise FileNotFoundError(f"gs://{bucket.name}/{name} does not exist")
+
+        if cached and str(cached["generation"]) == str(blob.generation) and cached["etag"] == blob.etag:
+            return cached["path"]
+
+        return self._download(blob, name)
+
+    def entry(self, name):
+        """Manifest entry (generation, etag, md5, path) of the cached copy of `name`, if any."""
+        return self._cached_entry(name)
+
+    def _download(self, blob, name):
+        md5_hex = self._md5_hex(blob.md5_hash) or f"gen-{blob.generation}"
+        target_dir = os.path.join(self.root, "objects", md5_hex)
+        target = os.path.join(target_dir, name)
+        os.makedirs(target_dir, exist_ok=True)
+
+        if not os.path.exists(target):
+            # Download next to the target and rename so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=target_dir, prefix=f".{name}.")
+            try:
+                with os.fdopen(fd, "wb") as tmp_file:
+                    blob.download_to_file(tmp_file)
+                if blob.md5_hash and self._file_md5(tmp_path) != md5_hex:
+                    raise IOError(f"Checksum mismatch while downloading {name}")
+                os.replace(tmp_path, target)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+            print(f"Downloaded {name} (generation {blob.generation}) into artifact cache")
+
+        self._write_entry(name, {
+            "generation": blob.generation,
+            "etag": blob.etag,
+            "md5": md5_hex,
+            "path": target,
+        })
+        self._prune()
+        return target
+
+    def _cached_entry(self, name):
+        entry = self._read_manifest().get(name)
+        if entry and os.path.exists(entry["path"]):
+            return entry
+        return None
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _write_entry(self, name, entry):
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            manifest = self._read_manifest()
+            previous = manifest.get(name) or {}
+            if previous.get("md5") and previous["md5"] != entry["md5"]:
+                entry = {**entry, "previous_md5": previous["md5"]}
+            elif previous.get("previous_md5"):
+                entry = {**entry, "previous_md5": previous["previous_md5"]}
+            manifest[name] = entry
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".manifest.")
+            with os.fdopen(fd, "w") as f:
+                json.dump(manifest, f, indent=2)
+            os.replace(tmp_path, self.manifest_path)
+
+    def _prune(self):
+        """Remove object directories that no manifest entry names as current or previous."""
+        objects_dir = os.path.join(self.root, "objects")
+        with self._lock:
+            keep = set()
+            for entry in self._read_manifest().values():
+                keep.update(md5 for md5 in (entry.get("md5"), entry.get("previous_md5")) if md5)
+            try:
+                directories = os.listdir(objects_dir)
+            except FileNotFoundError:
+                return
+            for directory in directories:
+                path = os.path.join(objects_dir, directory)
+                # Recent directories may be downloads of another process not in the manifest yet
+                if directory in keep or time.time() - os.path.getmtime(path) < PRUNE_MIN_AGE_SECONDS:
+                    continue
+                shutil.rmtree(path, ignore_errors=True)
+                print(f"Removed old artifact generation {directory}")
+
+    @staticmethod
+    def _md5_hex(md5_b64):
+        if not md5_b64:
+            return None
+        try:
+            return base64.b64decode(md5_b64).hex()
+        except (binascii.Error, ValueError):
+            return None
+
+    @staticmethod
+    def _file_md5(path):
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+
+artifact_cache = ArtifactCache(os.getenv("ARTIFACT_CACHE_DIR", "./data/artifacts"))
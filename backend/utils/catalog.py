@@ -0,0 +1,209 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from utils.content_recommender import FEATURE_COLUMNS
+
+# Numeric columns the recommender reads; everything else in dataset.csv is text
+# that is only parsed when something asks for it.
+NUMERIC_COLUMNS = FEATURE_COLUMNS + ["popularity"]
+TEXT_COLUMNS = ["track_name", "artists", "album_name", "track_genre"]
+
+
+class TrackCatalog:
+    """
+    Columnar, read-only view of dataset.csv for the recommender.
+
+    Row i matches row i of the FAISS index and the feature matrix. Track ids are
+    dictionary-encoded: `ids` holds each distinct id once as sorted fixed-width
+    bytes and `codes[row]` points into it, so id -> row is a binary search instead
+    of a per-track Python dict. Numeric columns are plain float32 (or float16)
+    arrays; text columns are read from the CSV on first access.
+
+    `load_shared` keeps the arrays as .npy files and memory-maps them, so every
+    worker process on a node reads the same page-cache copy.
+    """
+
+    def __init__(self, ids, codes, first_rows, columns, source_path=None, directory=None):
+        self.ids = ids
+        self.codes = codes
+        self.first_rows = first_rows
+        self.columns = columns
+        self.source_path = source_path
+        self.directory = directory  # where the arrays are mapped from, if shared
+        self._text = {}  # column -> object array, filled on demand
+
+    @classmethod
+    def from_track_ids(cls, track_ids, columns=None, feature_dtype=np.float32, source_path=None):
+        encoded = np.asarray([str(tid).encode("utf-8") for tid in track_ids], dtype=np.bytes_)
+        ids, codes = np.unique(encoded, return_inverse=True)
+        codes = codes.astype(np.int32).ravel()
+        # np.unique sorts, so the lowest row of each code is its first occurrence
+        first_rows = np.full(len(ids), len(codes), dtype=np.int32)
+        np.minimum.at(first_rows, codes, np.arange(len(codes), dtype=np.int32))
+        columns = {name: np.asarray(values, dtype=feature_dtype) for name, values in (columns or {}).items()}
+        return cls(ids, codes, first_rows, columns, source_path=source_path)
+
+    @classmethod
+    def from_csv(cls, path, feature_dtype=np.float32):
+        import pandas as pd
+
+        header = pd.read_csv(path, nrows=0).columns
+        numeric = [c for c in NUMERIC_COLUMNS if c in header]
+        df = pd.read_csv(
+            path,
+            usecols=["track_id"] + numeric,
+            dtype={"track_id": str, **dict.fromkeys(numeric, np.float32)},
+        )
+        columns = {c: df[c].to_numpy(dtype=np.float32, na_value=np.nan) for c in numeric}
+        return cls.from_track_ids(df["track_id"].tolist(), columns, feature_dtype=feature_dtype, source_path=path)
+
+    @classmethod
+    def from_frame(cls, df, feature_dtype=np.float32):
+        columns = {
+            c: df[c].to_numpy(dtype=np.float32, na_value=np.nan)
+            for c in NUMERIC_COLUMNS if c in df.columns
+        }
+        return cls.from_track_ids(df["track_id"].tolist(), columns, feature_dtype=feature_dtype)
+
+    @classmethod
+    def load_shared(cls, path, cache_root, feature_dtype=np.float32):
+        """
+        Memory-mapped catalog for `path`. The first process to see a new version of
+        the CSV parses it and publishes the arrays under `cache_root`; every other
+        process (and every later reload) attaches to those files instead.
+        """
+        stat = os.stat(path)
+        key = f"{stat.st_size}-{stat.st_mtime_ns}-{np.dtype(feature_dtype).name}"
+        directory = os.path.join(cache_root, key)
+        if not os.path.exists(os.path.join(directory, "catalog.json")):
+            cls.from_csv(path, feature_dtype).save(directory)
+            cls.remove_stale(cache_root, keep=key)
+        return cls.open(directory, source_path=path)
+
+    def save(self, directory):
+        """Write the arrays to `directory` atomically; a concurrent writer of the same version wins."""
+        parent = os.path.dirname(os.path.abspath(directory))
+        os.makedirs(parent, exist_ok=True)
+        tmp_dir = tempfile.mkdtemp(dir=parent, prefix=".catalog.")
+        try:
+            for name, values in [("ids", self.ids), ("codes", self.codes), ("first_rows", self.first_rows)]:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), values)
+            for name, values in self.columns.items():
+                np.save(os.path.join(tmp_dir, f"column.{name}.npy"), values)
+            with open(os.path.join(tmp_dir, "catalog.json"), "w") as f:
+                json.dump({"columns": list(self.columns), "tracks": len(self)}, f)
+            os.rename(tmp_dir, directory)
+        except OSError:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            if not os.path.exists(os.path.join(directory, "catalog.json")):
+                raise
+
+    @classmethod
+    def open(cls, directory, source_path=None):
+        load = lambda name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+        with open(os.path.join(directory, "catalog.json")) as f:
+            meta = json.load(f)
+        columns = {name: load(f"column.{name}") for name in meta["columns"]}
+        return cls(load("ids"), load("codes"), load("first_rows"), columns, source_path=source_path, directory=directory)
+
+    @staticmethod
+    def remove_stale(cache_root, keep):
+        # Unlinking is safe while older processes still map the files; the pages
+        # stay valid until they unmap them
+        for name in os.listdir(cache_root):
+            if name != keep and not name.startswith("."):
+                shutil.rmtree(os.path.join(cache_root, name), ignore_errors=True)
+
+    def derived(self, name, build):
+        """
+        An array computed from the catalog (e.g. a normalized feature matrix), shared
+        through the catalog directory like the catalog itself when there is one.
+        """
+        if self.directory is None:
+            return build()
+        path = os.path.join(self.directory, f"derived.{name}.npy")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, build())
+            os.replace(tmp_path, path)
+        return np.load(path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, track_id):
+        return self.row_of(track_id) is not None
+
+    def has_column(self, name):
+        return name in self.columns
+
+    def column(self, name):
+        """Numeric column as float32 (NaN for missing values)."""
+        return self.columns[name].astype(np.float32, copy=False)
+
+    def row_of(self, track_id):
+        """First row of `track_id`, or None if it is not in the catalog."""
+        key = str(track_id).encode("utf-8")
+        i = int(np.searchsorted(self.ids, key))
+        if i < len(self.ids) and self.ids[i] == key:
+            return int(self.first_rows[i])
+        return None
+
+    def rows_of(self, track_ids):
+        """First rows of the known ids in `track_ids`; unknown ids are skipped."""
+        width = self.ids.dtype.itemsize
+        keys = [str(tid).encode("utf-8") for tid in track_ids]
+        # Longer keys would be truncated by the cast below and could match a prefix
+        keys = np.asarray([k for k in keys if len(k) <= width], dtype=self.ids.dtype)
+        if len(keys) == 0 or len(self.ids) == 0:
+            return []
+        positions = np.minimum(np.searchsorted(self.ids, keys), len(self.ids) - 1)
+        found = self.ids[positions] == keys
+        return self.first_rows[positions[found]].tolist()
+
+    def track_ids_at(self, rows):
+        """Track ids of `rows` as a list of str, in row order."""
+        return [tid.decode("utf-8") for tid in self.ids[self.codes[rows]].tolist()]
+
+    def unique_track_ids_at(self, rows, k, exclude=()):
+        """Up to `k` distinct ids from `rows` in order, skipping ids in `exclude`."""
+        # Distinctness is checked on codes, so ids are only decoded for the result
+        result, seen = [], set(self.codes[self.rows_of(exclude)].tolist())
+        for code in self.codes[rows].tolist():
+            if code not in seen:
+                seen.add(code)
+                result.append(code)
+                if len(result) == k:
+                    break
+        return [tid.decode("utf-8") for tid in self.ids[result].tolist()]
+
+    def text(self, name):
+        """A text column (track_name, artists, ...), parsed from the CSV on first use."""
+        if name not in self._text:
+            if self.source_path is None:
+                raise KeyError(f"Text column {name} is not available without a source CSV")
+            import pandas as pd
+
+            values = pd.read_csv(self.source_path, usecols=[name], dtype={name: str})[name]
+            self._text[name] = values.to_numpy(dtype=object)
+        return self._text[name]
+
+    def memory_usage(self):
+        """Resident bytes per component, plus the total scaled to one million tracks."""
+        usage = {
+            "shared": self.directory is not None,
+            "ids": self.ids.nbytes,
+            "codes": self.codes.nbytes,
+            "first_rows": self.first_rows.nbytes,
+            "numeric_columns": sum(values.nbytes for values in self.columns.values()),
+            "text_columns_loaded": sorted(self._text),
+        }
+        total = usage["ids"] + usage["codes"] + usage["first_rows"] + usage["numeric_columns"]
+        usage["total"] = total
+        usage["bytes_per_million_tracks"] = int(total / len(self) * 1_000_000) if len(self) else 0
+        return usage
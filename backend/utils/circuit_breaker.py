@@ -0,0 +1,99 @@
+import threading
+import time
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    Calls that raise, or that succeed but take longer than `latency_threshold`
+    seconds, count as failures. After `failure_threshold` of them in a row the
+    breaker opens and calls fail fast with CircuitOpenError. Once `reset_timeout`
+    seconds have passed it half-opens and lets a single probe through: success
+    closes it again, failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=5, latency_threshold=None, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.latency_threshold = latency_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+        self._counters = dict.fromkeys(["successes", "failures", "slow_calls", "short_circuited", "opened"], 0)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def call(self, fn):
+        probe = self._acquire()
+        start = time.monotonic()
+        try:
+            result = fn()
+        except Exception:
+            self._record(success=False, probe=probe)
+            raise
+        slow = self.latency_threshold is not None and time.monotonic() - start > self.latency_threshold
+        self._record(success=not slow, slow=slow, probe=probe)
+        return result
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._current_state(),
+                "consecutive_failures": self._consecutive_failures,
+                "opened_at": self._opened_at,
+                **self._counters,
+            }
+
+    def _current_state(self):
+        if self._state == self.OPEN and time.time() - self._opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self._state
+
+    def _acquire(self):
+        """Let a call through, or raise CircuitOpenError. Returns True if the call is the half-open probe."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return False
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = True
+                return True
+            self._counters["short_circuited"] += 1
+        raise CircuitOpenError(f"{self.name} circuit is open")
+
+    def _record(self, success, slow=False, probe=False):
+        with self._lock:
+            # Calls let through before the breaker half-opened do not end the probe
+            if probe:
+                self._probe_in_flight = False
+            if slow:
+                self._counters["slow_calls"] += 1
+            if success:
+                self._counters["successes"] += 1
+                self._consecutive_failures = 0
+                self._state = self.CLOSED
+                return
+            self._counters["failures"] += 1
+            self._consecutive_failures += 1
+            if probe or self._consecutive_failures >= self.failure_threshold:
+                if self._state != self.OPEN or probe:
+                    self._counters["opened"] += 1
+                self._state = self.OPEN
+                self._opened_at = time.time()
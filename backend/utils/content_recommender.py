@@ -0,0 +1,83 @@
+import numpy as np
+
+# Audio features shared by dataset.csv and the Song model
+FEATURE_COLUMNS = [
+    "danceability",
+    "energy",
+    "loudness",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+]
+
+
+class ContentRecommender:
+    """
+    Local top-k recommender over the catalog's audio features.
+
+    Features are standardized and L2-normalized into one float32 matrix, so cosine
+    similarity to a user profile is a single matrix-vector product followed by
+    `argpartition`. Used when BigQuery is unavailable; makes no external calls.
+    """
+
+    def __init__(self, catalog, seed=None):
+        self.catalog = catalog
+        self.columns = [c for c in FEATURE_COLUMNS if catalog.has_column(c)]
+        self.rng = np.random.default_rng(seed)
+
+        # Both arrays live next to a shared catalog, so forked workers map one copy
+        self.matrix = catalog.derived("content_matrix", self.build_matrix)
+        self.popular_rows = catalog.derived("popular_rows", self.build_popular_rows)
+
+    def build_matrix(self):
+        features = np.zeros((len(self.catalog), len(self.columns)), dtype=np.float32)
+        for i, column in enumerate(self.columns):
+            features[:, i] = self.catalog.column(column)
+        mean = np.nanmean(features, axis=0)
+        std = np.nanstd(features, axis=0)
+        std[std == 0] = 1.0
+        # Missing values land on the column mean, i.e. 0 after standardizing
+        return self.normalize(np.nan_to_num((features - mean) / std))
+
+    def build_popular_rows(self):
+        if self.catalog.has_column("popularity"):
+            popularity = np.nan_to_num(self.catalog.column("popularity"))
+            return np.argsort(-popularity, kind="stable")
+        return np.arange(len(self.catalog))
+
+    @staticmethod
+    def normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return (matrix / norms).astype(np.float32, copy=False)
+
+    def recommend(self, seed_track_ids, k=15):
+        """Top-k tracks most similar to the mean profile of `seed_track_ids`."""
+        seed_set = set(seed_track_ids or [])
+        seed_rows = self.catalog.rows_of(seed_set)
+        if not seed_rows:
+            return self.popular(k)
+
+        profile = self.normalize(self.matrix[seed_rows].mean(axis=0))
+        return self.top_k(self.matrix @ profile, k, exclude=seed_set)
+
+    def popular(self, k=15):
+        """Cold start: a shuffled pick from the most popular tracks."""
+        pool = self.popular_rows[: max(k * 10, k)]
+        rows = self.rng.choice(pool, size=min(k, len(pool)), replace=False)
+        return self.unique_ids(rows, k)
+
+    def top_k(self, scores, k, exclude=()):
+        # Over-fetch so duplicates and excluded ids can be dropped without a second pass
+        n = min(len(scores), k + len(exclude) + k)
+        if n == 0:
+            return []
+        rows = np.argpartition(-scores, n - 1)[:n]
+        rows = rows[np.argsort(-scores[rows], kind="stable")]
+        return self.unique_ids(rows, k, exclude)
+
+    def unique_ids(self, rows, k, exclude=()):
+        return self.catalog.unique_track_ids_at(rows, k, exclude)
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Target region of each /ask mood in audio-feature space. Values are positions in
+# the catalog's own [1st, 99th] percentile range of that feature (0 = low, 1 = high),
+# paired with how much the feature matters for the mood.
+MOOD_TARGETS = {
+    "happy": {"valence": (0.85, 2.0), "energy": (0.75, 1.0), "danceability": (0.75, 1.0), "tempo": (0.6, 0.5)},
+    "sad": {"valence": (0.15, 2.0), "energy": (0.3, 1.0), "acousticness": (0.65, 0.75), "tempo": (0.35, 0.5)},
+    "angry": {"valence": (0.2, 1.5), "energy": (0.95, 2.0), "loudness": (0.9, 1.0), "tempo": (0.7, 0.5)},
+    "chill": {"valence": (0.55, 0.75), "energy": (0.3, 1.5), "acousticness": (0.6, 1.0), "danceability": (0.5, 0.5)},
+    "lonely": {"valence": (0.2, 1.5), "energy": (0.2, 1.0), "acousticness": (0.75, 1.0), "tempo": (0.3, 0.5)},
+}
+
+
+class EmotionIndex:
+    """
+    Precomputed per-mood candidate pools over the catalog.
+
+    Each mood keeps its `pool_size` best-matching tracks ranked by distance to the
+    mood's target region. A request only re-ranks that pool against the user's
+    taste profile, so serving a mix costs O(pool) instead of a catalog scan.
+    """
+
+    def __init__(self, catalog, content, pool_size=300, personalization_weight=0.35, seed=None):
+        self.content = content
+        self.personalization_weight = personalization_weight
+        self.rng = np.random.default_rng(seed)
+        self.pools = {}  # mood -> (rows, mood scores in [0, 1]) best first
+
+        scaled = {}
+        for column in {c for target in MOOD_TARGETS.values() for c in target}:
+            if not catalog.has_column(column):
+                continue
+            values = catalog.column(column)
+            low, high = np.nanpercentile(values, [1, 99])
+            scaled[column] = np.nan_to_num(np.clip((values - low) / ((high - low) or 1.0), 0, 1), nan=0.5)
+
+        for mood, target in MOOD_TARGETS.items():
+            dims = [(scaled[c], position, weight) for c, (position, weight) in target.items() if c in scaled]
+            if not dims:
+                continue
+            total_weight = sum(weight for _, _, weight in dims)
+            distance = sum(weight * (values - position) ** 2 for values, position, weight in dims) / total_weight
+            score = 1.0 - np.sqrt(distance)
+            self.pools[mood] = self.build_pool(score, pool_size)
+
+    def build_pool(self, score, pool_size):
+        n = min(len(score), pool_size * 2)  # slack for duplicated track ids
+        rows = np.argpartition(-score, n - 1)[:n]
+        rows = rows[np.argsort(-score[rows], kind="stable")]
+        keep, seen = [], set()
+        for row, code in zip(rows.tolist(), self.content.catalog.codes[rows].tolist()):
+            if code not in seen:
+                seen.add(code)
+                keep.append(row)
+                if len(keep) == pool_size:
+                    break
+        keep = np.asarray(keep, dtype=np.int64)
+        return keep, score[keep].astype(np.float32)
+
+    def moods(self):
+        return list(self.pools)
+
+    def recommend(self, mood, seed_track_ids=None, k=15):
+        """
+        A mix for `mood`, re-ranked towards the profile of `seed_track_ids` when
+        given. Returns None for moods the index does not know.
+        """
+        pool = self.pools.get(mood.lower())
+        if pool is None:
+            return None
+        rows, mood_scores = pool
+
+        ranking = mood_scores
+        seed_rows = self.content.catalog.rows_of(set(seed_track_ids or []))
+        if seed_rows:
+            profile = self.content.normalize(self.content.matrix[seed_rows].mean(axis=0))
+            taste = (self.content.matrix[rows] @ profile + 1) / 2  # cosine -> [0, 1]
+            w = self.personalization_weight
+            ranking = (1 - w) * mood_scores + w * taste
+
+        # Sample from the top 3k in rank order so repeated asks do not return the same mix
+        top = np.argsort(-ranking, kind="stable")[: k * 3]
+        picked = np.sort(self.rng.choice(len(top), size=min(k, len(top)), replace=False))
+        return self.content.catalog.track_ids_at(rows[top[picked]])
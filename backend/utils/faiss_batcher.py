@@ -0,0 +1,118 @@
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class SearchBatcher:
+    """
+    Collects single-vector FAISS searches from many request threads and runs them
+    as one batched `index.search` call.
+
+    A batch is flushed when it reaches `max_batch_size` queries or when the oldest
+    query has waited `max_wait_ms`. Queries against different index objects (e.g.
+    before and after a reload) are never mixed in one search call.
+    """
+
+    def __init__(self, max_batch_size=64, max_wait_ms=2.0):
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._batches = 0
+        self._queries = 0
+        self._max_batch_seen = 0
+        self._queue_delay_total = 0.0
+        self._queue_delay_max = 0.0
+
+    def search(self, index, vector, k):
+        """Blocking search for one vector; returns (distances, indices) shaped (1, k)."""
+        if self.max_wait == 0 or self.max_batch_size == 1:
+            return index.search(np.asarray(vector, dtype=np.float32).reshape(1, -1), k)
+        return self.submit(index, vector, k).result()
+
+    def submit(self, index, vector, k):
+        self._ensure_worker()
+        future = Future()
+        vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+        self._queue.put((index, vector, k, future, time.perf_counter()))
+        return future
+
+    def metrics(self):
+        with self._metrics_lock:
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait * 1000,
+                "batches": self._batches,
+                "queries": self._queries,
+                "avg_batch_size": self._queries / self._batches if self._batches else 0.0,
+                "max_batch_size_seen": self._max_batch_seen,
+                "avg_queue_delay_ms": self._queue_delay_total / self._queries * 1000 if self._queries else 0.0,
+                "max_queue_delay_ms": self._queue_delay_max * 1000,
+                "pending": self._queue.qsize(),
+            }
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a forked worker starts its own
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._queue = queue.Queue()
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="faiss-batcher", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = batch[0][4] + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._execute(batch)
+
+    def _execute(self, batch):
+        started = time.perf_counter()
+        groups = defaultdict(list)
+        for item in batch:
+            groups[id(item[0])].append(item)
+
+        for items in groups.values():
+            index = items[0][0]
+            k = max(item[2] for item in items)
+            try:
+                distances, indices = index.search(np.stack([item[1] for item in items]), k)
+            except Exception as e:
+                for item in items:
+                    item[3].set_exception(e)
+                continue
+            for n, (_, _, item_k, future, _) in enumerate(items):
+                future.set_result((distances[n:n + 1, :item_k], indices[n:n + 1, :item_k]))
+
+        delays = [started - item[4] for item in batch]
+        with self._metrics_lock:
+            self._batches += 1
+            self._queries += len(batch)
+            self._max_batch_seen = max(self._max_batch_seen, len(batch))
+            self._queue_delay_total += sum(delays)
+            self._queue_delay_max = max(self._queue_delay_max, max(delays))
+
+
+search_batcher = SearchBatcher(
+    max_batch_size=int(os.getenv("FAISS_BATCH_MAX_SIZE", "64")),
+    max_wait_ms=float(os.getenv("FAISS_BATCH_MAX_WAIT_MS", "2")),
+)
@@ -0,0 +1,86 @@
+import faiss
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+
+from utils.content_recommender import FEATURE_COLUMNS
+
+INDEX_TYPES = ["flat", "ivfpq", "hnsw"]
+
+# songs is keyed by (track_id, artist_id); collapse to one row per track
+EXPORT_QUERY = text(f"""
+    SELECT
+        s.track_id,
+        MIN(s.track_name) AS track_name,
+        STRING_AGG(DISTINCT a.name, ';') AS artists,
+        MIN(al.name) AS album_name,
+        MIN(s.duration_ms) AS duration_ms,
+        MAX(s.popularity) AS popularity,
+        BOOL_OR(s.explicit) AS explicit,
+        {", ".join(f"AVG(s.{c}) AS {c}" for c in FEATURE_COLUMNS)},
+        MIN(s.key) AS key,
+        MIN(s.mode) AS mode,
+        MIN(s.time_signature) AS time_signature,
+        MIN(s.track_genre) AS track_genre
+    FROM songs s
+    LEFT JOIN artists a ON s.artist_id = a.id
+    LEFT JOIN albums al ON s.album_id = al.id
+    GROUP BY s.track_id
+    ORDER BY s.track_id
+""")
+
+
+def export_catalog(engine):
+    """One row per track with the dataset.csv columns, ordered by track_id."""
+    print("Exporting tracks from database...")
+    with engine.connect() as conn:
+        df = pd.read_sql(EXPORT_QUERY, conn)
+    print(f"Exported {len(df):,} tracks")
+    return df
+
+
+def standardize(df, scaler=None):
+    """
+    Standardized float32 feature matrix plus the scaler used to produce it. A
+    given `scaler` (from an earlier run) is reused instead of fitting a new one.
+    """
+    features = df[FEATURE_COLUMNS].to_numpy(dtype=np.float32, na_value=np.nan)
+    if scaler is not None:
+        if scaler["columns"] != FEATURE_COLUMNS:
+            raise ValueError("Scaler was fitted on different feature columns")
+        mean = np.asarray(scaler["mean"], dtype=np.float32)
+        std = np.asarray(scaler["std"], dtype=np.float32)
+    else:
+        mean = np.nanmean(features, axis=0)
+        std = np.nanstd(features, axis=0)
+        std[std == 0] = 1.0
+    features = np.nan_to_num((features - mean) / std).astype(np.float32)
+    scaler = {"columns": FEATURE_COLUMNS, "mean": mean.tolist(), "std": std.tolist()}
+    return np.ascontiguousarray(features), scaler
+
+
+def pq_subquantizers(dim):
+    # PQ needs the dimension to split evenly; use the largest divisor up to 8
+    return max(m for m in range(1, min(dim, 8) + 1) if dim % m == 0)
+
+
+def build_index(index_type, features, nlist=None, nprobe=16, hnsw_m=32, ef_search=64):
+    n, dim = features.shape
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "ivfpq":
+        # IVF training wants ~39 points per centroid
+        nlist = nlist or int(4 * np.sqrt(n))
+        nlist = max(1, min(nlist, n // 39))
+        quantizer = faiss.IndexFlatL2(dim)
+        index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_subquantizers(dim), 8)
+        index.train(features)
+        index.nprobe = min(nprobe, nlist)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, hnsw_m)
+        index.hnsw.efConstruction = 80
+        index.hnsw.efSearch = ef_search
+    else:
+        raise ValueError(f"Unknown index type {index_type}, expected one of {INDEX_TYPES}")
+    index.add(features)
+    return index
@@ -0,0 +1,125 @@
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows development setups
+    fcntl = None
+
+COUNTER = struct.Struct("<Q")
+
+
+class GenerationTable:
+    """
+    Fixed number of 64-bit counters in a memory-mapped file, shared by every
+    worker process on the node. Keys hash (crc32, stable across processes) to a
+    slot; bumping a slot invalidates whatever was cached under its old value.
+    """
+
+    def __init__(self, path, slots=4096):
+        self.path = path
+        self.slots = slots
+        self._map = None
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def slot(self, key):
+        return zlib.crc32(str(key).encode("utf-8")) % self.slots
+
+    def get(self, key):
+        return COUNTER.unpack_from(self._mapping(), self.slot(key) * COUNTER.size)[0]
+
+    def bump(self, key):
+        offset = self.slot(key) * COUNTER.size
+        mapping = self._mapping()
+        with self._lock:
+            if fcntl is not None:
+                fcntl.lockf(self._fd, fcntl.LOCK_EX, COUNTER.size, offset)
+            try:
+                value = COUNTER.unpack_from(mapping, offset)[0] + 1
+                COUNTER.pack_into(mapping, offset, value)
+                return value
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._fd, fcntl.LOCK_UN, COUNTER.size, offset)
+
+    def _mapping(self):
+        # Re-opened after fork so each process has its own descriptor for the locks
+        if self._map is None or self._pid != os.getpid():
+            with self._lock:
+                if self._map is None or self._pid != os.getpid():
+                    size = self.slots * COUNTER.size
+                    fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+                    if os.fstat(fd).st_size < size:
+                        os.ftruncate(fd, size)
+                    self._map = mmap.mmap(fd, size)
+                    self._fd = fd
+                    self._pid = os.getpid()
+        return self._map
+
+
+class LibraryCache:
+    """
+    Per-user cache of the /user_playlist library listing.
+
+    Routes that change a library call `invalidate(user_id)` after committing,
+    for every user whose listing shows the change (a renamed or deleted
+    playlist appears in the library of each user who added it). An entry is
+    only served while the user's generation counter is unchanged, and the
+    counters are shared across workers, so a change made through one worker is
+    seen by all of them. `ttl` bounds staleness from writes that do not go
+    through these routes (admin table edits, another node).
+    """
+
+    def __init__(self, generations, maxsize=10000, ttl=300):
+        self.generations = generations
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()  # user_id -> (value, generation, fetched_at)
+        self._lock = threading.Lock()
+        self._counters = dict.fromkeys(["hits", "misses", "invalidations", "evictions"], 0)
+
+    def get(self, user_id, loader):
+        generation = self.generations.get(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] == generation and time.monotonic() - entry[2] < self.ttl:
+                self._entries.move_to_end(user_id)
+                self._counters["hits"] += 1
+                return entry[0]
+            self._counters["misses"] += 1
+
+        # Stored under the generation read before loading: a write that commits
+        # meanwhile bumps it, so this value is never served after that write
+        value = loader()
+        with self._lock:
+            self._entries[user_id] = (value, generation, time.monotonic())
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+        return value
+
+    def invalidate(self, user_id):
+        self.generations.bump(user_id)
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._counters["invalidations"] += 1
+
+    def metrics(self):
+        with self._lock:
+            return {**self._counters, "size": len(self._entries), "maxsize": self.maxsize, "ttl": self.ttl}
+
+
+library_cache = LibraryCache(
+    GenerationTable(os.getenv("LIBRARY_CACHE_GENERATIONS", os.path.join(tempfile.gettempdir(), "music-library-generations"))),
+    maxsize=int(os.getenv("LIBRARY_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("LIBRARY_CACHE_TTL", "300")),
+)
@@ -0,0 +1,165 @@
+from collections import namedtuple
+from datetime import datetime
+from typing import Iterator, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from schemas.track import TrackResponse
+from utils.library_cache import LibraryCache, library_cache
+from utils.pagination import Page, decode_cursor, track_page
+from utils.streaming import stream_query
+from utils.track_hydration import iter_track_responses
+
+# ids newest first, the same ids as a set for membership checks, and the highest
+# version of any of the user's rows (tombstones included)
+LikedState = namedtuple("LikedState", ["ids", "members", "version"])
+
+# Versions come from nextval() before commit. Holding the user's row until commit
+# makes one user's likes and unlikes commit in version order, so a client that
+# synced up to version V can never miss a lower version committed after it.
+LOCK_USER_QUERY = text("""
+    SELECT 1 FROM users WHERE id = :user_id FOR NO KEY UPDATE
+""")
+
+# A like that is already live matches no row in the DO UPDATE branch and returns
+# nothing, so repeating it changes neither the row nor its version
+LIKE_QUERY = text("""
+    INSERT INTO liked_tracks (user_id, track_id, date_added, version, removed)
+    VALUES (:user_id, :track_id, :date_added, nextval('liked_tracks_version_seq'), false)
+    ON CONFLICT (user_id, track_id) DO UPDATE
+    SET removed = false, date_added = EXCLUDED.date_added, version = EXCLUDED.version
+    WHERE liked_tracks.removed
+    RETURNING version
+""")
+
+UNLIKE_QUERY = text("""
+    UPDATE liked_tracks
+    SET removed = true, version = nextval('liked_tracks_version_seq')
+    WHERE user_id = :user_id AND track_id = :track_id AND NOT removed
+    RETURNING version
+""")
+
+LIKED_STATE_QUERY = text("""
+    SELECT track_id, removed, version
+    FROM liked_tracks
+    WHERE user_id = :user_id
+    ORDER BY date_added DESC, track_id DESC
+""")
+
+CHANGES_QUERY = text("""
+    SELECT track_id, removed, version
+    FROM liked_tracks
+    WHERE user_id = :user_id AND version > :since
+    ORDER BY version
+""")
+
+# One page of liked tracks, newest first, keyed by (date_added, track_id)
+LIKED_TRACKS_QUERY = text("""
+    WITH page AS (
+        SELECT track_id, date_added
+        FROM liked_tracks
+        WHERE user_id = :user_id AND NOT removed
+          AND (:after_id IS NULL OR (date_added, track_id) < (CAST(:after_key AS timestamp), :after_id))
+        ORDER BY date_added DESC, track_id DESC
+        LIMIT :limit
+    )
+    SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name, ab.id AS album_id, ab.name AS album_name,
+           s.duration_ms, s.track_image_url, page.date_added
+    FROM page
+    INNER JOIN songs s ON s.track_id = page.track_id
+    INNER JOIN artists at ON at.id = s.artist_id
+    INNER JOIN albums ab ON ab.id = s.album_id
+    ORDER BY page.date_added DESC, page.track_id DESC, at.name
+""")
+
+# Shares the library cache's cross-worker generation counters under ("liked", user_id) keys
+liked_cache = LibraryCache(library_cache.generations, maxsize=library_cache.maxsize, ttl=library_cache.ttl)
+
+
+def cache_key(user_id: str):
+    return ("liked", user_id)
+
+
+def load_liked_state(db: Session, user_id: str) -> LikedState:
+    ids, version = [], 0
+    for track_id, removed, row_version in db.execute(LIKED_STATE_QUERY, {"user_id": user_id}):
+        version = max(version, row_version)
+        if not removed:
+            ids.append(track_id)
+    return LikedState(ids, frozenset(ids), version)
+
+
+def liked_state(db: Session, user_id: str) -> LikedState:
+    return liked_cache.get(cache_key(user_id), lambda: load_liked_state(db, user_id))
+
+
+def liked_track_ids(db: Session, user_id: str, limit: Optional[int] = None) -> List[str]:
+    ids = liked_state(db, user_id).ids
+    return ids[:limit] if limit is not None else list(ids)
+
+
+def like_track(db: Session, user_id: str, track_id: str, tz: ZoneInfo) -> bool:
+    """Idempotent like; True if the track was not liked before."""
+    db.execute(LOCK_USER_QUERY, {"user_id": user_id})
+    date_added = datetime.now(tz).replace(tzinfo=None)
+    changed = db.execute(LIKE_QUERY, {"user_id": user_id, "track_id": track_id, "date_added": date_added}).first() is not None
+    db.commit()
+    if changed:
+        liked_cache.invalidate(cache_key(user_id))
+    return changed
+
+
+def unlike_track(db: Session, user_id: str, track_id: str) -> bool:
+    """Idempotent unlike; True if the track was liked before."""
+    db.execute(LOCK_USER_QUERY, {"user_id": user_id})
+    changed = db.execute(UNLIKE_QUERY, {"user_id": user_id, "track_id": track_id}).first() is not None
+    db.commit()
+    if changed:
+        liked_cache.invalidate(cache_key(user_id))
+    return changed
+
+
+def liked_delta(db: Session, user_id: str, since: int) -> dict:
+    """
+    Changes to the user's liked ids after version `since`. `since=0` returns the
+    full list (`full: true`); any other version returns the likes and unlikes
+    after it, which for a version from before the user's first like is every
+    liked id plus the tombstones.
+    """
+    state = liked_state(db, user_id)
+    if since <= 0:
+        return {"version": state.version, "full": True, "added": list(state.ids), "removed": []}
+    if since >= state.version:
+        return {"version": state.version, "full": False, "added": [], "removed": []}
+
+    added, removed, version = [], [], since
+    for track_id, is_removed, row_version in db.execute(CHANGES_QUERY, {"user_id": user_id, "since": since}):
+        (removed if is_removed else added).append(track_id)
+        version = max(version, row_version)
+    return {"version": version, "full": False, "added": added, "removed": removed}
+
+
+def fetch_liked_tracks(db: Session, user_id: str, limit: Optional[int], cursor: Optional[str] = None) -> Page:
+    """One page of the user's liked tracks (all of them when `limit` is None); ValueError for a bad cursor."""
+    after_key, after_id = decode_cursor(cursor, "liked")
+    rows = db.execute(LIKED_TRACKS_QUERY, {
+        "user_id": user_id,
+        "after_key": after_key,
+        "after_id": after_id,
+        "limit": limit,
+    }).fetchall()
+    # The cached id list makes the total exact and free
+    total = (len(liked_state(db, user_id).ids), False) if cursor is None else (None, False)
+    return track_page(rows, limit, "liked", key_index=8, total=total)
+
+
+def stream_liked_tracks(user_id: str, cursor: Optional[str] = None) -> Iterator[TrackResponse]:
+    """
+    Every liked track from `cursor` on (from the newest without one), read
+    through a server-side cursor; ValueError for a bad cursor.
+    """
+    after_key, after_id = decode_cursor(cursor, "liked")
+    rows = stream_query(LIKED_TRACKS_QUERY, {"user_id": user_id, "after_key": after_key, "after_id": after_id, "limit": None})
+    return iter_track_responses(rows)
@@ -0,0 +1,91 @@
+import base64
+import json
+from collections import namedtuple
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from utils.track_hydration import build_track_responses
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Totals up to this many rows are counted exactly; above it the planner's estimate is used
+EXACT_COUNT_LIMIT = 1000
+
+# `total` is only filled in for the first page (no cursor), so later pages cost O(page)
+Page = namedtuple("Page", ["items", "next_cursor", "total", "estimated"])
+
+
+def page_size(limit: Optional[int], cursor: Optional[str]) -> Optional[int]:
+    """
+    Rows per page, or None for the whole listing. A request with neither `limit`
+    nor `cursor` gets every row, as before listings were paginated, so clients
+    that do not follow X-Next-Cursor still see complete lists.
+    """
+    if limit is None and cursor:
+        return DEFAULT_PAGE_SIZE
+    return limit
+
+
+def encode_cursor(scope: str, key, row_id: str) -> str:
+    """
+    Opaque cursor for the row after (key, row_id) in listing `scope`. Keys are
+    sent as strings (positions, timestamps) and cast back in SQL.
+    """
+    payload = json.dumps([scope, None if key is None else str(key), row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], scope: str):
+    """(key, row_id) from a cursor of listing `scope`, (None, None) for the first page; ValueError if invalid."""
+    if not cursor:
+        return None, None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_scope, key, row_id = json.loads(payload)
+    except (ValueError, TypeError):
+        raise ValueError("Malformed cursor")
+    if cursor_scope != scope or not isinstance(row_id, str):
+        raise ValueError("Cursor does not belong to this listing")
+    return key, row_id
+
+
+def count_total(db: Session, sql: str, params: dict):
+    """
+    (total, estimated) for the rows of `sql`. Counting stops after EXACT_COUNT_LIMIT
+    rows; bigger results report the planner's row estimate instead.
+    """
+    counted = db.execute(text(f"SELECT COUNT(*) FROM ({sql} LIMIT {EXACT_COUNT_LIMIT + 1}) t"), params).scalar()
+    if counted <= EXACT_COUNT_LIMIT:
+        return counted, False
+
+    plan = db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"), params).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return max(int(plan[0]["Plan"]["Plan Rows"]), counted), True
+
+
+def track_page(rows, limit: Optional[int], scope: str, key_index: Optional[int] = None, total=(None, False)) -> Page:
+    """
+    Page of TrackResponse from rows ordered by (key, track_id), where row[key_index]
+    is the sort key (None when the listing is ordered by track_id alone). A full
+    page gets a cursor; the next page may still turn out to be empty. With no
+    `limit` the rows are the whole listing and their count is the total.
+    """
+    items = build_track_responses(rows)
+    if limit is None:
+        return Page(items, None, len(items), False)
+    next_cursor = None
+    if len(items) == limit:
+        last = rows[-1]
+        next_cursor = encode_cursor(scope, last[key_index] if key_index is not None else None, last[0])
+    return Page(items, next_cursor, *total)
+
+
+def set_page_headers(response, page: Page):
+    if page.next_cursor is not None:
+        response.headers["X-Next-Cursor"] = page.next_cursor
+    if page.total is not None:
+        response.headers["X-Total-Count"] = str(page.total)
+        response.headers["X-Total-Count-Estimated"] = "true" if page.estimated else "false"
@@ -0,0 +1,255 @@
+from collections import namedtuple
+from datetime import datetime
+from decimal import ROUND_FLOOR, Decimal, localcontext
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# Largest number of tracks one bulk request may add or remove, counting the
+# tracks of a source album or playlist
+MAX_BULK_TRACKS = 1000
+
+# `source_found` is False when the source playlist is not in the user's library;
+# a `requested` above MAX_BULK_TRACKS means nothing was added
+BulkResult = namedtuple("BulkResult", ["owned", "requested", "changed", "source_found"], defaults=[True])
+
+# For move/insert: `changed` is False when the moved track is not in the playlist,
+# or the inserted one already is (or is not a known song)
+Placement = namedtuple("Placement", ["owned", "anchor_found", "changed", "position"])
+
+OWNERSHIP_CONDITION = """
+    EXISTS (
+        SELECT 1 FROM playlist_user
+        WHERE playlist_id = :playlist_id AND user_id = :user_id AND type = 'playlist'
+    )
+"""
+
+# Writes that assign positions hold this lock, so two of them never compute the
+# same position for one playlist. Returns no row unless the user owns the playlist.
+LOCK_PLAYLIST_QUERY = text(f"""
+    SELECT 1 FROM playlists
+    WHERE id = :playlist_id AND {OWNERSHIP_CONDITION}
+    FOR NO KEY UPDATE
+""")
+
+# A source playlist must be in the user's library: owned, or added by them
+SOURCE_ACCESS_CONDITION = """
+    EXISTS (
+        SELECT 1 FROM playlist_user
+        WHERE playlist_id = :source_playlist_id AND user_id = :user_id
+    )
+"""
+
+# Ownership check, source expansion, dedupe and insert in one statement. New
+# tracks are appended after the current last position, explicit ids in request
+# order first. Ids that are not in songs, or already in the playlist, are counted
+# as requested but not added. Each source is read up to one row past the cap.
+# Nothing is added when the request comes to more than :max_tracks tracks, or
+# names a source playlist outside the user's library.
+ADD_TRACKS_QUERY = text(f"""
+    WITH requested AS (
+        SELECT DISTINCT ON (track_id) track_id, source, ord
+        FROM (
+            SELECT t.track_id, 0 AS source, t.ord
+            FROM unnest(CAST(:track_ids AS text[])) WITH ORDINALITY AS t(track_id, ord)
+            UNION ALL
+            (
+                SELECT DISTINCT track_id, 1, 0 FROM songs
+                WHERE album_id = :source_album_id
+                ORDER BY track_id
+                LIMIT :max_tracks + 1
+            )
+            UNION ALL
+            (
+                SELECT track_id, 2, row_number() OVER (ORDER BY position)
+                FROM playlist_tracks
+                WHERE playlist_id = :source_playlist_id AND {SOURCE_ACCESS_CONDITION}
+                ORDER BY position
+                LIMIT :max_tracks + 1
+            )
+        ) r
+        ORDER BY track_id, source, ord
+    ),
+    last AS (
+        SELECT COALESCE(FLOOR(MAX(position)), 0) AS position
+        FROM playlist_tracks WHERE playlist_id = :playlist_id
+    ),
+    inserted AS (
+        INSERT INTO playlist_tracks (playlist_id, track_id, date_added, position)
+        SELECT :playlist_id, r.track_id, :date_added,
+               last.position + row_number() OVER (ORDER BY r.source, r.ord, r.track_id)
+        FROM requested r, last
+        WHERE {OWNERSHIP_CONDITION}
+          AND (SELECT COUNT(*) FROM requested) <= :max_tracks
+          AND (:source_playlist_id IS NULL OR {SOURCE_ACCESS_CONDITION})
+          AND EXISTS (SELECT 1 FROM songs s WHERE s.track_id = r.track_id)
+          AND NOT EXISTS (
+              SELECT 1 FROM playlist_tracks pt
+              WHERE pt.playlist_id = :playlist_id AND pt.track_id = r.track_id
+          )
+        ON CONFLICT (playlist_id, track_id) DO NOTHING
+        RETURNING 1
+    )
+    SELECT {OWNERSHIP_CONDITION} AS owned,
+           (SELECT COUNT(*) FROM requested) AS requested,
+           (SELECT COUNT(*) FROM inserted) AS changed,
+           :source_playlist_id IS NULL OR {SOURCE_ACCESS_CONDITION} AS source_found
+""")
+
+SONG_EXISTS_QUERY = text("""
+    SELECT 1 FROM songs WHERE track_id = :track_id LIMIT 1
+""")
+
+# Position of the anchor and of the first track after it (or of the first track
+# when there is no anchor), ignoring the track being placed. Both lookups walk
+# ix_playlist_tracks_playlist_position.
+NEIGHBOURS_QUERY = text("""
+    WITH anchor AS (
+        SELECT position FROM playlist_tracks
+        WHERE playlist_id = :playlist_id AND track_id = :after_track_id
+    )
+    SELECT :after_track_id IS NULL OR EXISTS (SELECT 1 FROM anchor) AS anchor_found,
+           (SELECT position FROM anchor) AS before,
+           (
+               SELECT position FROM playlist_tracks
+               WHERE playlist_id = :playlist_id
+                 AND track_id <> :track_id
+                 AND (:after_track_id IS NULL OR position > (SELECT position FROM anchor))
+               ORDER BY position
+               LIMIT 1
+           ) AS after
+""")
+
+MOVE_TRACK_QUERY = text("""
+    UPDATE playlist_tracks SET position = :position
+    WHERE playlist_id = :playlist_id AND track_id = :track_id
+    RETURNING 1
+""")
+
+INSERT_TRACK_QUERY = text("""
+    INSERT INTO playlist_tracks (playlist_id, track_id, date_added, position)
+    SELECT :playlist_id, :track_id, :date_added, :position
+    WHERE EXISTS (SELECT 1 FROM songs WHERE track_id = :track_id)
+    ON CONFLICT (playlist_id, track_id) DO NOTHING
+    RETURNING 1
+""")
+
+REMOVE_TRACKS_QUERY = text(f"""
+    WITH deleted AS (
+        DELETE FROM playlist_tracks
+        WHERE playlist_id = :playlist_id
+          AND track_id = ANY(:track_ids)
+          AND {OWNERSHIP_CONDITION}
+        RETURNING 1
+    )
+    SELECT {OWNERSHIP_CONDITION} AS owned,
+           (SELECT COUNT(DISTINCT t) FROM unnest(CAST(:track_ids AS text[])) AS t) AS requested,
+           (SELECT COUNT(*) FROM deleted) AS changed
+""")
+
+
+def add_tracks(
+    db: Session,
+    playlist_id: str,
+    user_id: str,
+    track_ids: Sequence[str],
+    date_added: datetime,
+    source_album_id: Optional[str] = None,
+    source_playlist_id: Optional[str] = None,
+) -> BulkResult:
+    """
+    Append tracks to a playlist the user owns; commits. A source playlist must be
+    in the user's library.
+    """
+    db.execute(LOCK_PLAYLIST_QUERY, {"playlist_id": playlist_id, "user_id": user_id})
+    row = db.execute(ADD_TRACKS_QUERY, {
+        "playlist_id": playlist_id,
+        "user_id": user_id,
+        "track_ids": list(track_ids),
+        "source_album_id": source_album_id,
+        "source_playlist_id": source_playlist_id,
+        "max_tracks": MAX_BULK_TRACKS,
+        "date_added": date_added,
+    }).one()
+    db.commit()
+    return BulkResult(*row)
+
+
+def song_exists(db: Session, track_id: str) -> bool:
+    """Tells an unknown track from one already in the playlist when an add changed nothing."""
+    return db.execute(SONG_EXISTS_QUERY, {"track_id": track_id}).first() is not None
+
+
+def remove_tracks(db: Session, playlist_id: str, user_id: str, track_ids: Sequence[str]) -> BulkResult:
+    """Remove tracks from a playlist the user owns in one round trip; commits."""
+    row = db.execute(REMOVE_TRACKS_QUERY, {
+        "playlist_id": playlist_id,
+        "user_id": user_id,
+        "track_ids": list(track_ids),
+    }).one()
+    db.commit()
+    return BulkResult(*row)
+
+
+def position_between(before: Optional[Decimal], after: Optional[Decimal]) -> Decimal:
+    """
+    A position strictly between `before` and `after`, where None means the start
+    or end of the playlist. Picks the value with the fewest decimal places, so
+    positions stay short unless many tracks are placed into the same gap.
+    """
+    if before is None and after is None:
+        return Decimal(1)
+    if before is None:
+        return after.to_integral_value(rounding=ROUND_FLOOR) - 1
+    if after is None:
+        return before.to_integral_value(rounding=ROUND_FLOOR) + 1
+
+    scale = max(-before.as_tuple().exponent, -after.as_tuple().exponent, 0) + 1
+    with localcontext() as ctx:
+        # Enough digits for the exact midpoint, which always fits in `scale` places
+        ctx.prec = scale + max(before.adjusted(), after.adjusted(), 0) + 2
+        middle = (before + after) / 2
+        for places in range(scale + 1):
+            candidate = middle.quantize(Decimal(1).scaleb(-places))
+            if before < candidate < after:
+                return candidate
+    raise ValueError(f"No position between {before} and {after}")
+
+
+def _place(db: Session, playlist_id: str, user_id: str, track_id: str, after_track_id: Optional[str], write) -> Placement:
+    params = {"playlist_id": playlist_id, "user_id": user_id, "track_id": track_id, "after_track_id": after_track_id}
+    if db.execute(LOCK_PLAYLIST_QUERY, params).first() is None:
+        db.rollback()
+        return Placement(False, False, False, None)
+    anchor_found, before, after = db.execute(NEIGHBOURS_QUERY, params).one()
+    if not anchor_found:
+        db.rollback()
+        return Placement(True, False, False, None)
+
+    position = position_between(before, after)
+    changed = write({**params, "position": position}) is not None
+    db.commit()
+    return Placement(True, True, changed, position)
+
+
+def move_track(db: Session, playlist_id: str, user_id: str, track_id: str, after_track_id: Optional[str]) -> Placement:
+    """
+    Move a track to right after `after_track_id` (to the top when None). Only the
+    moved row is written; commits.
+    """
+    return _place(db, playlist_id, user_id, track_id, after_track_id,
+                  lambda params: db.execute(MOVE_TRACK_QUERY, params).first())
+
+
+def insert_track(
+    db: Session,
+    playlist_id: str,
+    user_id: str,
+    track_id: str,
+    after_track_id: Optional[str],
+    date_added: datetime,
+) -> Placement:
+    """Add a track right after `after_track_id` (first when None); commits."""
+    return _place(db, playlist_id, user_id, track_id, after_track_id,
+                  lambda params: db.execute(INSERT_TRACK_QUERY, {**params, "date_added": date_added}).first())
@@ -0,0 +1,401 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows development setups: no leader election, nobody re-exports
+    fcntl = None
+
+from utils.circuit_breaker import CircuitBreaker
+
+BQ_DATASET = "silicon-stock-452315-h4.music_recommend"
+RECOMMEND_LIMIT = 15
+
+
+class RecommendationStore(ABC):
+    """
+    Where precomputed recommendation lists are read from. Implementations raise
+    on failure so the Recommender can fall back to its local models.
+    """
+
+    name = "base"
+    local = False  # True when lookups never leave the process
+
+    @abstractmethod
+    def recommendations(self, user_id):
+        ...
+
+    @abstractmethod
+    def related_tracks(self, track_id):
+        ...
+
+    @abstractmethod
+    def emo_recommendations(self, user_id, emo):
+        ...
+
+    def metrics(self):
+        return {"name": self.name}
+
+    def start_refresh(self):
+        """Start background work, if the store has any. Called once per serving process."""
+
+    def after_fork(self, bq_client):
+        # Google clients hold connection pools that must not be shared across processes
+        self.bq_client = bq_client
+
+
+class BigQueryStore(RecommendationStore):
+    """
+    One BigQuery job per lookup against the music_recommend tables, bounded by a
+    per-call deadline and guarded by a circuit breaker so a slow or failing
+    BigQuery fails fast instead of holding request threads.
+    """
+
+    name = "bigquery"
+
+    def __init__(self, bq_client, timeout=2.0, breaker=None):
+        self.bq_client = bq_client
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker("bigquery")
+
+    def query(self, query, params):
+        return self.breaker.call(lambda: self._run(query, params))
+
+    def _run(self, query, params):
+        from google.cloud import bigquery
+
+        deadline = time.monotonic() + self.timeout
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter(k, "STRING", v) for k, v in params.items()],
+            job_timeout_ms=int(self.timeout * 1000),
+        )
+        query_job = self.bq_client.query(query, job_config=job_config, timeout=self.timeout)
+        # Whatever the job submission used up comes out of the wait for results
+        return list(query_job.result(timeout=max(deadline - time.monotonic(), 0.1)))
+
+    def metrics(self):
+        return {"name": self.name, "timeout_seconds": self.timeout, "circuit_breaker": self.breaker.metrics()}
+
+    def recommendations(self, user_id):
+        results = self.query(f"""
+            SELECT track_id
+            FROM `{BQ_DATASET}.recommend`
+            WHERE user_id = @user_id
+            ORDER BY recommended_at DESC
+            LIMIT {RECOMMEND_LIMIT}
+        """, {"user_id": user_id})
+        return [row.track_id for row in results]
+
+    def related_tracks(self, track_id):
+        results = self.query(f"""
+            SELECT related_trackid
+            FROM `{BQ_DATASET}.related_song`
+            WHERE track_id = @track_id
+        """, {"track_id": track_id})
+        return [row.related_trackid for row in results]
+
+    def emo_recommendations(self, user_id, emo):
+        results = self.query(f"""
+            SELECT track_id
+            FROM `{BQ_DATASET}.emotion-recommend`
+            WHERE user_id = @user_id
+            AND emotion = @emo
+            AND TIMESTAMP_TRUNC(recommended_at, MINUTE) = (
+                SELECT TIMESTAMP_TRUNC(MAX(recommended_at), MINUTE)
+                FROM `{BQ_DATASET}.emotion-recommend`
+                WHERE user_id = @user_id AND emotion = @emo
+            );
+        """, {"user_id": user_id, "emo": emo})
+        return [row.track_id for row in results]
+
+
+class SharedLookup:
+    """
+    Read-only key -> list of ids, stored as three arrays: sorted fixed-width `keys`,
+    `offsets` into `values` (one more than there are keys) and the `values`
+    themselves. Saved as .npy and memory-mapped, so every worker on a node reads
+    the same page-cache copy; a lookup is a binary search.
+    """
+
+    def __init__(self, keys, offsets, values):
+        self.keys = keys
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def from_dict(cls, mapping):
+        keys = sorted(str(key).encode("utf-8") for key in mapping)
+        decoded = {str(key): ids for key, ids in mapping.items()}
+        lists = [decoded[key.decode("utf-8")] for key in keys]
+        offsets = np.zeros(len(keys) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(ids) for ids in lists], dtype=np.int64)
+        values = [str(tid).encode("utf-8") for ids in lists for tid in ids]
+        # np.bytes_ cannot size an empty array, so empty lookups are sliced from one blank entry
+        as_array = lambda items: np.asarray(items or [b""], dtype=np.bytes_)[:len(items)]
+        return cls(as_array(keys), offsets, as_array(values))
+
+    def save(self, directory, name):
+        for part in ("keys", "offsets", "values"):
+            np.save(os.path.join(directory, f"{name}.{part}.npy"), getattr(self, part))
+
+    @classmethod
+    def open(cls, directory, name):
+        load = lambda part: np.load(os.path.join(directory, f"{name}.{part}.npy"), mmap_mode="r")
+        return cls(load("keys"), load("offsets"), load("values"))
+
+    def get(self, key):
+        key = str(key).encode("utf-8")
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return [tid.decode("utf-8") for tid in self.values[self.offsets[i]:self.offsets[i + 1]].tolist()]
+        return []
+
+    def __len__(self):
+        return len(self.keys)
+
+
+EMPTY_LOOKUP = SharedLookup.from_dict({})
+
+
+class ParquetStore(RecommendationStore):
+    """
+    Local columnar copy of the recommendation tables.
+
+    `export()` bulk-copies recommend, related_song and emotion-recommend from
+    BigQuery into Parquet files. `publish()` turns them into SharedLookup arrays
+    under `index/<stamp>/` and points the CURRENT file at them; `load()` maps the
+    current arrays, so a lookup is a binary search over pages every worker on the
+    node shares. Works fully offline once the files exist.
+
+    With several workers, only the one holding `refresh.lock` re-exports every
+    `refresh_interval` seconds; the others only notice the new CURRENT and map it.
+    """
+
+    name = "parquet"
+    local = True
+
+    TABLES = {
+        "recommend": "SELECT user_id, track_id, recommended_at FROM `{dataset}.recommend`",
+        "related_song": "SELECT track_id, related_trackid FROM `{dataset}.related_song`",
+        "emotion-recommend": "SELECT user_id, emotion, track_id, recommended_at FROM `{dataset}.emotion-recommend`",
+    }
+    LOOKUPS = ("recommend", "related", "emotion")
+    # How often each worker checks CURRENT (and the leader whether an export is due)
+    POLL_SECONDS = 30
+
+    def __init__(self, directory, bq_client=None, refresh_interval=0):
+        self.directory = directory
+        self.bq_client = bq_client
+        self.refresh_interval = refresh_interval
+        # (recommend, related, emotion) lookups, swapped as one tuple on reload
+        self._lookups = (EMPTY_LOOKUP,) * 3
+        self._version = None
+        self._refresher = None
+        self._leader_fd = None
+        self.loaded_at = None
+        self.last_export_seconds = None
+        self.last_error = None
+
+    def path(self, table):
+        return os.path.join(self.directory, f"{table}.parquet")
+
+    @property
+    def current_path(self):
+        return os.path.join(self.directory, "CURRENT")
+
+    def export(self):
+        import pyarrow.parquet as pq
+
+        if self.bq_client is None:
+            raise RuntimeError("Parquet export needs a BigQuery client")
+        start = time.perf_counter()
+        os.makedirs(self.directory, exist_ok=True)
+        for table, query in self.TABLES.items():
+            arrow_table = self.bq_client.query(query.format(dataset=BQ_DATASET)).result().to_arrow()
+            tmp_path = f"{self.path(table)}.{os.getpid()}.tmp"
+            pq.write_table(arrow_table, tmp_path)
+            os.replace(tmp_path, self.path(table))
+            print(f"Exported {arrow_table.num_rows:,} rows of {table} to {self.path(table)}")
+        self.last_export_seconds = time.perf_counter() - start
+
+    def build_lookups(self):
+        import pyarrow.parquet as pq
+
+        recommend = pq.read_table(self.path("recommend")).to_pandas()
+        recommend = recommend.sort_values("recommended_at", ascending=False, kind="stable")
+        recommend_index = {
+            user_id: group["track_id"].head(RECOMMEND_LIMIT).tolist()
+            for user_id, group in recommend.groupby("user_id", sort=False)
+        }
+
+        related = pq.read_table(self.path("related_song")).to_pandas()
+        related_index = related.groupby("track_id", sort=False)["related_trackid"].agg(list).to_dict()
+
+        # Same semantics as the BigQuery query: the latest minute batch per (user, emotion)
+        emotion = pq.read_table(self.path("emotion-recommend")).to_pandas()
+        emotion["emotion"] = emotion["emotion"].str.lower()
+        emotion["batch"] = emotion["recommended_at"].dt.floor("min")
+        latest = emotion.groupby(["user_id", "emotion"])["batch"].transform("max")
+        emotion = emotion[emotion["batch"] == latest]
+        emotion_index = {
+            self.emotion_key(user_id, emo): ids
+            for (user_id, emo), ids in emotion.groupby(["user_id", "emotion"], sort=False)["track_id"].agg(list).items()
+        }
+        return [SharedLookup.from_dict(index) for index in (recommend_index, related_index, emotion_index)]
+
+    def publish(self):
+        """Build lookups from the Parquet files and make them current for every process."""
+        index_root = os.path.join(self.directory, "index")
+        os.makedirs(index_root, exist_ok=True)
+        version = f"{time.time_ns()}-{os.getpid()}"
+        tmp_dir = tempfile.mkdtemp(dir=index_root, prefix=".build.")
+        try:
+            for name, lookup in zip(self.LOOKUPS, self.build_lookups()):
+                lookup.save(tmp_dir, name)
+            os.rename(tmp_dir, os.path.join(index_root, version))
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        previous = self.current_version()
+        tmp_path = f"{self.current_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write(version)
+        os.replace(tmp_path, self.current_path)
+        # Keep the previous arrays for workers that have not switched yet; unlinking
+        # older ones is safe, mapped pages stay valid until they are unmapped
+        for name in os.listdir(index_root):
+            if name not in (version, previous) and not name.startswith("."):
+                shutil.rmtree(os.path.join(index_root, name), ignore_errors=True)
+        return version
+
+    def current_version(self):
+        try:
+            with open(self.current_path) as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def load(self):
+        """Map the current lookups, publishing them first if there are none yet."""
+        version = self.current_version()
+        if version is None:
+            version = self.publish()
+        directory = os.path.join(self.directory, "index", version)
+        self._lookups = tuple(SharedLookup.open(directory, name) for name in self.LOOKUPS)
+        self._version = version
+        self.loaded_at = time.time()
+        print(f"Loaded recommendation tables for {len(self._lookups[0]):,} users from {directory}")
+
+    def _try_lead(self):
+        # One process per node holds the lock (until it exits) and does the exports
+        if self._leader_fd is None and fcntl is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            fd = os.open(os.path.join(self.directory, "refresh.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._leader_fd = fd
+            except OSError:
+                os.close(fd)
+        return self._leader_fd is not None
+
+    def _export_due(self):
+        try:
+            age = time.time() - os.path.getmtime(self.current_path)
+        except FileNotFoundError:
+            return True
+        return age >= self.refresh_interval
+
+    def start_refresh(self):
+        """
+        Poll CURRENT in the background and map new lookups when it changes; the
+        worker that wins refresh.lock also re-exports every `refresh_interval` seconds.
+        """
+        if self._refresher is not None:
+            return
+
+        def refresh():
+            while True:
+                time.sleep(self.POLL_SECONDS)
+                try:
+                    if (
+                        self.refresh_interval > 0 and self.bq_client is not None
+                        and self._try_lead() and self._export_due()
+                    ):
+                        self.export()
+                        self.publish()
+                    if self.current_version() != self._version:
+                        self.load()
+                    self.last_error = None
+                except Exception as e:
+                    self.last_error = str(e)
+                    print(f"Warning: Parquet store refresh failed: {e}")
+
+        self._refresher = threading.Thread(target=refresh, name="parquet-store-refresh", daemon=True)
+        self._refresher.start()
+
+    def after_fork(self, bq_client):
+        super().after_fork(bq_client)
+        self._refresher = None
+        self._leader_fd = None
+
+    @staticmethod
+    def emotion_key(user_id, emo):
+        return f"{user_id}\x1f{emo.lower()}"
+
+    def recommendations(self, user_id):
+        return self._lookups[0].get(user_id)
+
+    def related_tracks(self, track_id):
+        return self._lookups[1].get(track_id)
+
+    def emo_recommendations(self, user_id, emo):
+        return self._lookups[2].get(self.emotion_key(user_id, emo))
+
+    def metrics(self):
+        recommend, related, emotion = self._lookups
+        return {
+            "name": self.name,
+            "version": self._version,
+            "leader": self._leader_fd is not None,
+            "users": len(recommend),
+            "related_tracks": len(related),
+            "emotion_mixes": len(emotion),
+            "loaded_at": self.loaded_at,
+            "last_export_seconds": self.last_export_seconds,
+            "last_error": self.last_error,
+        }
+
+
+def create_store(bq_client):
+    """Pick the store named by RECOMMENDATION_STORE (bigquery | parquet); None if unusable."""
+    kind = os.getenv("RECOMMENDATION_STORE", "bigquery")
+    if kind == "parquet":
+        store = ParquetStore(
+            os.getenv("RECOMMENDATION_STORE_DIR", "./data/recommendations"),
+            bq_client,
+            refresh_interval=int(os.getenv("RECOMMENDATION_STORE_REFRESH", "3600")),
+        )
+        try:
+            if bq_client is not None and not os.path.exists(store.path("recommend")):
+                store.export()
+            store.load()
+        except Exception as e:
+            print(f"Warning: Could not load Parquet recommendation store: {e}")
+            return None
+        return store
+    if bq_client is not None:
+        timeout = float(os.getenv("BIGQUERY_TIMEOUT_SECONDS", "2"))
+        breaker = CircuitBreaker(
+            "bigquery",
+            failure_threshold=int(os.getenv("BIGQUERY_BREAKER_FAILURES", "5")),
+            latency_threshold=float(os.getenv("BIGQUERY_BREAKER_LATENCY_SECONDS", "1.5")),
+            reset_timeout=float(os.getenv("BIGQUERY_BREAKER_RESET_SECONDS", "30")),
+        )
+        return BigQueryStore(bq_client, timeout=timeout, breaker=breaker)
+    return None
@@ -1,185 +1,548 @@
-import os, pickle, faiss
-import pandas as pd
+import os, pickle, threading, time, asyncio
 import numpy as np
-from io import BytesIO, StringIO
-from google.cloud import storage, bigquery
-import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from starlette.concurrency import run_in_threadpool
+from utils.artifact_cache import artifact_cache
+from utils.catalog import TrackCatalog
+from utils.content_recommender import ContentRecommender
+from utils.emotion_index import EmotionIndex
+from utils.faiss_batcher import search_batcher
+from utils.library_cache import library_cache
+from utils.swr_cache import StaleWhileRevalidateCache
+from utils.recommendation_store import create_store
+
+DATASET_PATH = "./data/dataset.csv"
+# Parsed catalog arrays, memory-mapped by every worker instead of copied into each
+CATALOG_CACHE_DIR = os.getenv("CATALOG_CACHE_DIR", os.path.join(artifact_cache.root, "catalog"))
+# float16 halves the catalog's numeric columns; features are re-standardized into float32 anyway
+CATALOG_FEATURE_DTYPE = os.getenv("CATALOG_FEATURE_DTYPE", "float32")
+FAISS_INDEX_OBJECT = "music_index.index"
+FEATURES_OBJECT = "full_features.pkl"
+# Slot in the node's shared GenerationTable bumped by POST /recommender/reload
+RELOAD_KEY = ("recommender", "reload")
+# Use BigQuery emotion mixes ahead of the local ones when it is reachable
+EMOTION_BIGQUERY_OVERLAY = os.getenv("EMOTION_BIGQUERY_OVERLAY", "0") == "1"
+# Set by gunicorn.conf.py: the master warms up and forks, workers start the background threads
+RECOMMENDER_PRELOAD = os.getenv("RECOMMENDER_PRELOAD", "0") == "1"
+
+
+class RecommenderSnapshot:
+    """
+    One consistent generation of recommender artifacts. Requests read
+    `recommender.snapshot` once and keep using it, so a reload that swaps in a
+    new snapshot never changes the data under an in-flight search.
+    """
+
+    def __init__(self, catalog=None, faiss_index=None, track_features=None, version=None, load_seconds=0.0):
+        self.catalog = catalog  # TrackCatalog, rows aligned with the FAISS index and track_features
+        self.faiss_index = faiss_index
+        self.track_features = track_features
+        self.version = version
+        self.load_seconds = load_seconds
+        self.loaded_at = datetime.now(timezone.utc) if catalog is not None else None
+        self.content = None  # local fallback over audio features
+        self.emotions = None  # per-mood candidate pools
+        if catalog is not None:
+            self.content = ContentRecommender(catalog)
+            self.emotions = EmotionIndex(catalog, self.content)
+
 
 class Recommender:
     def __init__(self):
-        self.data_df = None
-        self.faiss_index = None
-        self.track_features = None
+        self.snapshot = RecommenderSnapshot()
         self.gcs_client = None
         self.bq_client = None
         self.bucket = None
-        self.use_bigquery = False  # Flag to track if BigQuery is available
+        self.store = None  # RecommendationStore with the precomputed lists, if any
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self._reload_listener = None
+        self._reload_listener = None
+        self._reload_seen = None  # generation of RELOAD_KEY the snapshot reflects
+        self.last_reload_error = None
+        # Store tables are refreshed in batch, so results can be served stale while revalidating
+        self.bq_cache = StaleWhileRevalidateCache(
+            maxsize=int(os.getenv("RECOMMENDATION_CACHE_SIZE", "10000")),
+            ttl=float(os.getenv("RECOMMENDATION_CACHE_TTL", "600")),
+            stale_ttl=float(os.getenv("RECOMMENDATION_CACHE_STALE_TTL", "86400")),
+            name="bq-cache",
+            submit_refresh=self.submit_remote_refresh,
+        )
+        # Remote store queries get their own bounded pool so a slow analytics backend
+        # cannot exhaust the AnyIO threadpool that serves playlist and auth routes
+        self.remote_max_concurrency = int(os.getenv("BIGQUERY_MAX_CONCURRENCY", "8"))
+        self.remote_max_pending = int(os.getenv("BIGQUERY_MAX_PENDING", "64"))
+        self.remote_executor = ThreadPoolExecutor(max_workers=self.remote_max_concurrency, thread_name_prefix="bq-query")
+        self._remote_inflight = {}  # key -> asyncio future of the running query
+        self._remote_counters = dict.fromkeys(["submitted", "coalesced", "shed"], 0)
+        # Clients, store and snapshot are loaded by warm_up(), not at import time
+        self._warmup_lock = threading.Lock()
+        self.warmup = {"state": "pending", "stage": None, "stages": {}, "seconds": None, "error": None}
 
+    def init_clients(self):
         # Only initialize Google Cloud clients if credentials are provided
+        self.gcs_client, self.bq_client, self.bucket = None, None, None
         gcp_credentials = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
         bucket_name = os.getenv("BUCKET_NAME")
         
         if gcp_credentials and os.path.exists(gcp_credentials):
             try:
+                from google.cloud import storage, bigquery
+
                 self.gcs_client = storage.Client.from_service_account_json(gcp_credentials)
                 self.bq_client = bigquery.Client.from_service_account_json(gcp_credentials)
                 if bucket_name:
                     self.bucket = self.gcs_client.bucket(bucket_name)
-                self.use_bigquery = True
             except Exception as e:
                 print(f"Warning: Failed to initialize Google Cloud clients: {e}")
         else:
             print("Warning: Google Cloud credentials not found. Recommender features will be disabled.")
 
+    def warm_up(self):
+        """
+        Connect the Google clients, open the recommendation store and load the first
+        snapshot. Runs once per process; until it is done the routes serve their
+        fallbacks and /ready reports the progress.
+        """
+        with self._warmup_lock:
+            if self.warmup["state"] != "pending":
+                return
+            self.warmup["state"] = "running"
+
+        start = time.perf_counter()
+        try:
+            with self.warmup_stage("clients"):
+                self.init_clients()
+            with self.warmup_stage("store"):
+                self.store = create_store(self.bq_client)
+            with self.warmup_stage("snapshot"):
+                self._reload_seen = library_cache.generations.get(RELOAD_KEY)
+                self.load()
+            self.warmup["state"] = "ready"
+            print("Recommender data loaded successfully!")
+        except Exception as e:
+            self.warmup.update(state="failed", error=str(e))
+            print(f"Warning: Failed to load recommender data: {e}")
+        finally:
+            self.warmup.update(stage=None, seconds=round(time.perf_counter() - start, 3))
+
+        if not RECOMMENDER_PRELOAD:
+            self.start_background()
+
+    def start_warm_up(self):
+        """Run warm_up() in a background thread so the process can answer requests meanwhile."""
+        if self.warmup["state"] != "pending":
+            return
+        threading.Thread(target=self.warm_up, name="recommender-warm-up", daemon=True).start()
+
+    @contextmanager
+    def warmup_stage(self, name):
+        self.warmup["stage"] = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.warmup["stages"][name] = round(time.perf_counter() - start, 3)
+
+    @property
+    def ready(self):
+        # A failed warm-up still serves the fallbacks, so it does not block readiness
+        return self.warmup["state"] in ("ready", "failed")
+
+    # Read-only views of the active snapshot
+    @property
+    def catalog(self):
+        return self.snapshot.catalog
+
+    @property
+    def faiss_index(self):
+        return self.snapshot.faiss_index
+
+    @property
+    def track_features(self):
+        return self.snapshot.track_features
+
     def load(self):
+        self.snapshot = self.build_snapshot()
+        return self.snapshot
+
+    def build_snapshot(self, require_index=False):
+        """
+        Load the catalog and the FAISS artifacts. A missing index is tolerated
+        (recommendations fall back to the catalog) unless `require_index` is set,
+        which a reload does so it never replaces a working index with none.
+        """
+        start = time.perf_counter()
+
         # Always load local data first
-        self.data_df = self.load_data()
-        print(f"Loaded {len(self.data_df)} tracks from local dataset")
+        catalog = self.load_data()
+        print(f"Loaded {len(catalog)} tracks from local dataset")
         
-        # Try to load FAISS index from GCS (optional)
-        if self.bucket:
-            try:
-                self.faiss_index = self.load_faiss_index()
-                self.track_features = self.load_track_features()
-                print("FAISS index loaded from GCS")
-            except Exception as e:
-                print(f"Warning: Could not load FAISS from GCS: {e}")
-                self.faiss_index = None
-                self.track_features = None
+        # Try to load FAISS index from the artifact cache / GCS (optional)
+        faiss_index, track_features = None, None
+        try:
+            faiss_index = self.load_faiss_index()
+            track_features = self.load_track_features()
+            print("FAISS index loaded")
+        except Exception as e:
+            if require_index:
+                raise
+            print(f"Warning: Could not load FAISS artifacts: {e}")
+            faiss_index, track_features = None, None
+
+        versions = {name: (artifact_cache.entry(name) or {}).get("generation") for name in (FAISS_INDEX_OBJECT, FEATURES_OBJECT)}
+        return RecommenderSnapshot(
+            catalog,
+            faiss_index,
+            track_features,
+            version=self.format_version(self.dataset_mtime(), versions),
+            load_seconds=time.perf_counter() - start,
+        )
 
     def load_data(self):
-        return pd.read_csv("./data/dataset.csv")
+        try:
+            return TrackCatalog.load_shared(DATASET_PATH, CATALOG_CACHE_DIR, feature_dtype=CATALOG_FEATURE_DTYPE)
+        except OSError as e:
+            # e.g. a read-only cache directory: fall back to a private in-memory copy
+            print(f"Warning: Could not share the catalog through {CATALOG_CACHE_DIR}: {e}")
+            return TrackCatalog.from_csv(DATASET_PATH, feature_dtype=CATALOG_FEATURE_DTYPE)
 
-    def load_faiss_index(self):
-        if not self.bucket:
+    @staticmethod
+    def dataset_mtime():
+        try:
+            return os.stat(DATASET_PATH).st_mtime_ns
+        except OSError:
             return None
-        blob = self.bucket.blob("music_index.index")
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            temp_file.write(blob.download_as_bytes())
-            return faiss.read_index(temp_file.name)
+
+    @staticmethod
+    def format_version(dataset_mtime, generations):
+        return "|".join(
+            [f"dataset@{dataset_mtime}"]
+            + [f"{name}@{generations.get(name)}" for name in (FAISS_INDEX_OBJECT, FEATURES_OBJECT)]
+        )
+
+    def source_version(self):
+        """Version of the artifacts as they are now in GCS / on disk (metadata requests only)."""
+        generations = {}
+        for name in (FAISS_INDEX_OBJECT, FEATURES_OBJECT):
+            if self.bucket is not None:
+                blob = self.bucket.get_blob(name)
+                generations[name] = blob.generation if blob is not None else None
+            else:
+                generations[name] = (artifact_cache.entry(name) or {}).get("generation")
+        return self.format_version(self.dataset_mtime(), generations)
+
+    def reload(self):
+        """
+        Build a new snapshot and swap it in. Returns False if a reload is already
+        running. Requests keep being served from the old snapshot meanwhile.
+        """
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+        self._reload_locked()
+        return True
+
+    def _reload_locked(self):
+        # Called with _reload_lock held; releases it
+        try:
+            snapshot = self.build_snapshot(require_index=self.snapshot.faiss_index is not None)
+            previous = self.snapshot.version
+            self.snapshot = snapshot
+            self.last_reload_error = None
+            print(f"Recommender reloaded {previous} -> {snapshot.version} in {snapshot.load_seconds:.2f}s")
+        except Exception as e:
+            self.last_reload_error = str(e)
+            print(f"Warning: Recommender reload failed, keeping {self.snapshot.version}: {e}")
+            raise
+        finally:
+            self._reload_lock.release()
+
+    def reload_async(self):
+        """Start a reload in a background thread; False if one is already running."""
+        # Taken here rather than in the thread, so True always means this call started a reload
+        if not self._reload_lock.acquire(blocking=False):
+            return False
+
+        def run():
+            try:
+                self._reload_locked()
+            except Exception:
+                pass  # already recorded in last_reload_error
+
+        threading.Thread(target=run, name="recommender-reload", daemon=True).start()
+        return True
+
+    def request_reload(self):
+        """
+        Reload in this process and ask every other worker on the node to do the
+        same: the shared reload generation is bumped and their listeners pick it
+        up within RECOMMENDER_RELOAD_POLL seconds. False if a reload is running here.
+        """
+        if not self.reload_async():
+            return False
+        self._reload_seen = library_cache.generations.bump(RELOAD_KEY)
+        return True
+
+    def start_reload_listener(self, interval_seconds):
+        """Reload when another worker bumps the shared reload generation."""
+        if interval_seconds <= 0 or self._reload_listener is not None:
+            return
+        if self._reload_seen is None:
+            self._reload_seen = library_cache.generations.get(RELOAD_KEY)
+
+        def listen():
+            while True:
+                time.sleep(interval_seconds)
+                generation = library_cache.generations.get(RELOAD_KEY)
+                if generation == self._reload_seen:
+                    continue
+                try:
+                    # False while a reload is already running here; retried on the next poll
+                    if self.reload():
+                        self._reload_seen = generation
+                except Exception as e:
+                    # Kept in last_reload_error; not retried until the next request
+                    self._reload_seen = generation
+                    print(f"Warning: Recommender reload listener error: {e}")
+
+        self._reload_listener = threading.Thread(target=listen, name="recommender-reload-listener", daemon=True)
+        self._reload_listener.start()
+
+    def start_watcher(self, interval_seconds):
+        """Poll dataset.csv and the GCS objects and reload when their version changes."""
+        if interval_seconds <= 0 or self._watcher is not None:
+            return
+
+        def watch():
+            while True:
+                time.sleep(interval_seconds)
+                try:
+                    if self.source_version() != self.snapshot.version:
+                        self.reload()
+                except Exception as e:
+                    print(f"Warning: Recommender watcher error: {e}")
+
+        self._watcher = threading.Thread(target=watch, name="recommender-watcher", daemon=True)
+        self._watcher.start()
+
+    def start_background(self):
+        """Start the watcher, reload listener and store refresh threads of this serving process."""
+        self.start_watcher(int(os.getenv("RECOMMENDER_WATCH_INTERVAL", "0")))
+        self.start_reload_listener(float(os.getenv("RECOMMENDER_RELOAD_POLL", "5")))
+        if self.store is not None:
+            self.store.start_refresh()
+
+    def after_fork(self):
+        """
+        Re-create per-process state in a worker forked from a preloading master
+        (see gunicorn.conf.py). The snapshot itself is inherited: its arrays are
+        memory-mapped or copy-on-write, so nothing is reloaded.
+        """
+        self._reload_lock = threading.Lock()
+        self._watcher = None
+        self.remote_executor = ThreadPoolExecutor(max_workers=self.remote_max_concurrency, thread_name_prefix="bq-query")
+        self._remote_inflight = {}
+        self.bq_cache.after_fork()
+        self.init_clients()
+        if self.store is not None:
+            self.store.after_fork(self.bq_client)
+        self.start_background()
+
+    def status(self):
+        snapshot = self.snapshot
+        return {
+            "version": snapshot.version,
+            "loaded_at": snapshot.loaded_at.isoformat() if snapshot.loaded_at else None,
+            "load_seconds": round(snapshot.load_seconds, 3),
+            "tracks": len(snapshot.catalog) if snapshot.catalog is not None else 0,
+            "faiss_loaded": snapshot.faiss_index is not None,
+            "reloading": self._reload_lock.locked(),
+            "watching": self._watcher is not None,
+            "reload_generation": self._reload_seen,
+            "last_reload_error": self.last_reload_error,
+            "warmup": dict(self.warmup, stages=dict(self.warmup["stages"])),
+        }
+
+    def load_faiss_index(self):
+        import faiss
+
+        # Served from local disk; GCS is only asked whether the object changed
+        path = artifact_cache.fetch(self.bucket, FAISS_INDEX_OBJECT)
+        if os.getenv("FAISS_MMAP", "1") == "1":
+            # Map the index read-only so workers on one node share page cache
+            try:
+                return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError as e:
+                print(f"Warning: FAISS index type does not support mmap, reading into memory: {e}")
+        return faiss.read_index(path)
 
     def load_track_features(self):
-        if not self.bucket:
-            return None
-        blob = self.bucket.blob("full_features.pkl")
-        return pickle.load(BytesIO(blob.download_as_bytes()))
-
-    def get_recommendations(self, user_id):
-        if not self.bq_client or not self.use_bigquery:
-            # Fallback: return random tracks from dataset
-            if self.data_df is not None:
-                sample_tracks = self.data_df.sample(min(15, len(self.data_df)))
-                return sample_tracks["track_id"].tolist()
+        pkl_path = artifact_cache.fetch(self.bucket, FEATURES_OBJECT)
+        # The cache directory is keyed by the pickle's md5, so the converted
+        # .npy next to it is only rebuilt when the features actually change.
+        npy_path = os.path.splitext(pkl_path)[0] + ".npy"
+        if not os.path.exists(npy_path):
+            with open(pkl_path, "rb") as f:
+                features = np.ascontiguousarray(pickle.load(f), dtype=np.float32)
+            tmp_path = f"{npy_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, features)
+            os.replace(tmp_path, npy_path)
+            print(f"Converted full_features.pkl to {npy_path}")
+        return np.load(npy_path, mmap_mode="r")
+
+    def metrics(self):
+        return {
+            "snapshot": self.status(),
+            "catalog_memory": self.snapshot.catalog.memory_usage() if self.snapshot.catalog is not None else None,
+            "faiss_batcher": search_batcher.metrics(),
+            "recommendation_store": self.store.metrics() if self.store is not None else None,
+            "bigquery_cache": self.bq_cache.metrics(),
+            "remote_queries": {
+                "max_concurrency": self.remote_max_concurrency,
+                "max_pending": self.remote_max_pending,
+                "pending": len(self._remote_inflight),
+                **self._remote_counters,
+            },
+        }
+
+    @staticmethod
+    def load_seeds(seed_loader):
+        if seed_loader is None:
             return []
-        
         try:
-            query = """
-                SELECT track_id
-                FROM `silicon-stock-452315-h4.music_recommend.recommend`
-                WHERE user_id = @user_id
-                ORDER BY recommended_at DESC
-                LIMIT 15
-            """
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("user_id", "STRING", user_id)
-                ]
-            )
-            query_job = self.bq_client.query(query, job_config=job_config)
-            results = query_job.result()
-            return [row.track_id for row in results]
+            return seed_loader()
         except Exception as e:
-            print(f"BigQuery error in get_recommendations: {e}")
-            # Fallback: return random tracks from dataset
-            if self.data_df is not None:
-                sample_tracks = self.data_df.sample(min(15, len(self.data_df)))
-                return sample_tracks["track_id"].tolist()
+            print(f"Could not load recommendation seeds: {e}")
             return []
-    
-    def get_related_tracks(self, track_id):
-        # Try BigQuery first
-        if self.bq_client and self.use_bigquery:
-            try:
-                query = """
-                    SELECT related_trackid
-                    FROM `silicon-stock-452315-h4.music_recommend.related_song`
-                    WHERE track_id = @track_id
-                """
-                job_config = bigquery.QueryJobConfig(
-                    query_parameters=[
-                        bigquery.ScalarQueryParameter("track_id", "STRING", track_id)
-                    ]
-                )
-                query_job = self.bq_client.query(query, job_config=job_config)
-                results = query_job.result()
-                return [row.related_trackid for row in results]
-            except Exception as e:
-                print(f"BigQuery error in get_related_tracks: {e}")
-                # Fall through to local FAISS fallback
-        
-        # Fallback: Use local FAISS index for similar tracks
-        if self.faiss_index is not None and self.data_df is not None and self.track_features is not None:
+
+    def local_recommendations(self, seed_loader=None, k=15):
+        """
+        Content-based top-k from the active snapshot. `seed_loader` is a callable
+        returning the user's liked track ids; it is only invoked on this path.
+        """
+        content = self.snapshot.content
+        if content is None:
+            return []
+        return content.recommend(self.load_seeds(seed_loader), k)
+
+    def local_emo_recommendations(self, emo, seed_loader=None, k=15):
+        """Mood mix from the precomputed emotion pools, re-ranked by the user's likes."""
+        snapshot = self.snapshot
+        if snapshot.emotions is None:
+            return []
+        seed_ids = self.load_seeds(seed_loader)
+        mix = snapshot.emotions.recommend(emo, seed_ids, k)
+        if mix is None:
+            # Unknown mood: plain taste-based recommendations
+            return snapshot.content.recommend(seed_ids, k)
+        return mix
+
+    async def astore_lookup(self, key, lookup):
+        """
+        Store lookup. Local stores answer from memory. For remote ones, cache hits
+        return inline; misses run on the dedicated remote executor (never the AnyIO
+        threadpool shared with DB routes), with identical keys coalesced onto one
+        query and excess load shed to the fallback.
+        """
+        if self.store.local:
+            return lookup()
+        found, value = self.bq_cache.peek(key, lookup)
+        if found:
+            return value
+
+        task = self._remote_inflight.get(key)
+        if task is not None:
+            self._remote_counters["coalesced"] += 1
+        else:
+            if len(self._remote_inflight) >= self.remote_max_pending:
+                self._remote_counters["shed"] += 1
+                raise RuntimeError("Too many pending remote recommendation queries")
+            loop = asyncio.get_running_loop()
+            task = loop.run_in_executor(self.remote_executor, self.bq_cache.get, key, lookup)
+            self._remote_inflight[key] = task
+            self._remote_counters["submitted"] += 1
+            task.add_done_callback(lambda _: self._remote_inflight.pop(key, None))
+        # Shield so one cancelled request does not cancel the query for the others
+        return await asyncio.shield(task)
+
+    def submit_remote_refresh(self, key, refresh):
+        """
+        Run a stale-while-revalidate refresh on the remote executor, under the same
+        pending limit and per-key coalescing as misses. Called from astore_lookup
+        on the event loop; False (keep serving the stale value) when a query for
+        the key is already running or the executor is saturated.
+        """
+        if key in self._remote_inflight or len(self._remote_inflight) >= self.remote_max_pending:
+            self._remote_counters["shed"] += 1
+            return False
+        task = asyncio.get_running_loop().run_in_executor(self.remote_executor, refresh)
+        self._remote_inflight[key] = task
+        self._remote_counters["submitted"] += 1
+        task.add_done_callback(lambda _: self._remote_inflight.pop(key, None))
+        return True
+
+    @staticmethod
+    def overlay(store_ids, local_ids):
+        # Personalized store picks first, topped up from the local mix
+        return list(dict.fromkeys(store_ids + local_ids))[:max(len(store_ids), len(local_ids))]
+
+    def local_related_tracks(self, track_id):
+        """Nearest neighbours from the local FAISS index of the active snapshot."""
+        snapshot = self.snapshot
+        if snapshot.faiss_index is not None and snapshot.track_features is not None:
             try:
-                idx_list = self.data_df[self.data_df["track_id"] == track_id].index.tolist()
-                if not idx_list:
+                row = snapshot.catalog.row_of(track_id)
+                if row is None:
                     return []
-                idx = idx_list[0]
-                query_vector = self.track_features[idx].reshape(1, -1).astype(np.float32)
-                distances, indices = self.faiss_index.search(query_vector, 10)
-                similar_ids = [
-                    self.data_df.iloc[i]["track_id"]
-                    for i in indices[0]
-                    if self.data_df.iloc[i]["track_id"] != track_id
-                ]
-                return similar_ids
+                query_vector = snapshot.track_features[row].reshape(1, -1).astype(np.float32)
+                distances, indices = search_batcher.search(snapshot.faiss_index, query_vector, 10)
+                rows = indices[0]
+                rows = rows[(rows >= 0) & (rows < len(snapshot.catalog))]
+                return [tid for tid in snapshot.catalog.track_ids_at(rows) if tid != track_id]
             except Exception as e:
                 print(f"FAISS fallback error: {e}")
         
         return []
 
-    def get_emo_recommendations(self, user_id, emo):
-        if not self.bq_client or not self.use_bigquery:
-            # Fallback: return random tracks from dataset
-            if self.data_df is not None:
-                sample_tracks = self.data_df.sample(min(15, len(self.data_df)))
-                return sample_tracks["track_id"].tolist()
-            return []
-        
+    async def aget_recommendations(self, user_id, seed_loader=None):
+        if self.store is not None:
+            try:
+                return await self.astore_lookup(("recommend", user_id), lambda: self.store.recommendations(user_id))
+            except Exception as e:
+                print(f"Recommendation store error in aget_recommendations: {e}")
+        # seed_loader hits the database, so the fallback runs in the threadpool
+        return await run_in_threadpool(self.local_recommendations, seed_loader)
+    
+    async def aget_related_tracks(self, track_id):
+        if self.store is not None:
+            try:
+                related_ids = await self.astore_lookup(("related", track_id), lambda: self.store.related_tracks(track_id))
+                if related_ids:
+                    return related_ids
+            except Exception as e:
+                print(f"Recommendation store error in aget_related_tracks: {e}")
+        return await run_in_threadpool(self.local_related_tracks, track_id)
+
+    async def aget_emo_recommendations(self, user_id, emo, seed_loader=None):
         emo = emo.lower()
-        try:
-            query = """
-                SELECT track_id
-                FROM `silicon-stock-452315-h4.music_recommend.emotion-recommend`
-                WHERE user_id = @user_id 
-                AND emotion = @emo 
-                AND TIMESTAMP_TRUNC(recommended_at, MINUTE) = (
-                    SELECT TIMESTAMP_TRUNC(MAX(recommended_at), MINUTE)
-                    FROM `silicon-stock-452315-h4.music_recommend.emotion-recommend`
-                    WHERE user_id = @user_id AND emotion = @emo
-                );
-
-            """
-            job_config = bigquery.QueryJobConfig(
-                query_parameters=[
-                    bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
-                    bigquery.ScalarQueryParameter("emo", "STRING", emo),
-                ]
-            )
-            query_job = self.bq_client.query(query, job_config=job_config)
-            results = query_job.result()
-            return [row.track_id for row in results]
-        except Exception as e:
-            print(f"BigQuery error in get_emo_recommendations: {e}")
-            # Fallback: return random tracks from dataset
-            if self.data_df is not None:
-                sample_tracks = self.data_df.sample(min(15, len(self.data_df)))
-                return sample_tracks["track_id"].tolist()
-            return []
+        local = run_in_threadpool(self.local_emo_recommendations, emo, seed_loader)
+        if not EMOTION_BIGQUERY_OVERLAY or self.store is None:
+            return await local
+
+        # Local mix and store lookup run concurrently
+        key = ("emotion", user_id, emo)
+        local_ids, store_ids = await asyncio.gather(
+            local, self.astore_lookup(key, lambda: self.store.emo_recommendations(user_id, emo)), return_exceptions=True
+        )
+        if isinstance(local_ids, BaseException):
+            raise local_ids
+        if isinstance(store_ids, BaseException):
+            print(f"Recommendation store error in aget_emo_recommendations: {store_ids}")
+            return local_ids
+        return self.overlay(store_ids, local_ids)
     
+# Loaded by warm_up(): from the app lifespan, or from the gunicorn master before forking
 recommender = Recommender()
-# Auto-load data when module is imported
-try:
-    recommender.load()
-    print("Recommender data loaded successfully!")
-except Exception as e:
-    print(f"Warning: Failed to load recommender data: {e}")
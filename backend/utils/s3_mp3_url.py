@@ -1,5 +1,4 @@
 import os
-from minio import Minio
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -13,7 +12,9 @@ s3_prefix = os.getenv("S3_PREFIX", "").strip("/")
 
 PRESIGNED_URL_EXPIRES = 3600  # This is an int in seconds, which is correct
 
-def s3_client() -> Minio:
+def s3_client() -> "Minio":
+    from minio import Minio
+
     # Parse endpoint - remove http:// or https:// prefix if present
     endpoint = s3_endpoint
     secure = False
@@ -0,0 +1,174 @@
+import os
+from typing import Optional
+
+from sqlalchemy import text
+
+# Matches looked at per query before ranking: the closest ones by trigram
+# distance, so the cap bounds the work of very broad keywords without dropping
+# the best matches. Results past it are not reachable by paging.
+SEARCH_CANDIDATE_LIMIT = int(os.getenv("SEARCH_CANDIDATE_LIMIT", "2000"))
+# Page size of a JSON search request without `limit`; search results are not listings
+# a client needs whole, so unlike them it is never unbounded
+SEARCH_DEFAULT_LIMIT = int(os.getenv("SEARCH_DEFAULT_LIMIT", "50"))
+# Weight of popularity (tracks, albums) or followers (artists), scaled to 0..1,
+# against word similarity (also 0..1) in the ranking score
+SEARCH_POPULARITY_WEIGHT = float(os.getenv("SEARCH_POPULARITY_WEIGHT", "0.3"))
+# Shorter keywords have no trigram to look up and use a prefix match instead
+MIN_TRIGRAM_KEYWORD = 3
+
+# Both served by the indexes from scripts/migrate_search_indexes.py: the GiST
+# trigram index for substring and fuzzy (`<%`, typo tolerant) matches, the
+# text_pattern_ops index for prefixes.
+TRIGRAM_MATCH = "(lower({column}) LIKE :contains OR :keyword <% lower({column}))"
+PREFIX_MATCH = "lower({column}) LIKE :prefix"
+
+# Candidate order: word-similarity distance (the GiST index returns rows in this
+# order and stops at the cap), then the key, so every page sees the same set
+CANDIDATE_ORDER = "lower({column}) <->> :keyword, {key}"
+
+SCORE = "CAST(word_similarity(:keyword, lower({column})) + :popularity_weight * {popularity} AS float8)"
+
+# Each query ranks the capped candidate set and returns one keyset page of
+# (score, id) in descending order, joined to the columns the response needs.
+TRACK_SEARCH_SQL = """
+    WITH candidates AS (
+        SELECT track_id, track_name, popularity FROM songs
+        WHERE {match}
+        ORDER BY {candidate_order}
+        LIMIT :candidates
+    ),
+    ranked AS (
+        SELECT DISTINCT ON (track_id) track_id, {score} AS score
+        FROM candidates
+        ORDER BY track_id
+    ),
+    page AS (
+        SELECT track_id, score FROM ranked
+        WHERE :after_id IS NULL OR (score, track_id) < (CAST(:after_key AS float8), :after_id)
+        ORDER BY score DESC, track_id DESC
+        LIMIT :limit
+    )
+    SELECT s.track_id, s.track_name, a.id AS artist_id, a.name AS artist_name, al.id AS album_id, al.name AS album_name,
+           s.duration_ms, s.track_image_url, NULL AS date_added, page.score
+    FROM page
+    JOIN songs s ON s.track_id = page.track_id
+    JOIN artists a ON s.artist_id = a.id
+    JOIN albums al ON s.album_id = al.id
+    ORDER BY page.score DESC, page.track_id DESC, a.name
+"""
+
+ALBUM_SEARCH_SQL = """
+    WITH candidates AS (
+        SELECT id, name FROM albums
+        WHERE {match}
+        ORDER BY {candidate_order}
+        LIMIT :candidates
+    ),
+    ranked AS (
+        SELECT c.id, {score} AS score
+        FROM candidates c
+    ),
+    page AS (
+        SELECT id, score FROM ranked
+        WHERE :after_id IS NULL OR (score, id) < (CAST(:after_key AS float8), :after_id)
+        ORDER BY score DESC, id DESC
+        LIMIT :limit
+    )
+    SELECT ab.id AS album_id, ab.name, ab.image_url, ab.release_date,
+           at.id AS artist_id, at.name AS artist_name, page.score
+    FROM page
+    JOIN albums ab ON ab.id = page.id
+    JOIN album_artists aa ON ab.id = aa.album_id
+    JOIN artists at ON aa.artist_id = at.id
+    ORDER BY page.score DESC, page.id DESC, at.name
+"""
+
+ARTIST_SEARCH_SQL = """
+    WITH candidates AS (
+        SELECT id, name, image_url, followers FROM artists
+        WHERE {match}
+        ORDER BY {candidate_order}
+        LIMIT :candidates
+    ),
+    ranked AS (
+        SELECT id, name, image_url, {score} AS score
+        FROM candidates
+    )
+    SELECT id, name, image_url, score FROM ranked
+    WHERE :after_id IS NULL OR (score, id) < (CAST(:after_key AS float8), :after_id)
+    ORDER BY score DESC, id DESC
+    LIMIT :limit
+"""
+
+# entity -> (query template, searched column, popularity scaled to 0..1, total count template, row key)
+SEARCHES = {
+    "track": (
+        TRACK_SEARCH_SQL, "track_name", "COALESCE(popularity, 0) / 100.0",
+        "SELECT DISTINCT track_id FROM songs WHERE {match}", "track_id, artist_id",
+    ),
+    "album": (
+        ALBUM_SEARCH_SQL, "name", "COALESCE((SELECT MAX(popularity) FROM songs WHERE album_id = c.id), 0) / 100.0",
+        "SELECT 1 FROM albums WHERE {match}", "id",
+    ),
+    # log10 of followers, 10^8 and above count as fully popular
+    "artist": (
+        ARTIST_SEARCH_SQL, "name", "LEAST(log(CAST(1 + COALESCE(followers, 0) AS float8)) / 8.0, 1)",
+        "SELECT 1 FROM artists WHERE {match}", "id",
+    ),
+}
+
+
+def normalize_keyword(keyword: str) -> str:
+    return " ".join(keyword.lower().split())
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _match(column: str, keyword: str) -> str:
+    template = TRIGRAM_MATCH if len(keyword) >= MIN_TRIGRAM_KEYWORD else PREFIX_MATCH
+    return template.format(column=column)
+
+
+def _build_query(entity: str, short: bool):
+    template, column, popularity, _, key = SEARCHES[entity]
+    match = (PREFIX_MATCH if short else TRIGRAM_MATCH).format(column=column)
+    score = SCORE.format(column=column, popularity=popularity)
+    candidate_order = CANDIDATE_ORDER.format(column=column, key=key)
+    return text(template.format(match=match, score=score, candidate_order=candidate_order))
+
+
+# Compiled once: (entity, short keyword) -> query
+SEARCH_QUERIES = {(entity, short): _build_query(entity, short) for entity in SEARCHES for short in (False, True)}
+
+
+def search_query(entity: str, keyword: str):
+    """Ranked page query for `entity` ("track", "album" or "artist") and a normalized keyword."""
+    return SEARCH_QUERIES[(entity, len(keyword) < MIN_TRIGRAM_KEYWORD)]
+
+
+def search_count_sql(entity: str, keyword: str) -> str:
+    """SQL for every match of `keyword`, for pagination.count_total."""
+    return SEARCHES[entity][3].format(match=_match(SEARCHES[entity][1], keyword))
+
+
+def search_total(total, estimated):
+    """A count_total result capped at what paging can reach: SEARCH_CANDIDATE_LIMIT matches."""
+    if total >= SEARCH_CANDIDATE_LIMIT:
+        return SEARCH_CANDIDATE_LIMIT, False
+    return total, estimated
+
+
+def search_params(keyword: str, limit: Optional[int], after_key=None, after_id: Optional[str] = None) -> dict:
+    escaped = _escape_like(keyword)
+    return {
+        "keyword": keyword,
+        "contains": f"%{escaped}%",
+        "prefix": f"{escaped}%",
+        "candidates": SEARCH_CANDIDATE_LIMIT,
+        "popularity_weight": SEARCH_POPULARITY_WEIGHT,
+        "after_key": after_key,
+        "after_id": after_id,
+        "limit": limit,
+    }
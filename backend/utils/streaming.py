@@ -0,0 +1,63 @@
+import json
+from typing import Iterable, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from models.base import engine
+from utils.track_hydration import iter_track_responses
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Rows fetched per round trip from a server-side cursor, and lines per written chunk
+STREAM_BATCH_SIZE = 500
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True if the client asked for NDJSON in its Accept header (and did not refuse it with q=0)."""
+    for part in request.headers.get("accept", "").split(","):
+        media_type, _, params = part.strip().partition(";")
+        if media_type.strip().lower() == NDJSON_MEDIA_TYPE:
+            return params.replace(" ", "").lower() not in ("q=0", "q=0.0")
+    return False
+
+
+def stream_query(query, params: dict, batch_size: int = STREAM_BATCH_SIZE) -> Iterator:
+    """
+    Rows of `query` read through a server-side cursor, `batch_size` at a time.
+
+    Uses its own connection rather than the request's session: the generator is
+    consumed while the response is being sent, after request dependencies have
+    been cleaned up.
+    """
+    with engine.connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(query, params)
+        yield from result
+
+
+def ndjson_lines(items: Iterable, batch_size: int = STREAM_BATCH_SIZE) -> Iterator[bytes]:
+    # The first item goes out on its own so time to first byte does not wait for a full batch
+    chunk, first = [], True
+    for item in items:
+        if isinstance(item, BaseModel):
+            chunk.append(item.model_dump_json())
+        else:
+            chunk.append(json.dumps(item, default=str))
+        if first or len(chunk) >= batch_size:
+            yield ("\n".join(chunk) + "\n").encode("utf-8")
+            chunk, first = [], False
+    if chunk:
+        yield ("\n".join(chunk) + "\n").encode("utf-8")
+
+
+def ndjson_response(items: Iterable) -> StreamingResponse:
+    """One JSON document per line, produced as `items` is consumed."""
+    return StreamingResponse(ndjson_lines(items), media_type=NDJSON_MEDIA_TYPE)
+
+
+def stream_tracks(query, params: dict) -> StreamingResponse:
+    """
+    NDJSON of every TrackResponse of a paginated track listing from the cursor in
+    `params` on: the same query, run with no LIMIT through a server-side cursor.
+    """
+    return ndjson_response(iter_track_responses(stream_query(query, {**params, "limit": None})))
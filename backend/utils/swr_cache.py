@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class StaleWhileRevalidateCache:
+    """
+    Bounded LRU cache with a freshness TTL and a stale window.
+
+    - fresh entries (age < ttl) are returned as is;
+    - stale entries (ttl <= age < ttl + stale_ttl) are returned immediately while
+      one background refresh per key reloads them;
+    - missing or expired entries are loaded in the caller, and concurrent callers
+      for the same key wait on that single load instead of issuing their own.
+
+    Background refreshes run on a small pool of the cache's own, unless
+    `submit_refresh(key, fn)` is given: then they go wherever it sends them, and
+    are skipped (the stale value is kept) when it returns False.
+    """
+
+    def __init__(self, maxsize=10000, ttl=600, stale_ttl=86400, refresh_workers=4, name="cache", submit_refresh=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.refresh_workers = refresh_workers
+        self.name = name
+        self.submit_refresh = submit_refresh
+        self._entries = OrderedDict()  # key -> (value, fetched_at)
+        self._inflight = {}  # key -> Future of the running load
+        self._lock = threading.Lock()
+        self._refresher = self._refresh_pool()
+        self._counters = dict.fromkeys(
+            ["hits", "stale_hits", "misses", "coalesced", "refreshes", "refresh_errors", "refresh_skipped", "load_errors", "evictions"], 0
+        )
+
+    def _refresh_pool(self):
+        if self.submit_refresh is not None:
+            return None
+        return ThreadPoolExecutor(max_workers=self.refresh_workers, thread_name_prefix=f"{self.name}-refresh")
+
+    def get(self, key, loader):
+        with self._lock:
+            found, value = self._lookup(key, loader)
+            if found:
+                return value
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self._counters["coalesced"] += 1
+                owner = False
+            else:
+                self._counters["misses"] += 1
+                self._inflight[key] = future = Future()
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._counters["load_errors"] += 1
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        self._store(key, value, future)
+        return value
+
+    def peek(self, key, loader):
+        """
+        Non-blocking lookup: (True, value) for a fresh or stale entry (a stale one
+        is refreshed in the background), (False, None) when `get` would have to load.
+        """
+        with self._lock:
+            return self._lookup(key, loader)
+
+    def _lookup(self, key, loader):
+        # Caller holds self._lock
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        value, fetched_at = entry
+        age = time.monotonic() - fetched_at
+        if age < self.ttl:
+            self._entries.move_to_end(key)
+            self._counters["hits"] += 1
+            return True, value
+        if age < self.ttl + self.stale_ttl:
+            self._entries.move_to_end(key)
+            self._counters["stale_hits"] += 1
+            if key not in self._inflight:
+                self._start_refresh(key, loader)
+            return True, value
+        return False, None
+
+    def _start_refresh(self, key, loader):
+        # Caller holds self._lock
+        future = Future()
+        refresh = lambda: self._refresh(key, loader, future)
+        if self.submit_refresh is None:
+            self._inflight[key] = future
+            self._refresher.submit(refresh)
+        elif self.submit_refresh(key, refresh):
+            self._inflight[key] = future
+        else:
+            self._counters["refresh_skipped"] += 1
+
+    def after_fork(self):
+        """Locks and refresh threads do not survive fork; give a forked worker its own."""
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._refresher = self._refresh_pool()
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def metrics(self):
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["stale_hits"] + self._counters["misses"] + self._counters["coalesced"]
+            served = self._counters["hits"] + self._counters["stale_hits"] + self._counters["coalesced"]
+            return {
+                **self._counters,
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "refreshing": len(self._inflight),
+                "hit_ratio": served / lookups if lookups else 0.0,
+            }
+
+    def _refresh(self, key, loader, future):
+        # Returns the value (or raises) for callers that submitted the refresh themselves
+        try:
+            value = loader()
+        except Exception as e:
+            # Keep serving the stale value; the next stale hit retries
+            print(f"Background refresh of {key} failed: {e}")
+            with self._lock:
+                self._counters["refresh_errors"] += 1
+                self._inflight.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._counters["refreshes"] += 1
+        self._store(key, value, future)
+        return value
+
+    def _store(self, key, value, future):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
@@ -0,0 +1,112 @@
+from collections import OrderedDict
+from itertools import groupby
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from schemas.track import TrackResponse
+from utils.format_ms import format_duration
+
+# One round trip for every card on a recommendation surface.
+# songs is keyed by (track_id, artist_id), so a track can come back once per artist.
+HYDRATE_TRACKS_QUERY = text("""
+    SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
+           ab.id AS album_id, ab.name AS album_name,
+           s.duration_ms, s.track_image_url
+    FROM songs s
+    JOIN artists at ON at.id = s.artist_id
+    JOIN albums ab ON ab.id = s.album_id
+    WHERE s.track_id = ANY(:ids)
+""")
+
+
+def build_track_responses(rows: Iterable, order: Optional[Sequence[str]] = None) -> List[TrackResponse]:
+    """
+    Aggregate (track_id, track_name, artist_id, artist_name, album_id, album_name,
+    duration_ms, track_image_url[, date_added]) rows into TrackResponse objects.
+
+    Rows of the same track are merged so that multi-artist tracks produce one card.
+    If `order` is given, the result follows it and ids without a row are dropped;
+    otherwise tracks keep the order in which they first appear in `rows`.
+    """
+    track_map = OrderedDict()
+
+    for row in rows:
+        track_id = row[0]
+        track = track_map.get(track_id)
+        if track is None:
+            track = track_map[track_id] = {
+                "id": track_id,
+                "title": row[1],
+                "artist_id": set(),
+                "artists": set(),
+                "album_id": row[4],
+                "album": row[5],
+                "duration": format_duration(row[6]),
+                "cover_url": row[7],
+                "date_added": row[8] if len(row) > 8 else None,
+            }
+        track["artist_id"].add(row[2])
+        track["artists"].add(row[3])
+
+    if order is not None:
+        tracks = [track_map[tid] for tid in order if tid in track_map]
+    else:
+        tracks = list(track_map.values())
+
+    return [
+        TrackResponse(
+            id=track["id"],
+            title=track["title"],
+            artist_id=", ".join(sorted(track["artist_id"])),
+            artist=", ".join(sorted(track["artists"])),
+            album_id=track["album_id"],
+            album=track["album"],
+            duration=track["duration"],
+            cover_url=track["cover_url"],
+            date_added=track["date_added"].isoformat() if track["date_added"] else None
+        )
+        for track in tracks
+    ]
+
+
+def iter_track_responses(rows: Iterable) -> Iterator[TrackResponse]:
+    """
+    Streaming build_track_responses for rows already ordered by track, so a
+    track's rows are adjacent. Holds one track at a time.
+    """
+    for _, track_rows in groupby(rows, key=lambda row: row[0]):
+        yield from build_track_responses(track_rows)
+
+
+def hydrate_tracks(db: Session, track_ids: Sequence[str]) -> List[TrackResponse]:
+    """
+    Fetch the cards for `track_ids` in a single query and return them in the same
+    order, skipping duplicates and ids that are not in the songs table.
+    """
+    ordered_ids = list(OrderedDict.fromkeys(tid for tid in track_ids if tid))
+    if not ordered_ids:
+        return []
+
+    rows = db.execute(HYDRATE_TRACKS_QUERY, {"ids": ordered_ids}).fetchall()
+    return build_track_responses(rows, order=ordered_ids)
+
+
+RANDOM_TRACKS_QUERY = text("""
+    SELECT s.track_id, s.track_name, at.id AS artist_id, at.name AS artist_name,
+           ab.id AS album_id, ab.name AS album_name,
+           s.duration_ms, s.track_image_url
+    FROM songs s
+    JOIN artists at ON at.id = s.artist_id
+    JOIN albums ab ON ab.id = s.album_id
+    WHERE s.track_id IS DISTINCT FROM :exclude_track_id
+    ORDER BY RANDOM()
+    LIMIT :limit
+""")
+
+
+def fetch_random_tracks(db: Session, limit: int, exclude_track_id: Optional[str] = None) -> List[TrackResponse]:
+    """Last-resort filler for recommendation surfaces."""
+    rows = db.execute(RANDOM_TRACKS_QUERY, {"limit": limit, "exclude_track_id": exclude_track_id}).fetchall()
+    return build_track_responses(rows)
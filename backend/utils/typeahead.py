@@ -0,0 +1,353 @@
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+from array import array
+from itertools import islice
+
+from sqlalchemy import text
+
+try:
+    import fcntl
+except ImportError:  # Windows development setups
+    fcntl = None
+
+KINDS = ("track", "album", "artist")
+# Admin table -> kind of suggestion its rows produce, and the column holding the suggestion id
+TABLE_KINDS = {"songs": "track", "albums": "album", "artists": "artist"}
+TABLE_ID_COLUMNS = {"songs": "track_id", "albums": "id", "artists": "id"}
+
+# Words are indexed under their first 1..PREFIX_KEY_LENGTH characters; longer
+# query words use the key of their first characters and are checked per candidate
+PREFIX_KEY_LENGTH = 3
+# Candidates checked per query at most, so a rare combination of common prefixes
+# cannot turn one keystroke into a scan of the whole catalog
+MAX_SCAN = int(os.getenv("TYPEAHEAD_MAX_SCAN", "20000"))
+# Deleted and replaced entries are compacted away once they are this share of the index
+COMPACT_RATIO = 0.25
+
+# (id, name, score in 0..1) per kind, scored like utils/search.py ranks results.
+# `{where}` is empty for the full load and selects one row for admin edits.
+ENTITY_SQL = {
+    "track": """
+        SELECT track_id, MAX(track_name), COALESCE(MAX(popularity), 0) / 100.0
+        FROM songs {where}
+        GROUP BY track_id
+    """,
+    "album": """
+        SELECT ab.id, ab.name, COALESCE(MAX(s.popularity), 0) / 100.0
+        FROM albums ab LEFT JOIN songs s ON s.album_id = ab.id {where}
+        GROUP BY ab.id, ab.name
+    """,
+    "artist": """
+        SELECT id, name, LEAST(log(CAST(1 + COALESCE(followers, 0) AS float8)) / 8.0, 1)
+        FROM artists {where}
+    """,
+}
+ENTITY_KEY = {"track": "track_id", "album": "ab.id", "artist": "id"}
+# A song's popularity feeds its album's score, so song edits re-read these albums too
+SONG_ALBUMS_SQL = "SELECT DISTINCT album_id FROM songs WHERE track_id = ANY(%s) AND album_id IS NOT NULL"
+
+WORD = re.compile(r"\w+")
+
+
+def normalize(name):
+    """Lowercase words without accents: "Beyoncé - Halo" -> ["beyonce", "halo"]."""
+    name = name or ""
+    if not name.isascii():
+        name = "".join(c for c in unicodedata.normalize("NFKD", name) if not unicodedata.combining(c))
+    return WORD.findall(name.lower())
+
+
+def prefix_keys(words):
+    return {word[:n] for word in words for n in range(1, min(len(word), PREFIX_KEY_LENGTH) + 1)}
+
+
+class ChangeJournal:
+    """
+    Append-only file of index changes, shared by every worker process on the node.
+    The worker that handles an admin edit appends it; every worker applies the
+    lines past its own offset before answering a suggestion, without a database
+    round trip.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except FileNotFoundError:
+            return 0
+
+    def append(self, records):
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records).encode("utf-8")
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.write(fd, data)
+        finally:
+            os.close(fd)  # also releases the lock
+
+    def truncate(self):
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            os.ftruncate(fd, 0)
+        finally:
+            os.close(fd)
+
+    def read_from(self, offset):
+        """(records after `offset`, new offset); a line still being written is left for later."""
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+        except FileNotFoundError:
+            return [], offset
+        end = data.rfind(b"\n") + 1
+        return [json.loads(line) for line in data[:end].splitlines() if line], offset + end
+
+
+class TypeaheadIndex:
+    """
+    In-process word-prefix index over track, album and artist names for
+    /search/suggest.
+
+    Entries live in parallel compact arrays (kind, score, alive) next to their id,
+    name and normalized text. Every posting list is an array of entry numbers in
+    descending score order, so the first `limit` candidates that match the whole
+    query are the top-k, and a lookup usually stops after a few dozen entries.
+    Edits are kept in score order by binary insertion; removed entries are only
+    flagged until the next compaction.
+    """
+
+    def __init__(self, journal, max_scan=MAX_SCAN):
+        self.journal = journal
+        self.max_scan = max_scan
+        self.state = "pending"  # pending -> loading -> ready / failed
+        self.error = None
+        self.load_seconds = None
+        self._lock = threading.Lock()
+        self._install(self._build([]), offset=0)
+
+    # Loading
+
+    def load(self, truncate_journal=False):
+        """
+        Build the index from the database; runs once per process (or in the
+        gunicorn master). The master passes `truncate_journal`: before any worker
+        exists the load supersedes every journaled edit, so the file starts over
+        instead of growing across restarts.
+        """
+        with self._lock:
+            if self.state != "pending":
+                return
+            self.state = "loading"
+
+        start = time.perf_counter()
+        try:
+            from models.base import engine
+
+            if truncate_journal:
+                self.journal.truncate()
+            # Taken before reading the tables: replaying an edit the load already saw is harmless
+            offset = self.journal.size()
+            entries = []
+            with engine.connect() as conn:
+                for kind in KINDS:
+                    query = text(ENTITY_SQL[kind].format(where=""))
+                    for entity_id, name, score in conn.execution_options(yield_per=10000).execute(query):
+                        if name:
+                            entries.append((kind, entity_id, name, float(score or 0)))
+            structures = self._build(entries)
+            with self._lock:
+                self._install(structures, offset)
+            self.sync()
+            self.state = "ready"
+            print(f"Typeahead index loaded: {len(entries):,} names")
+        except Exception as e:
+            self.state, self.error = "failed", str(e)
+            print(f"Warning: Failed to load typeahead index: {e}")
+        finally:
+            self.load_seconds = round(time.perf_counter() - start, 3)
+
+    def after_fork(self):
+        """
+        Called in each gunicorn worker. A load the master could not finish (e.g. the
+        tables did not exist yet, before the first lifespan's create_all) goes back
+        to pending, so the worker's lifespan start_load() tries again.
+        """
+        self._lock = threading.Lock()
+        if self.state == "failed":
+            self.state, self.error = "pending", None
+
+    def start_load(self):
+        if self.state != "pending":
+            return
+        threading.Thread(target=self.load, name="typeahead-load", daemon=True).start()
+
+    @staticmethod
+    def _build(entries):
+        # Numbered best first, so appending entry numbers in order keeps every posting sorted
+        entries = sorted(entries, key=lambda entry: -entry[3])
+        kinds, scores = array("b"), array("f")
+        ids, names, texts, postings = [], [], [], {}
+        for number, (kind, entity_id, name, score) in enumerate(entries):
+            words = normalize(name)
+            kinds.append(KINDS.index(kind))
+            scores.append(score)
+            ids.append(entity_id)
+            names.append(name)
+            texts.append(" " + " ".join(words))
+            for key in prefix_keys(words):
+                posting = postings.get(key)
+                if posting is None:
+                    posting = postings[key] = array("i")
+                posting.append(number)
+        entry_of = {(KINDS[kind], entity_id): number for number, (kind, entity_id) in enumerate(zip(kinds, ids))}
+        return kinds, scores, ids, names, texts, postings, entry_of
+
+    def _install(self, structures, offset):
+        self.kinds, self.scores, self.ids, self.names, self.texts, self.postings, self.entry_of = structures
+        self.alive = bytearray(b"\x01") * len(self.ids)
+        self.dead = 0
+        self.offset = offset
+
+    # Incremental updates
+
+    def sync(self):
+        """Apply journal lines written (by any worker) since this process last looked."""
+        size = self.journal.size()
+        if size == self.offset:
+            return
+        with self._lock:
+            if size < self.offset:
+                # Truncated by a newer master: its lines are all new to this process
+                self.offset = 0
+            records, self.offset = self.journal.read_from(self.offset)
+            for record in records:
+                if record["op"] == "put":
+                    self._put(record["kind"], record["id"], record["name"], record["score"])
+                else:
+                    self._remove(record["kind"], record["id"])
+            if self.dead > COMPACT_RATIO * max(len(self.ids), 1):
+                self._compact()
+
+    def record_rows(self, cur, table_name, entity_ids, album_ids=()):
+        """
+        Journal the current state of `entity_ids` of an admin-edited table, read
+        with the admin route's psycopg2 cursor after its commit; ids without a
+        row are journaled as removals. For songs, their albums are re-scored as
+        well, together with `album_ids` (albums the songs belonged to before the
+        edit, read by the caller).
+        """
+        kind = TABLE_KINDS.get(table_name)
+        if kind is None:
+            return
+        records = self._current_records(cur, kind, entity_ids)
+        if kind == "track":
+            cur.execute(SONG_ALBUMS_SQL, (list(entity_ids),))
+            album_ids = set(album_ids) | {row[0] for row in cur.fetchall()}
+            records += self._current_records(cur, "album", sorted(album_ids))
+        self.journal.append(records)
+        self.sync()
+
+    @staticmethod
+    def song_album_ids(cur, track_ids):
+        """Albums of `track_ids`, for callers to read before an edit moves or deletes the songs."""
+        cur.execute(SONG_ALBUMS_SQL, (list(track_ids),))
+        return [row[0] for row in cur.fetchall()]
+
+    @staticmethod
+    def _current_records(cur, kind, entity_ids):
+        records = []
+        for entity_id in entity_ids:
+            cur.execute(ENTITY_SQL[kind].format(where=f"WHERE {ENTITY_KEY[kind]} = %s"), (entity_id,))
+            row = cur.fetchone()
+            if row is not None and row[1]:
+                records.append({"op": "put", "kind": kind, "id": row[0], "name": row[1], "score": float(row[2] or 0)})
+            else:
+                records.append({"op": "remove", "kind": kind, "id": entity_id})
+        return records
+
+    def _put(self, kind, entity_id, name, score):
+        self._remove(kind, entity_id)
+        words = normalize(name)
+        number = len(self.ids)
+        self.kinds.append(KINDS.index(kind))
+        self.scores.append(score)
+        self.ids.append(entity_id)
+        self.names.append(name)
+        self.texts.append(" " + " ".join(words))
+        self.alive.append(1)
+        self.entry_of[(kind, entity_id)] = number
+        by_score = lambda n: -self.scores[n]
+        for key in prefix_keys(words):
+            bisect.insort(self.postings.setdefault(key, array("i")), number, key=by_score)
+
+    def _remove(self, kind, entity_id):
+        number = self.entry_of.pop((kind, entity_id), None)
+        if number is not None:
+            self.alive[number] = 0
+            self.dead += 1
+
+    def _compact(self):
+        entries = [
+            (KINDS[self.kinds[n]], self.ids[n], self.names[n], self.scores[n])
+            for n in range(len(self.ids)) if self.alive[n]
+        ]
+        self._install(self._build(entries), self.offset)
+
+    # Queries
+
+    def suggest(self, query, limit=10, kinds=None):
+        """
+        Up to `limit` (kind, id, name) whose words start with every word of
+        `query`, best score first. `kinds` restricts the result to some of KINDS.
+        """
+        words = normalize(query)
+        if not words:
+            return []
+        self.sync()
+        wanted = None if kinds is None else {KINDS.index(kind) for kind in kinds}
+        needles = [" " + word for word in words]
+
+        with self._lock:
+            postings = [self.postings.get(word[:PREFIX_KEY_LENGTH]) for word in words]
+            if any(posting is None for posting in postings):
+                return []
+            # The shortest posting is the most selective; it is in score order like all of them
+            posting = min(postings, key=len)
+            results = []
+            for number in islice(posting, self.max_scan):
+                if not self.alive[number] or (wanted is not None and self.kinds[number] not in wanted):
+                    continue
+                entry_text = self.texts[number]
+                if all(needle in entry_text for needle in needles):
+                    results.append((KINDS[self.kinds[number]], self.ids[number], self.names[number]))
+                    if len(results) == limit:
+                        break
+            return results
+
+    def status(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "seconds": self.load_seconds,
+            "entries": len(self.ids) - self.dead,
+            "removed": self.dead,
+            "keys": len(self.postings),
+            "postings_bytes": sum(posting.buffer_info()[1] * posting.itemsize for posting in self.postings.values()),
+        }
+
+
+typeahead = TypeaheadIndex(
+    ChangeJournal(os.getenv("TYPEAHEAD_JOURNAL", os.path.join(tempfile.gettempdir(), "music-typeahead-journal")))
+)